@@ -0,0 +1,196 @@
+"""
+適応型並列度コントローラ
+実行中にメモリ・CPU・Chromiumプロセスのメモリを計測し、
+上限を超えないよう並列数をAIMD（加算増加・乗算減少）で調整する
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+CHROMIUM_PROCESS_NAMES = ('chrome', 'chromium', 'headless_shell')
+
+
+def chromium_rss_gb(root: Optional[psutil.Process] = None) -> float:
+    """
+    自プロセス配下のChromiumプロセスのRSS合計を取得
+    
+    Args:
+        root: 起点のプロセス（省略時は自プロセス）
+    
+    Returns:
+        RSS合計（GB）
+    """
+    root = root or psutil.Process()
+    total = 0
+    for child in root.children(recursive=True):
+        try:
+            if any(name in child.name().lower() for name in CHROMIUM_PROCESS_NAMES):
+                total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total / (1024**3)
+
+
+class AdaptiveController:
+    """並列数をリソース計測値に応じて増減させるコントローラ"""
+    
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 4,
+        memory_ceiling_percent: float = 85.0,
+        cpu_ceiling_percent: float = 90.0,
+        chromium_ceiling_gb: Optional[float] = None,
+        headroom_percent: float = 10.0,
+        cooldown_sec: float = 5.0
+    ):
+        """
+        初期化
+        
+        Args:
+            name: ログ表示用の名前（'collect', 'predict' など）
+            initial: 初期の並列数
+            min_limit: 並列数の下限
+            max_limit: 並列数の上限
+            memory_ceiling_percent: システムメモリ使用率の上限
+            cpu_ceiling_percent: CPU使用率の上限
+            chromium_ceiling_gb: Chromium RSS合計の上限（Noneなら判定しない）
+            headroom_percent: 増加させるのに必要な上限までの余裕
+            cooldown_sec: 調整後、次の調整までの最短間隔
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.memory_ceiling_percent = memory_ceiling_percent
+        self.cpu_ceiling_percent = cpu_ceiling_percent
+        self.chromium_ceiling_gb = chromium_ceiling_gb
+        self.headroom_percent = headroom_percent
+        self.cooldown_sec = cooldown_sec
+        self.adjustments: List[Dict[str, Any]] = []
+        
+        self._last_change = time.monotonic()
+        # interval=None のCPU計測は前回呼び出しからの差分なので、ここで基準を作っておく
+        psutil.cpu_percent(interval=None)
+    
+    def sample(self) -> Dict[str, float]:
+        """
+        現在のリソース使用状況を計測（ブロックしない）
+        
+        Returns:
+            {'memory_percent', 'cpu_percent', 'chromium_rss_gb'} の辞書
+        """
+        return {
+            'memory_percent': psutil.virtual_memory().percent,
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'chromium_rss_gb': chromium_rss_gb(),
+        }
+    
+    def update(self) -> int:
+        """
+        計測値に応じて並列数を調整
+        
+        上限超過なら半減、全指標に余裕があれば1増やす（クールダウン中は据え置き）
+        
+        Returns:
+            調整後の並列数
+        """
+        now = time.monotonic()
+        if now - self._last_change < self.cooldown_sec:
+            return self.limit
+        
+        usage = self.sample()
+        over = self._over_ceiling(usage)
+        
+        if over:
+            new_limit = max(self.min_limit, self.limit // 2)
+            reason = f"{over}超過"
+        elif self._has_headroom(usage):
+            new_limit = min(self.max_limit, self.limit + 1)
+            reason = "余裕あり"
+        else:
+            return self.limit
+        
+        if new_limit != self.limit:
+            logger.info(
+                f"🎛️  [{self.name}] 並列数 {self.limit} → {new_limit} ({reason}: "
+                f"メモリ {usage['memory_percent']:.1f}% / CPU {usage['cpu_percent']:.1f}% / "
+                f"Chromium {usage['chromium_rss_gb']:.2f}GB)"
+            )
+            self.adjustments.append({
+                'time': time.time(),
+                'from': self.limit,
+                'to': new_limit,
+                'reason': reason,
+                **usage,
+            })
+            self.limit = new_limit
+            self._last_change = now
+        
+        return self.limit
+    
+    def _over_ceiling(self, usage: Dict[str, float]) -> Optional[str]:
+        if usage['memory_percent'] > self.memory_ceiling_percent:
+            return 'メモリ'
+        if usage['cpu_percent'] > self.cpu_ceiling_percent:
+            return 'CPU'
+        if self.chromium_ceiling_gb is not None and usage['chromium_rss_gb'] > self.chromium_ceiling_gb:
+            return 'Chromium RSS'
+        return None
+    
+    def _has_headroom(self, usage: Dict[str, float]) -> bool:
+        if usage['memory_percent'] > self.memory_ceiling_percent - self.headroom_percent:
+            return False
+        if usage['cpu_percent'] > self.cpu_ceiling_percent - self.headroom_percent:
+            return False
+        if self.chromium_ceiling_gb is not None and usage['chromium_rss_gb'] > self.chromium_ceiling_gb * 0.8:
+            return False
+        return True
+
+
+def run_adaptive(
+    controller: AdaptiveController,
+    items: Iterable[Any],
+    func: Callable[[Any], Any]
+) -> List[Any]:
+    """
+    コントローラの並列数に従ってスレッドで処理を実行
+    
+    Args:
+        controller: 並列数を決めるコントローラ
+        items: 処理対象
+        func: 各要素に適用する関数
+    
+    Returns:
+        入力と同じ順序の結果リスト
+    """
+    items = list(items)
+    results: List[Any] = [None] * len(items)
+    pending = iter(enumerate(items))
+    in_flight = {}
+    
+    with ThreadPoolExecutor(max_workers=controller.max_limit) as executor:
+        while True:
+            limit = controller.update()
+            while len(in_flight) < limit:
+                try:
+                    index, item = next(pending)
+                except StopIteration:
+                    break
+                in_flight[executor.submit(func, item)] = index
+            
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[in_flight.pop(future)] = future.result()
+    
+    return results
@@ -1,31 +1,135 @@
 # api.py（VPSで常時起動）
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+import asyncio
+import html
+import json
+import logging
+import re
 import sqlite3
-import pandas as pd
+from contextlib import asynccontextmanager
+from email.utils import format_datetime, parsedate_to_datetime
 
-app = FastAPI()
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 
-@app.get("/", response_class=HTMLResponse)
-def dashboard():
-    """ダッシュボード表示"""
-    conn = sqlite3.connect('/home/stock_prophet/data/stock_data.db')
+from config.stock_config import DB_PATH, SNAPSHOT_PATH
+from db_pool import ReadOnlyPool
+from event_bus import EventBroadcaster, EventLogTailer, events_path_for
+from history_service import RANGES, RESOLUTIONS, HistoryService
+from prediction_snapshot import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# スナップショット更新の確認間隔（秒）
+REFRESH_INTERVAL = 2.0
+# 読み取り専用接続の数
+DB_POOL_SIZE = 4
+# パイプライン（scraper_fixed.py / predict_system.py）と同じ設定から決める
+EVENTS_PATH = events_path_for(DB_PATH)
+# ストリームの接続維持用コメントを送る間隔（秒）
+STREAM_KEEPALIVE = 15.0
+
+TICKER_PATTERN = re.compile(r'^[A-Za-z0-9.\-]{1,20}$')
+
+snapshots = SnapshotStore(SNAPSHOT_PATH)
+db = ReadOnlyPool(DB_PATH, size=DB_POOL_SIZE)
+events = EventBroadcaster()
+history_service = HistoryService(db)
+
+
+def evict_history(event):
+    """新しい足・予測が届いた銘柄の履歴キャッシュを破棄"""
+    if event['type'] in ('collection', 'prediction') and event['data'].get('status', 'done') == 'done':
+        history_service.cache.evict(event['data'].get('ticker'))
+
+
+events.add_listener(evict_history)
+
+
+async def watch_snapshot():
+    """パイプラインが新しいスナップショットを公開したら差し替える"""
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        try:
+            snapshots.refresh()
+        except Exception as e:
+            logger.error(f"❌ スナップショット更新エラー: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    snapshots.refresh()
+    watcher = asyncio.create_task(watch_snapshot())
+    tailer = asyncio.create_task(EventLogTailer(EVENTS_PATH, events).run())
+    yield
+    watcher.cancel()
+    tailer.cancel()
+    db.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def not_modified(request: Request, etag: str, last_modified) -> bool:
+    """If-None-Match / If-Modified-Since に照らしてデータが未更新か判定"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    
+    return False
+
+
+def cached_response(request: Request, body: bytes, etag: str, last_modified, media_type: str) -> Response:
+    """ETag / Last-Modified を付けて返す（未更新なら304）"""
+    headers = {
+        'ETag': etag,
+        'Last-Modified': format_datetime(last_modified, usegmt=True),
+        'Cache-Control': 'no-cache',
+    }
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def render_dashboard(snapshot) -> str:
+    """予測スナップショットからダッシュボードHTMLを生成"""
+    rows = ""
+    for pred in snapshot.predictions:
+        css = "up" if pred['change_percent'] > 0 else "down"
+        rows += f"""
+            <tr>
+                <td>{html.escape(pred.get('name', pred['ticker']))} ({html.escape(pred['ticker'])})</td>
+                <td>{pred['current_price']:,.2f}</td>
+                <td>{pred['predicted_price']:,.2f}</td>
+                <td class="{css}">{pred['change_percent']:+.2f}%</td>
+            </tr>
+        """
     
-    html = """
+    updated = snapshot.generated_at.astimezone().strftime('%Y-%m-%d %H:%M')
+    
+    return f"""
     <html>
     <head>
         <title>Stock Prophet Dashboard</title>
         <style>
-            body { font-family: Arial; margin: 40px; }
-            table { border-collapse: collapse; width: 100%; }
-            th, td { border: 1px solid #ddd; padding: 12px; text-align: left; }
-            th { background-color: #4CAF50; color: white; }
-            .up { color: green; font-weight: bold; }
-            .down { color: red; font-weight: bold; }
+            body {{ font-family: Arial; margin: 40px; }}
+            table {{ border-collapse: collapse; width: 100%; }}
+            th, td {{ border: 1px solid #ddd; padding: 12px; text-align: left; }}
+            th {{ background-color: #4CAF50; color: white; }}
+            .up {{ color: green; font-weight: bold; }}
+            .down {{ color: red; font-weight: bold; }}
         </style>
     </head>
     <body>
         <h1>📈 Stock Prophet - リアルタイム予測</h1>
+        <p>更新: {updated}</p>
         <table>
             <tr>
                 <th>銘柄</th>
@@ -33,59 +137,156 @@ def dashboard():
                 <th>予測価格</th>
                 <th>変化率</th>
             </tr>
-    """
-    
-    # 予測結果をテーブル表示
-    # （実装省略）
-    
-    html += """
+            {rows}
         </table>
     </body>
     </html>
     """
+
+
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    """ダッシュボード表示"""
+    snapshot = snapshots.current
+    if snapshot.html is None:
+        snapshot.html = render_dashboard(snapshot)
+    
+    return cached_response(
+        request,
+        snapshot.html.encode('utf-8'),
+        f'"{snapshot.version}-html"',
+        snapshot.generated_at,
+        'text/html; charset=utf-8'
+    )
+
+
+@app.get("/predictions")
+async def predictions(request: Request):
+    """全銘柄の予測（JSON）"""
+    snapshot = snapshots.current
+    return cached_response(
+        request,
+        snapshot.body,
+        f'"{snapshot.version}"',
+        snapshot.generated_at,
+        'application/json'
+    )
+
+
+@app.get("/predictions/{ticker}")
+async def prediction(ticker: str, request: Request):
+    """1銘柄の予測（JSON）"""
+    snapshot = snapshots.current
+    body = snapshot.ticker_bodies.get(ticker)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"{ticker}の予測がありません")
+    
+    return cached_response(
+        request,
+        body,
+        f'"{snapshot.version}-{ticker}"',
+        snapshot.generated_at,
+        'application/json'
+    )
+
+@app.get("/prices/{ticker}")
+async def prices(ticker: str, limit: int = 90):
+    """直近の株価（列指向JSON）"""
+    if not TICKER_PATTERN.match(ticker):
+        raise HTTPException(status_code=400, detail="不正なティッカーです")
+    
+    table_name = ticker.replace('.', '_').replace('-', '_')
+    try:
+        columns, rows = await db.fetch(
+            f'SELECT * FROM "{table_name}" ORDER BY Date DESC LIMIT ?',
+            (max(1, min(limit, 5000)),)
+        )
+    except sqlite3.OperationalError:
+        raise HTTPException(status_code=404, detail=f"{ticker}の株価がありません")
+    
+    rows.reverse()
+    return {
+        'ticker': ticker,
+        'columns': {col: [row[i] for row in rows] for i, col in enumerate(columns)},
+    }
+
+@app.get("/history/{ticker}")
+async def history(
+    ticker: str,
+    request: Request,
+    range_: str = Query('3m', alias='range'),
+    resolution: str = 'auto'
+):
+    """
+    株価履歴（OHLCV + 予測値、列指向JSON）
+    
+    range: 1m / 3m / 6m / 1y / 5y / max
+    resolution: 1d / 1w / 1mo / auto（点数が上限に収まるよう自動選択）
+    """
+    if not TICKER_PATTERN.match(ticker):
+        raise HTTPException(status_code=400, detail="不正なティッカーです")
+    if range_ not in RANGES:
+        raise HTTPException(status_code=400, detail=f"rangeは {', '.join(RANGES)} のいずれか")
+    if resolution != 'auto' and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolutionは {', '.join(RESOLUTIONS)}, auto のいずれか")
+    
+    try:
+        body, etag = await history_service.get(ticker, range_, resolution)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"{ticker}の株価がありません")
+    
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def format_sse(event) -> str:
+    """イベントをSSE形式に整形"""
+    payload = json.dumps(event['data'], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+@app.get("/stream")
+async def stream(request: Request, tickers: str = ""):
+    """
+    収集状況・予測結果のストリーム（Server-Sent Events）
+    
+    パイプラインが銘柄を処理するたびにイベントを送る。
+    Last-Event-ID ヘッダーがあれば、切断中に発生したイベントから再送する
+    """
+    wanted = {t for t in tickers.split(',') if t}
+    last_id = request.headers.get('last-event-id')
+    queue = events.subscribe()
+    
+    async def generate():
+        try:
+            backlog = events.since(int(last_id)) if last_id and last_id.isdigit() else []
+            for event in backlog:
+                if not wanted or event['data'].get('ticker') in wanted:
+                    yield format_sse(event)
+            
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if not wanted or event['data'].get('ticker') in wanted:
+                    yield format_sse(event)
+        finally:
+            events.unsubscribe(queue)
     
-    return html
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # Systemdで常駐化
 # sudo systemctl start stock-prophet
 # sudo systemctl enable stock-prophet
-```
-
----
-
-## 🎯 **最終推奨プラン（VPS活用版）**
-
-### **Phase 1: Week 1（yfinance版）**
-1. ローカルPCで開発
-2. yfinanceでデータ収集
-3. モデル訓練・評価
-4. 基本的なシステム完成
-
-### **Phase 2: Week 2（VPS展開）**
-5. VPSにシステムデプロイ
-6. cron自動化設定
-7. Slack/メール通知実装
-8. FastAPI常駐
-
-### **Phase 3: 追加（スクレイピング版）**
-9. ガチスクレイピング版も作る
-10. 「43サイト実績」との整合性
-11. より詳細なデータ取得
-
----
-
-## 📊 **完成後のアピールポイント**
-```
-【株価予測システム】
-・XGBoost機械学習モデル（予測精度R² 0.89）
-・VPS上で24時間自動稼働
-・毎朝7時に自動予測＋Slack通知
-・FastAPIでリアルタイムダッシュボード公開
-・yfinance版とスクレイピング版の両方実装
-
-技術スタック：
-Python / XGBoost / yfinance / BeautifulSoup / 
-Selenium / FastAPI / SQLite / VPS / cron / Linux
-
-GitHub: [URL]
-デモサイト: http://your-vps-ip:8000
@@ -1,9 +1,11 @@
 # auto_stock_system.py
-import yfinance as yf
 import pandas as pd
+from config.stock_config import DB_PATH, get_all_tickers
+from bulk_download import download_bulk
+from notifier import Notifier
+from price_store import merge_prices
 import sqlite3
 from datetime import datetime, timedelta
-import requests
 from xgboost import XGBRegressor
 import joblib
 import logging
@@ -17,35 +19,31 @@ logging.basicConfig(
 
 class AutoStockSystem:
     def __init__(self):
-        self.db_path = '/home/stock_prophet/data/stock_data.db'
+        self.db_path = DB_PATH
         self.model_path = '/home/stock_prophet/models/best_model.pkl'
         self.model = joblib.load(self.model_path)
+        self.notifier = Notifier(self.db_path)
         
     def collect_data(self, tickers):
-        """株価データ収集"""
+        """株価データ収集（全銘柄を一括取得）"""
         logging.info("データ収集開始")
         
-        for ticker in tickers:
+        # 最新3ヶ月分
+        frames, failed = download_bulk(tickers)
+        
+        for ticker, df in frames.items():
             try:
-                # 最新3ヶ月分
-                df = yf.download(ticker, period='3mo')
+                # DB保存
+                conn = sqlite3.connect(self.db_path)
+                merge_prices(conn, ticker.replace('.', '_'), df)
+                conn.close()
                 
-                if len(df) > 0:
-                    # DB保存
-                    conn = sqlite3.connect(self.db_path)
-                    df.to_sql(
-                        ticker.replace('.', '_'), 
-                        conn, 
-                        if_exists='replace'
-                    )
-                    conn.close()
-                    
-                    logging.info(f"{ticker}: {len(df)}件取得完了")
-                else:
-                    logging.warning(f"{ticker}: データ取得失敗")
-                    
+                logging.info(f"{ticker}: {len(df)}件取得完了")
             except Exception as e:
                 logging.error(f"{ticker}: エラー - {e}")
+        
+        for ticker in failed:
+            logging.warning(f"{ticker}: データ取得失敗")
     
     def create_features(self, df):
         """特徴量作成"""
@@ -79,7 +77,7 @@ class AutoStockSystem:
             # DB読み込み
             conn = sqlite3.connect(self.db_path)
             df = pd.read_sql(
-                f"SELECT * FROM '{ticker.replace('.', '_')}'", 
+                f"SELECT * FROM '{ticker.replace('.', '_')}' ORDER BY Date", 
                 conn,
                 index_col='Date',
                 parse_dates=['Date']
@@ -114,12 +112,7 @@ class AutoStockSystem:
             return None
     
     def send_notification(self, predictions):
-        """Slack通知"""
-        # あなたの43サイト実績でChatWork使ってたので、それも対応
-        
-        # Slack Webhook URL
-        webhook_url = "YOUR_SLACK_WEBHOOK_URL"
-        
+        """Slack・ChatWork通知（キューに保存してバックグラウンドで送信）"""
         message = "📈 *本日の株価予測*\n\n"
         
         for pred in predictions:
@@ -130,20 +123,14 @@ class AutoStockSystem:
                 message += f"予測: ¥{pred['predicted_price']:,.0f}\n"
                 message += f"変化: {pred['change_percent']:+.2f}%\n\n"
         
-        requests.post(webhook_url, json={"text": message})
-        logging.info("通知送信完了")
+        self.notifier.notify(message)
     
     def run(self):
         """メイン処理"""
         logging.info("=== 自動株価予測システム起動 ===")
         
-        tickers = [
-            '7203.T',  # トヨタ
-            '6758.T',  # ソニー
-            '9984.T',  # ソフトバンク
-            'AAPL',    # Apple
-            'TSLA',    # Tesla
-        ]
+        # 監視対象は config/universe.csv
+        tickers = get_all_tickers()
         
         # データ収集
         self.collect_data(tickers)
@@ -158,6 +145,8 @@ class AutoStockSystem:
         # 通知
         if predictions:
             self.send_notification(predictions)
+        # 送りきれなかった通知は次回送信
+        self.notifier.close()
         
         logging.info("=== 処理完了 ===")
 
@@ -0,0 +1,365 @@
+"""
+履歴バックフィル
+複数年の株価を期間（チャンク）に分けて並列取得し、チャンクごとに冪等にDBへマージする。
+完了したチャンクは記録しておき、中断しても残りのチャンクから再開できる。
+初回に数年分を投入したあとは、通常の収集（直近90日のマージ保存）で差分更新する
+
+使い方:
+    python3 backfill.py --years 5 --workers 4 --rate 2
+    python3 backfill.py --tickers AAPL 7203.T --start 2015-01-01 --chunk-days 730
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config.stock_config import DB_PATH
+from event_bus import EventPublisher, events_path_for
+from pipeline_metrics import PipelineMetrics
+from price_store import merge_prices, table_name_for
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_TABLE = '_backfill_chunks'
+
+DEFAULT_YEARS = 5
+DEFAULT_CHUNK_DAYS = 365
+# 取得元へのリクエスト数の上限（回/秒）
+DEFAULT_RATE = 2.0
+# 進捗ログの間隔（チャンク数）
+PROGRESS_EVERY = 20
+
+DONE = 'done'
+FAILED = 'failed'
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+Chunk = Tuple[str, date, date]
+
+
+def date_chunks(start: date, end: date, chunk_days: int = DEFAULT_CHUNK_DAYS) -> List[Tuple[date, date]]:
+    """
+    期間をチャンクに分割（各チャンクは [開始, 終了) の半開区間）
+
+    境界は開始日から数えるので、終了日が変わっても最後のチャンク以外は同じになる（再開時に完了済みと一致する）
+
+    Args:
+        start: 開始日
+        end: 終了日（含まない）
+        chunk_days: 1チャンクの日数
+
+    Returns:
+        [(開始, 終了), ...]（新しい期間から順に。直近のデータが先に揃う）
+    """
+    chunks = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days))
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end
+    return chunks[::-1]
+
+
+def fetch_yfinance(ticker: str, start: date, end: date) -> Optional[pd.DataFrame]:
+    """
+    yfinanceで1チャンク分の日足を取得
+
+    Args:
+        ticker: ティッカーシンボル
+        start: 開始日
+        end: 終了日（含まない）
+
+    Returns:
+        Date をインデックスに持つ株価データ（データがなければ空のDataFrame）
+    """
+    import yfinance as yf
+
+    df = yf.Ticker(ticker).history(start=start.isoformat(), end=end.isoformat(), auto_adjust=False)
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=PRICE_COLUMNS)
+
+    df = df[[c for c in PRICE_COLUMNS if c in df.columns]]
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index = df.index.normalize().rename('Date')
+    return df
+
+
+class RateLimiter:
+    """トークンバケット方式のレート制限（スレッド間で共有）"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        初期化
+
+        Args:
+            rate: 1秒あたりの許可数
+            burst: 一度に許可できる最大数
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """許可が出るまで待つ"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class BackfillEngine:
+    """チャンク単位の並列バックフィル（株価DBと同じファイルに進捗を保存）"""
+
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        chunk_days: int = DEFAULT_CHUNK_DAYS,
+        workers: int = 4,
+        rate: float = DEFAULT_RATE,
+        fetcher: Callable[[str, date, date], Optional[pd.DataFrame]] = fetch_yfinance,
+        metrics: Optional[PipelineMetrics] = None
+    ):
+        """
+        初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            chunk_days: 1チャンクの日数
+            workers: 並列取得数
+            rate: 取得元へのリクエスト数の上限（回/秒、全ワーカー合計）
+            fetcher: (ticker, 開始, 終了) → DataFrame の取得関数
+            metrics: 計測の記録先（省略時は新規作成）
+        """
+        self.db_path = db_path
+        self.chunk_days = chunk_days
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=max(1, workers))
+        self.fetcher = fetcher
+        self.metrics = metrics or PipelineMetrics('backfill', self.db_path)
+        self.events = EventPublisher(events_path_for(self.db_path))
+
+        # 書き込みは1スレッドずつ（取得は並列、SQLiteへのコミットは直列）
+        self._write_lock = threading.Lock()
+        self._ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHUNKS_TABLE} (
+                ticker TEXT NOT NULL,
+                chunk_start TEXT NOT NULL,
+                chunk_end TEXT NOT NULL,
+                status TEXT NOT NULL,
+                rows INTEGER DEFAULT 0,
+                elapsed_sec REAL,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (ticker, chunk_start, chunk_end)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def plan(self, tickers: List[str], start: date, end: date, resume: bool = True) -> List[Chunk]:
+        """
+        取得するチャンクの一覧を作る
+
+        Args:
+            tickers: 対象銘柄
+            start: 開始日
+            end: 終了日（含まない）
+            resume: Trueなら完了済みのチャンクを除く
+
+        Returns:
+            [(ticker, 開始, 終了), ...]（チャンクの新しい順 × 銘柄順。直近の期間が全銘柄で先に揃う）
+        """
+        ranges = date_chunks(start, end, self.chunk_days)
+
+        done = set()
+        if resume:
+            conn = self._connect()
+            done = set(conn.execute(
+                f"SELECT ticker, chunk_start, chunk_end FROM {CHUNKS_TABLE} WHERE status = ?", (DONE,)
+            ).fetchall())
+            conn.close()
+
+        return [
+            (ticker, chunk_start, chunk_end)
+            for chunk_start, chunk_end in ranges
+            for ticker in tickers
+            if (ticker, chunk_start.isoformat(), chunk_end.isoformat()) not in done
+        ]
+
+    def _commit_chunk(self, chunk: Chunk, df: Optional[pd.DataFrame], elapsed: float,
+                      error: Optional[str] = None) -> int:
+        """チャンクの株価と完了記録を同じトランザクションで書き込む"""
+        ticker, chunk_start, chunk_end = chunk
+        rows = 0
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                if error is None and df is not None and len(df) > 0:
+                    rows = merge_prices(conn, table_name_for(ticker), df, commit=False)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {CHUNKS_TABLE} "
+                    "(ticker, chunk_start, chunk_end, status, rows, elapsed_sec, error, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (ticker, chunk_start.isoformat(), chunk_end.isoformat(),
+                     FAILED if error else DONE, rows, round(elapsed, 3), error,
+                     datetime.now().isoformat(timespec='seconds'))
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+        return rows
+
+    def _process(self, chunk: Chunk) -> Tuple[int, Optional[str]]:
+        ticker, chunk_start, chunk_end = chunk
+        self.limiter.acquire()
+
+        started = time.perf_counter()
+        try:
+            df = self.fetcher(ticker, chunk_start, chunk_end)
+            error = None
+        except Exception as e:
+            df, error = None, str(e)
+        elapsed = time.perf_counter() - started
+        self.metrics.observe('chunk_fetch_seconds', elapsed)
+
+        rows = self._commit_chunk(chunk, df, elapsed, error)
+        return rows, error
+
+    def run(
+        self,
+        tickers: List[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        years: int = DEFAULT_YEARS,
+        resume: bool = True
+    ) -> Dict[str, float]:
+        """
+        バックフィルを実行
+
+        Args:
+            tickers: 対象銘柄
+            start: 開始日（省略時は years 年前の1月1日）
+            end: 終了日（含まない、省略時は明日＝今日まで）
+            years: start 省略時の年数
+            resume: Trueなら完了済みのチャンクは取得しない
+
+        Returns:
+            {'chunks', 'done', 'failed', 'rows', 'seconds', 'rows_per_sec'}
+        """
+        end = end or date.today() + timedelta(days=1)
+        # 既定の開始日は年初に揃える（日をまたいで再開してもチャンクの境界が変わらない）
+        start = start or date(end.year - years, 1, 1)
+
+        chunks = self.plan(tickers, start, end, resume)
+        logger.info(
+            f"📚 バックフィル開始: {len(tickers)}銘柄 {start}〜{end - timedelta(days=1)} "
+            f"({len(chunks)}チャンク、並列{self.workers}、{self.limiter.rate}回/秒)"
+        )
+
+        total_rows = 0
+        failed = 0
+        completed = 0
+        started = time.perf_counter()
+
+        with self.metrics.stage('backfill'), ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._process, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                ticker, chunk_start, chunk_end = futures[future]
+                completed += 1
+                try:
+                    rows, error = future.result()
+                except Exception as e:
+                    rows, error = 0, str(e)
+
+                if error:
+                    failed += 1
+                    logger.warning(f"⚠️ {ticker} {chunk_start}〜{chunk_end}: {error}")
+                else:
+                    total_rows += rows
+                    self.metrics.inc('rows_ingested', rows)
+                self.events.publish('backfill', {
+                    'ticker': ticker, 'start': chunk_start.isoformat(), 'end': chunk_end.isoformat(),
+                    'status': FAILED if error else DONE, 'rows': rows,
+                })
+
+                if completed % PROGRESS_EVERY == 0 or completed == len(chunks):
+                    elapsed = time.perf_counter() - started
+                    logger.info(
+                        f"📈 {completed}/{len(chunks)}チャンク {total_rows:,}行 "
+                        f"({total_rows / elapsed if elapsed > 0 else 0:,.0f}行/秒)"
+                    )
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'chunks': len(chunks),
+            'done': len(chunks) - failed,
+            'failed': failed,
+            'rows': total_rows,
+            'seconds': round(elapsed, 2),
+            'rows_per_sec': round(total_rows / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        self.metrics.set('rows_per_sec', summary['rows_per_sec'])
+        self.metrics.set('chunks', summary['done'], status=DONE)
+        self.metrics.set('chunks', failed, status=FAILED)
+        logger.info(f"✅ バックフィル完了: {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    from config.stock_config import get_all_tickers
+    from resource_sampler import ResourceSampler
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='複数年の履歴バックフィル')
+    parser.add_argument('--tickers', nargs='*', help='対象銘柄（省略時は全銘柄）')
+    parser.add_argument('--years', type=int, default=DEFAULT_YEARS, help='取得年数（--start 省略時）')
+    parser.add_argument('--start', type=date.fromisoformat, help='開始日（YYYY-MM-DD）')
+    parser.add_argument('--end', type=date.fromisoformat, help='終了日（含まない、YYYY-MM-DD）')
+    parser.add_argument('--chunk-days', type=int, default=DEFAULT_CHUNK_DAYS, help='1チャンクの日数')
+    parser.add_argument('--workers', type=int, default=4, help='並列取得数')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='リクエスト数の上限（回/秒）')
+    parser.add_argument('--no-resume', action='store_true', help='完了済みのチャンクも取り直す')
+    parser.add_argument('--db', default=DB_PATH, help='株価DBのパス')
+    args = parser.parse_args()
+
+    engine = BackfillEngine(args.db, args.chunk_days, args.workers, args.rate)
+    with ResourceSampler(engine.metrics):
+        engine.run(
+            args.tickers or get_all_tickers(),
+            start=args.start,
+            end=args.end,
+            years=args.years,
+            resume=not args.no_resume
+        )
+    engine.metrics.export()
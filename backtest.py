@@ -0,0 +1,265 @@
+"""
+予測精度のバックテスト
+保存済みの予測を実際の終値と1回のクエリ・1回の結合で突き合わせ、
+銘柄×モデルごとのローリング精度（MAE・的中率・方向一致率・R²）を記録する
+"""
+import sys
+sys.path.append('.')
+
+import logging
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from change_detector import is_internal_table
+from config.stock_config import DB_PATH
+from prediction_store import PredictionStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ACCURACY_TABLE = 'prediction_accuracy'
+
+# ローリング窓（予測対象日の件数）
+WINDOW = 20
+# 予測誤差がこの割合（%）以内なら的中とみなす
+HIT_TOLERANCE_PERCENT = 1.0
+# モデル全体の集計に使う銘柄名
+ALL_TICKERS = '*'
+
+# ローリング合計を取る列（平均・R²はここから計算する）
+SUM_COLUMNS = ['n', 'abs_err', 'pct_err', 'direction', 'hit', 'sq_err', 'actual', 'actual_sq']
+
+
+def load_closes(conn: sqlite3.Connection, tickers: List[str], since: str) -> pd.DataFrame:
+    """
+    複数銘柄の終値を1回のクエリで縦長に読み込む
+    
+    Args:
+        conn: SQLite接続
+        tickers: 銘柄リスト
+        since: この日付以降（'YYYY-MM-DD'）
+    
+    Returns:
+        ticker, target_date, actual 列のDataFrame
+    """
+    existing = {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        if not is_internal_table(row[0])
+    }
+    
+    selects = []
+    params = []
+    for ticker in tickers:
+        table_name = ticker.replace('.', '_').replace('-', '_')
+        if table_name not in existing:
+            continue
+        selects.append(
+            f'SELECT ? AS ticker, substr(Date, 1, 10) AS target_date, Close AS actual '
+            f'FROM "{table_name}" WHERE Date >= ?'
+        )
+        params.extend([ticker, since])
+    
+    if not selects:
+        return pd.DataFrame(columns=['ticker', 'target_date', 'actual'])
+    
+    return pd.read_sql(' UNION ALL '.join(selects), conn, params=params)
+
+
+def score_predictions(predictions: pd.DataFrame, closes: pd.DataFrame) -> pd.DataFrame:
+    """
+    予測と実績を結合し、1件ごとの誤差を計算
+    
+    Args:
+        predictions: 予測ストアの内容
+        closes: load_closes の結果
+    
+    Returns:
+        予測1件1行の誤差DataFrame（実績がまだない予測は含まない）
+    """
+    df = predictions.merge(closes, on=['ticker', 'target_date'], how='inner')
+    
+    predicted = df['predicted_price'].to_numpy(dtype='float64')
+    actual = df['actual'].to_numpy(dtype='float64')
+    current = df['current_price'].to_numpy(dtype='float64')
+    err = predicted - actual
+    
+    df['n'] = 1.0
+    df['abs_err'] = np.abs(err)
+    df['pct_err'] = np.abs(err) / actual * 100
+    df['direction'] = (np.sign(predicted - current) == np.sign(actual - current)).astype('float64')
+    df['hit'] = (df['pct_err'] <= HIT_TOLERANCE_PERCENT).astype('float64')
+    df['sq_err'] = err ** 2
+    df['actual_sq'] = actual ** 2
+    
+    return df.sort_values(['model_version', 'ticker', 'target_date'])
+
+
+def rolling_metrics(scored: pd.DataFrame, keys: List[str], window: int) -> pd.DataFrame:
+    """
+    グループごとにローリング合計を取り、精度指標に変換
+    
+    Args:
+        scored: score_predictions の結果（keys + target_date ごとに合計済みでもよい）
+        keys: グループ化の列
+        window: 窓の長さ（予測対象日の件数）
+    
+    Returns:
+        keys, as_of と精度指標のDataFrame
+    """
+    sums = (
+        scored.groupby(keys, sort=False)[SUM_COLUMNS]
+        .rolling(window, min_periods=1).sum()
+        .reset_index(level=list(range(len(keys))))
+    )
+    sums['as_of'] = scored.loc[sums.index, 'target_date'].to_numpy()
+    
+    n = sums['n']
+    # R² = 1 - 残差平方和 / 全平方和（訓練時の model.score と同じ定義、価格水準で計算）
+    sst = sums['actual_sq'] - sums['actual'] ** 2 / n
+    r2 = 1 - sums['sq_err'] / sst.where(sst > 0)
+    
+    return pd.DataFrame({
+        **{key: sums[key] for key in keys},
+        'as_of': sums['as_of'],
+        'window_size': window,
+        'n': n.astype(int),
+        'mae': sums['abs_err'] / n,
+        'mape': sums['pct_err'] / n,
+        'directional_accuracy': sums['direction'] / n,
+        'hit_rate': sums['hit'] / n,
+        'r2': r2,
+    })
+
+
+class Backtester:
+    """予測精度の継続計測"""
+    
+    def __init__(self, db_path: str = DB_PATH, window: int = WINDOW):
+        """
+        初期化
+        
+        Args:
+            db_path: 株価DBのパス
+            window: ローリング窓の長さ
+        """
+        self.db_path = db_path
+        self.window = window
+        self.store = PredictionStore(db_path)
+        self._ensure_table()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {ACCURACY_TABLE} (
+                ticker TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                as_of TEXT NOT NULL,
+                window_size INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                mae REAL,
+                mape REAL,
+                directional_accuracy REAL,
+                hit_rate REAL,
+                r2 REAL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (ticker, model_version, as_of)
+            )
+        """)
+        conn.commit()
+        conn.close()
+    
+    def run(self, since: Optional[str] = None) -> pd.DataFrame:
+        """
+        バックテストを実行し、精度テーブルを更新
+        
+        Args:
+            since: この日付以降の予測対象日だけ計算（省略時は全期間）
+        
+        Returns:
+            更新した精度のDataFrame
+        """
+        predictions = self.store.load(since)
+        if len(predictions) == 0:
+            logger.warning("⚠️  予測がまだ保存されていません")
+            return pd.DataFrame()
+        
+        conn = self._connect()
+        closes = load_closes(
+            conn,
+            predictions['ticker'].unique().tolist(),
+            predictions['target_date'].min()
+        )
+        conn.close()
+        
+        scored = score_predictions(predictions, closes)
+        if len(scored) == 0:
+            logger.info("💤 実績が確定した予測なし")
+            return pd.DataFrame()
+        
+        per_ticker = rolling_metrics(scored, ['ticker', 'model_version'], self.window)
+        
+        # モデル全体: 予測対象日ごとに全銘柄を合計してからローリング
+        daily = (
+            scored.groupby(['model_version', 'target_date'], as_index=False)[SUM_COLUMNS].sum()
+            .sort_values(['model_version', 'target_date'])
+            .reset_index(drop=True)
+        )
+        overall = rolling_metrics(daily, ['model_version'], self.window)
+        overall['ticker'] = ALL_TICKERS
+        
+        accuracy = pd.concat([per_ticker, overall], ignore_index=True)
+        self._save(accuracy)
+        
+        latest = overall.sort_values('as_of').groupby('model_version').tail(1)
+        for row in latest.itertuples():
+            r2 = f"{row.r2:.3f}" if pd.notna(row.r2) else '-'
+            logger.info(
+                f"📏 {row.model_version} ({row.as_of}, 直近{row.n}件): "
+                f"MAE {row.mae:.2f} / 方向一致 {row.directional_accuracy:.1%} / "
+                f"的中率 {row.hit_rate:.1%} / R² {r2}"
+            )
+        
+        logger.info(f"✅ バックテスト完了: 予測{len(scored)}件を評価")
+        return accuracy
+    
+    def _save(self, accuracy: pd.DataFrame) -> None:
+        now = datetime.now().isoformat(timespec='seconds')
+        columns = ['ticker', 'model_version', 'as_of', 'window_size', 'n',
+                   'mae', 'mape', 'directional_accuracy', 'hit_rate', 'r2']
+        rows = [
+            tuple(None if pd.isna(v) else v for v in row) + (now,)
+            for row in accuracy[columns].itertuples(index=False)
+        ]
+        
+        conn = self._connect()
+        conn.executemany(f"""
+            INSERT OR REPLACE INTO {ACCURACY_TABLE}
+                ({', '.join(columns)}, updated_at)
+            VALUES ({', '.join('?' * (len(columns) + 1))})
+        """, rows)
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='予測精度のバックテスト')
+    parser.add_argument('--db', default=DB_PATH, help='株価DBのパス')
+    parser.add_argument('--since', help='この日付以降の予測対象日だけ計算（YYYY-MM-DD）')
+    parser.add_argument('--window', type=int, default=WINDOW, help='ローリング窓の長さ')
+    parser.add_argument('--compact', action='store_true', help='計算後に保持期間切れの予測を削除')
+    args = parser.parse_args()
+    
+    backtester = Backtester(args.db, args.window)
+    backtester.run(args.since)
+    
+    if args.compact:
+        backtester.store.compact()
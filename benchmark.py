@@ -0,0 +1,245 @@
+"""
+オフライン・エンドツーエンドベンチマーク
+ローカルのフィクスチャサーバーを相手に 収集 → 保存 → 読み込み → 特徴量 → 訓練 → 予測 を通しで実行し、
+フェーズごとのスループットとピークメモリ（Chromiumを含む）をJSONレポートに出力する
+
+使い方:
+    python3 benchmark.py --tickers 20 --scraper optimized --latency-ms 200 --error-rate 0.05
+    python3 benchmark.py --tickers 20 --scraper fixed --output ./data/benchmarks/fixed.json
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from fixture_server import YahooFixtureServer
+from pipeline_metrics import PipelineMetrics
+from resource_sampler import ResourceSampler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCRAPERS = ('fixed', 'optimized', 'sharded')
+
+
+def benchmark_tickers(n: int) -> List[str]:
+    """合成銘柄のティッカー（'BM0001' など）"""
+    return [f'BM{i:04d}' for i in range(1, n + 1)]
+
+
+def _collect(scraper: str, db_path: str, tickers: List[str], metrics: PipelineMetrics,
+             request_interval: float, workers: Optional[int], base_url: str) -> Dict[str, pd.DataFrame]:
+    if scraper == 'fixed':
+        from scraper_fixed import StockScraperFixed
+        collector = StockScraperFixed(db_path, metrics=metrics, base_url=base_url)
+        collector.request_interval = request_interval
+        return collector.scrape_multiple(tickers)
+    
+    if scraper == 'optimized':
+        from playwright_scraper_optimized import OptimizedStockScraper
+        collector = OptimizedStockScraper(db_path, metrics=metrics, base_url=base_url)
+        collector.request_interval = request_interval
+        return collector.run(tickers)
+    
+    from sharded_scraper import ShardedScraper
+    collector = ShardedScraper(db_path, max_workers=workers, base_url=base_url)
+    return collector.run(tickers)
+
+
+def _phase(report: Dict[str, Any], name: str, started: float, items: int, rows: int = 0) -> None:
+    elapsed = time.perf_counter() - started
+    report['phases'][name] = {
+        'seconds': round(elapsed, 3),
+        'items': items,
+        'rows': rows,
+        'items_per_sec': round(items / elapsed, 2) if elapsed > 0 else None,
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 and rows else None,
+    }
+    logger.info(f"⏱️  {name}: {elapsed:.2f}秒 ({items}件)")
+
+
+def run_benchmark(
+    n_tickers: int = 10,
+    scraper: str = 'optimized',
+    rows: int = 120,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    request_interval: float = 0.0,
+    workers: Optional[int] = None,
+    fixtures_dir: Optional[str] = None,
+    workdir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    ベンチマークを実行
+    
+    Args:
+        n_tickers: 銘柄数
+        scraper: 収集方式（'fixed', 'optimized', 'sharded'）
+        rows: 合成ページの行数
+        latency_ms: フィクスチャサーバーの応答遅延（ミリ秒）
+        jitter_ms: 遅延のばらつき（±ミリ秒）
+        error_rate: エラー応答の割合
+        request_interval: 銘柄間の待機秒数（本番は 1〜3秒）
+        workers: sharded のワーカー数上限
+        fixtures_dir: 保存済みHTMLのディレクトリ
+        workdir: DB・モデルの作業ディレクトリ（省略時は一時ディレクトリを作って最後に削除）
+    
+    Returns:
+        レポートの辞書
+    """
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='stock_prophet_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, 'stock_data.db')
+    model_path = os.path.join(workdir, 'stock_model.pkl')
+    
+    tickers = benchmark_tickers(n_tickers)
+    metrics = PipelineMetrics('benchmark', db_path, textfile_dir=os.path.join(workdir, 'metrics'))
+    
+    report: Dict[str, Any] = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'tickers': n_tickers,
+            'scraper': scraper,
+            'rows': rows,
+            'latency_ms': latency_ms,
+            'jitter_ms': jitter_ms,
+            'error_rate': error_rate,
+            'request_interval': request_interval,
+            'workers': workers,
+            'fixtures_dir': fixtures_dir,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'phases': {},
+    }
+    
+    server = YahooFixtureServer(
+        rows=rows, latency_ms=latency_ms, jitter_ms=jitter_ms,
+        error_rate=error_rate, fixtures_dir=fixtures_dir
+    )
+    
+    try:
+        with server:
+            sampler = ResourceSampler(metrics, interval=0.2)
+            with sampler:
+                # 1. 収集・保存（スクレイパーが銘柄ごとにDBへ保存する）
+                started = time.perf_counter()
+                with metrics.stage('collect'):
+                    results = _collect(scraper, db_path, tickers, metrics, request_interval, workers, server.url)
+                _phase(report, 'collect', started, len(results), sum(len(df) for df in results.values()))
+                report['success_rate'] = round(len(results) / n_tickers, 4) if n_tickers else None
+                report['server'] = dict(server.stats)
+                
+                from predict_system import StockPredictionSystem
+                from train_model import StockPredictor
+                
+                # 2. 読み込み（保存形式の比較用）
+                started = time.perf_counter()
+                frames = {}
+                with metrics.stage('load'):
+                    conn = sqlite3.connect(db_path)
+                    for ticker in results:
+                        table_name = ticker.replace('.', '_').replace('-', '_')
+                        frames[ticker] = pd.read_sql(
+                            f"SELECT * FROM '{table_name}' ORDER BY Date", conn, parse_dates=['Date']
+                        ).set_index('Date')
+                    conn.close()
+                _phase(report, 'load', started, len(frames), sum(len(df) for df in frames.values()))
+                
+                # 3. 特徴量
+                predictor_system = StockPredictionSystem(db_path, model_path, metrics=metrics)
+                started = time.perf_counter()
+                with metrics.stage('features'):
+                    feature_rows = sum(len(predictor_system.create_features(df.copy())) for df in frames.values())
+                _phase(report, 'features', started, len(frames), feature_rows)
+                
+                # 4. 訓練
+                started = time.perf_counter()
+                model = StockPredictor(db_path, model_path, metrics=metrics).train()
+                _phase(report, 'train', started, 1 if model is not None else 0)
+                
+                # 5. 予測
+                predictions = []
+                if model is not None:
+                    started = time.perf_counter()
+                    predictions = predictor_system.predict_all(list(results))
+                    _phase(report, 'predict', started, len(predictions))
+                report['predictions'] = len(predictions)
+            
+            report['resources'] = {
+                stage: {key: round(value, 1) for key, value in values.items()}
+                for stage, values in sampler.stage_summary().items()
+            }
+            report['peak_rss_mb'] = round(max(
+                (values['peak_rss_mb'] for values in sampler.stage_summary().values()), default=0.0
+            ), 1)
+        
+        report['db_size_mb'] = round(os.path.getsize(db_path) / 1024**2, 2) if os.path.exists(db_path) else 0
+        report['total_seconds'] = round(sum(p['seconds'] for p in report['phases'].values()), 3)
+        metrics.export()
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='オフライン・エンドツーエンドベンチマーク')
+    parser.add_argument('--tickers', type=int, default=10, help='銘柄数')
+    parser.add_argument('--scraper', choices=SCRAPERS, default='optimized', help='収集方式')
+    parser.add_argument('--rows', type=int, default=120, help='履歴ページの行数')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='応答遅延（ミリ秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='遅延のばらつき（±ミリ秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='エラー応答の割合（0〜1）')
+    parser.add_argument('--request-interval', type=float, default=0.0, help='銘柄間の待機秒数')
+    parser.add_argument('--workers', type=int, help='sharded のワーカー数上限')
+    parser.add_argument('--fixtures-dir', help="保存済みHTML（'<ticker>.html'）のディレクトリ")
+    parser.add_argument('--workdir', help='作業ディレクトリ（指定時は削除しない）')
+    parser.add_argument('--output', help='レポートの出力先（省略時は ./data/benchmarks/ に日時付きで保存）')
+    args = parser.parse_args()
+    
+    report = run_benchmark(
+        n_tickers=args.tickers,
+        scraper=args.scraper,
+        rows=args.rows,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        request_interval=args.request_interval,
+        workers=args.workers,
+        fixtures_dir=args.fixtures_dir,
+        workdir=args.workdir
+    )
+    
+    output = args.output or os.path.join(
+        './data/benchmarks', f"{args.scraper}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    print("=" * 60)
+    print("📊 ベンチマーク結果")
+    print("=" * 60)
+    for name, phase in report['phases'].items():
+        print(f"  {name:10s} {phase['seconds']:8.2f}秒  {phase['items']}件")
+    print(f"  成功率: {report.get('success_rate')} / ピークRSS: {report.get('peak_rss_mb')}MB")
+    print(f"  レポート: {output}")
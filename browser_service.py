@@ -0,0 +1,316 @@
+"""
+常駐ブラウザサービス
+ローカルホストでCDPエンドポイント付きのHeadless Chromiumを起動したままにし、
+スクレイパーは起動・終了のたびにChromiumを立ち上げる代わりにそこへ接続する。
+ヘルスチェックで応答がなければ再起動し、メモリが上限を超えたら空いている時に入れ替える
+
+使い方:
+    python3 browser_service.py --port 9222 --max-rss-mb 1500
+    STOCK_PROPHET_BROWSER_URL=http://127.0.0.1:9222 python3 scraper_fixed.py --scheduled
+    python3 browser_service.py --status
+"""
+import argparse
+import json
+import logging
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+import psutil
+
+from config.stock_config import BROWSER_ENDPOINT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9222
+# 接続前のヘルスチェックの待ち時間（応答がなければ自前で起動する）
+HEALTH_TIMEOUT = 1.0
+# 起動後にエンドポイントが応答するまでの待ち時間
+STARTUP_TIMEOUT = 30.0
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-software-rasterizer',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-sync',
+]
+
+
+def _get_json(endpoint: str, path: str, timeout: float = HEALTH_TIMEOUT):
+    with urllib.request.urlopen(f"{endpoint.rstrip('/')}{path}", timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def is_healthy(endpoint: str, timeout: float = HEALTH_TIMEOUT) -> bool:
+    """
+    CDPエンドポイントが応答するか
+
+    Args:
+        endpoint: 'http://127.0.0.1:9222' 形式のURL
+        timeout: 待ち時間（秒）
+
+    Returns:
+        /json/version が応答すればTrue
+    """
+    try:
+        return 'webSocketDebuggerUrl' in _get_json(endpoint, '/json/version', timeout)
+    except Exception:
+        return False
+
+
+def open_browser(p, args: Optional[List[str]] = None, endpoint: Optional[str] = BROWSER_ENDPOINT):
+    """
+    常駐ブラウザがあれば接続し、なければこれまで通りChromiumを起動する
+
+    どちらの場合も browser.close() で後始末できる（接続時は自分が作ったコンテキストだけを閉じて切断する）
+
+    Args:
+        p: sync_playwright() のインスタンス
+        args: 自前で起動する場合のChromium引数
+        endpoint: 常駐ブラウザのURL（省略時は STOCK_PROPHET_BROWSER_URL）
+
+    Returns:
+        Browser
+    """
+    if endpoint and is_healthy(endpoint):
+        try:
+            browser = p.chromium.connect_over_cdp(endpoint)
+            logger.info(f"🔌 常駐ブラウザに接続: {endpoint}")
+            return browser
+        except Exception as e:
+            logger.warning(f"⚠️ 常駐ブラウザに接続できません（自前で起動します）: {e}")
+    elif endpoint:
+        logger.warning(f"⚠️ 常駐ブラウザが応答しません（自前で起動します）: {endpoint}")
+
+    return p.chromium.launch(headless=True, args=args or [])
+
+
+class BrowserCrashed(Exception):
+    """収集中にブラウザが落ちた（残りの銘柄はブラウザを起動し直してから処理する）"""
+
+    def __init__(self, ticker: str, results: Optional[Dict] = None):
+        super().__init__(f'ブラウザ切断（{ticker}の処理中）')
+        # 処理中だった銘柄（未完了として戻す）
+        self.ticker = ticker
+        # 落ちる前に取得できた {ticker: DataFrame}
+        self.results = results or {}
+
+
+# ブラウザ・コンテキストが閉じられたときの Playwright のエラーメッセージ
+# （'Target page, context or browser has been closed' など。ページはこちらが閉じるまで使い続ける）
+_CLOSED_MESSAGES = ('Target closed', 'has been closed', 'Browser closed')
+
+
+def is_browser_lost(browser, error: Optional[BaseException] = None) -> bool:
+    """
+    ブラウザとの接続が切れたか（ページ単位の失敗と区別する）
+
+    Args:
+        browser: Browser（None なら error のみで判定）
+        error: 発生した例外
+
+    Returns:
+        切断されていればTrue
+    """
+    if browser is not None and not browser.is_connected():
+        return True
+    return error is not None and any(message in str(error) for message in _CLOSED_MESSAGES)
+
+
+def _chromium_executable() -> str:
+    """Playwrightが管理するChromiumの実行ファイル"""
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as p:
+        return p.chromium.executable_path
+
+
+class BrowserService:
+    """CDPエンドポイント付きChromiumの起動・監視・入れ替え"""
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        max_rss_mb: float = 1500.0,
+        check_interval: float = 30.0,
+        executable: Optional[str] = None,
+        extra_args: Optional[List[str]] = None
+    ):
+        """
+        初期化
+
+        Args:
+            port: リモートデバッグポート（127.0.0.1 でのみ待ち受ける）
+            max_rss_mb: Chromiumプロセス群のRSS合計の上限（超えたら入れ替え）
+            check_interval: ヘルスチェックの間隔（秒）
+            executable: Chromiumの実行ファイル（省略時はPlaywrightのもの）
+            extra_args: 追加のChromium引数
+        """
+        self.port = port
+        self.max_rss_mb = max_rss_mb
+        self.check_interval = check_interval
+        self.executable = executable
+        self.args = BROWSER_ARGS + (extra_args or [])
+
+        self.stats: Dict[str, int] = {'starts': 0, 'restarts': 0, 'recycles': 0}
+        self._process: Optional[subprocess.Popen] = None
+        self._profile_dir: Optional[str] = None
+        self._stop = threading.Event()
+
+    @property
+    def endpoint(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self) -> None:
+        """Chromiumを起動し、エンドポイントが応答するまで待つ"""
+        self.executable = self.executable or _chromium_executable()
+        self._profile_dir = tempfile.mkdtemp(prefix='stock_prophet_browser_')
+
+        command = [
+            self.executable,
+            '--headless=new',
+            '--remote-debugging-address=127.0.0.1',
+            f'--remote-debugging-port={self.port}',
+            f'--user-data-dir={self._profile_dir}',
+            *self.args,
+            'about:blank',
+        ]
+        self._process = subprocess.Popen(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        self.stats['starts'] += 1
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Chromiumが起動直後に終了しました (終了コード {self._process.returncode})")
+            if is_healthy(self.endpoint):
+                logger.info(f"🌐 常駐ブラウザ起動: {self.endpoint} (PID {self._process.pid})")
+                return
+            time.sleep(0.2)
+
+        self.stop()
+        raise RuntimeError(f"Chromiumのエンドポイントが {STARTUP_TIMEOUT:.0f}秒以内に応答しませんでした")
+
+    def stop(self) -> None:
+        """Chromiumを終了してプロファイルを削除"""
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        self._process = None
+
+        if self._profile_dir:
+            shutil.rmtree(self._profile_dir, ignore_errors=True)
+            self._profile_dir = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def rss_mb(self) -> float:
+        """Chromiumプロセス群（レンダラ等の子プロセスを含む）のRSS合計"""
+        if self._process is None:
+            return 0.0
+        try:
+            root = psutil.Process(self._process.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return 0.0
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total / 1024**2
+
+    def in_use(self) -> bool:
+        """about:blank 以外のページが開いていれば、スクレイパーが接続中とみなす"""
+        try:
+            targets = _get_json(self.endpoint, '/json/list')
+        except Exception:
+            return False
+        return any(t.get('type') == 'page' and t.get('url') != 'about:blank' for t in targets)
+
+    def check(self) -> str:
+        """
+        ヘルスチェックを1回行い、必要なら再起動・入れ替えする
+
+        メモリ超過時の入れ替えは接続中のスクレイパーがいない時だけ行う
+        （上限の1.5倍を超えた場合は接続中でも入れ替える）
+
+        Returns:
+            'ok', 'restarted', 'recycled', 'busy' のいずれか
+        """
+        if self._process is None or self._process.poll() is not None or not is_healthy(self.endpoint, timeout=5):
+            logger.warning("⚠️ 常駐ブラウザが応答しません。再起動します")
+            self.restart()
+            self.stats['restarts'] += 1
+            return 'restarted'
+
+        rss = self.rss_mb()
+        if rss <= self.max_rss_mb:
+            return 'ok'
+
+        if self.in_use() and rss <= self.max_rss_mb * 1.5:
+            logger.info(f"⏳ メモリ上限超過 ({rss:.0f}MB) ですが接続中のため入れ替えを延期します")
+            return 'busy'
+
+        logger.info(f"♻️ メモリ上限超過 ({rss:.0f}MB > {self.max_rss_mb:.0f}MB)。ブラウザを入れ替えます")
+        self.restart()
+        self.stats['recycles'] += 1
+        return 'recycled'
+
+    def serve_forever(self) -> None:
+        """起動してヘルスチェックを繰り返す（SIGTERM・Ctrl+Cで終了）"""
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        self.start()
+        try:
+            while not self._stop.wait(self.check_interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f"❌ 常駐ブラウザの再起動に失敗: {e}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            logger.info(f"🛑 常駐ブラウザ停止 {self.stats}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='常駐ブラウザサービス（CDPエンドポイント）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='リモートデバッグポート')
+    parser.add_argument('--max-rss-mb', type=float, default=1500.0, help='入れ替えるRSS合計（MB）')
+    parser.add_argument('--check-interval', type=float, default=30.0, help='ヘルスチェック間隔（秒）')
+    parser.add_argument('--executable', help='Chromiumの実行ファイル（省略時はPlaywrightのもの）')
+    parser.add_argument('--status', action='store_true', help='エンドポイントの状態を表示して終了')
+    args = parser.parse_args()
+
+    if args.status:
+        endpoint = BROWSER_ENDPOINT or f'http://127.0.0.1:{args.port}'
+        if is_healthy(endpoint):
+            version = _get_json(endpoint, '/json/version')
+            pages = [t for t in _get_json(endpoint, '/json/list') if t.get('type') == 'page']
+            print(f"✅ {endpoint}: {version.get('Browser')} / ページ {len(pages)}")
+        else:
+            print(f"❌ {endpoint}: 応答なし")
+            raise SystemExit(1)
+    else:
+        BrowserService(args.port, args.max_rss_mb, args.check_interval, args.executable).serve_forever()
@@ -0,0 +1,68 @@
+"""
+yfinanceでの一括取得
+複数銘柄をバッチごとに1回の yf.download で取得し、銘柄ごとのDataFrameに分割する。
+yfinance と pandas にだけ依存する（playwright が入っていない環境からも使える）
+"""
+import logging
+
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+# 1回のyf.downloadで要求する銘柄数（バッチ内はyfinanceがスレッドで並列取得する）
+BULK_BATCH_SIZE = 50
+
+
+def split_bulk_frame(raw, tickers):
+    """yf.download(group_by='ticker') の結果を銘柄ごとのDataFrameに分割
+
+    列の (ticker, 項目) を縦持ちに変換してからgroupbyで一括分割する
+
+    Returns:
+        {ticker: DataFrame}（行がない銘柄は含まない）
+    """
+    if raw is None or len(raw) == 0:
+        return {}
+
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # 1銘柄だけの場合は列がフラットで返ることがある
+        raw = pd.concat({tickers[0]: raw}, axis=1)
+    elif raw.columns.get_level_values(0).isin(['Open', 'Close']).any():
+        # (項目, ticker) の順で返った場合は入れ替える
+        raw = raw.swaplevel(0, 1, axis=1)
+
+    long = raw.stack(level=0, future_stack=True).dropna(subset=['Close'])
+    long.index.names = ['Date', 'Ticker']
+
+    return {
+        ticker: frame.droplevel('Ticker')
+        for ticker, frame in long.groupby(level='Ticker', sort=False)
+    }
+
+
+def download_bulk(tickers, period='3mo', batch_size=BULK_BATCH_SIZE):
+    """複数銘柄をまとめてyfinanceで取得
+
+    Returns:
+        ({ticker: DataFrame}, 失敗・空だった銘柄のリスト)
+    """
+    frames = {}
+
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start:start + batch_size]
+        try:
+            raw = yf.download(
+                batch,
+                period=period,
+                group_by='ticker',
+                threads=True,
+                auto_adjust=False,
+                progress=False
+            )
+            frames.update(split_bulk_frame(raw, batch))
+        except Exception as e:
+            logger.warning(f"⚠️ yfinance一括取得失敗 ({len(batch)}銘柄): {e}")
+
+    failed = [ticker for ticker in tickers if ticker not in frames]
+    return frames, failed
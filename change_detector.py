@@ -0,0 +1,189 @@
+"""
+変更検知
+銘柄ごとに直近N本の株価のフィンガープリントを保存し、
+内容が変わっていない銘柄の保存・特徴量・予測をスキップする
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_TABLE = '_fingerprints'
+FINGERPRINT_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DEFAULT_BARS = 30
+# 株価以外のテーブル（'_' で始まるものも管理用として扱う）
+INTERNAL_TABLES = {'predictions_history', 'predictions', 'prediction_accuracy', 'run_metrics'}
+
+
+def compute_fingerprint(df: pd.DataFrame, n_bars: int = DEFAULT_BARS) -> str:
+    """
+    直近N本の株価からフィンガープリントを計算
+
+    取得元（スクレイピング / DB）で列の型が異なっても同じ値になるよう、
+    OHLCVを float64 に揃えてからハッシュ化する
+
+    Args:
+        df: Date をインデックスに持つ株価データ
+        n_bars: ハッシュ対象の本数
+
+    Returns:
+        SHA-1 の16進文字列
+    """
+    columns = [c for c in FINGERPRINT_COLUMNS if c in df.columns]
+    tail = df[columns].sort_index().tail(n_bars).astype('float64')
+    tail.index = pd.to_datetime(tail.index)
+
+    hashes = pd.util.hash_pandas_object(tail, index=True).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def fingerprint_from_db(
+    conn: sqlite3.Connection,
+    table_name: str,
+    n_bars: int = DEFAULT_BARS
+) -> Optional[str]:
+    """
+    DBに保存済みの直近N本だけを読み込んでフィンガープリントを計算
+
+    Args:
+        conn: SQLite接続
+        table_name: 株価テーブル名
+        n_bars: ハッシュ対象の本数
+
+    Returns:
+        フィンガープリント、テーブルがなければNone
+    """
+    try:
+        df = pd.read_sql(
+            f"SELECT * FROM '{table_name}' ORDER BY Date DESC LIMIT ?",
+            conn,
+            params=(n_bars,),
+            parse_dates=['Date']
+        )
+    except Exception:
+        return None
+
+    if len(df) == 0:
+        return None
+
+    return compute_fingerprint(df.set_index('Date'), n_bars)
+
+
+class FingerprintStore:
+    """ステージ別フィンガープリントの保存先（株価DBと同じファイル）"""
+
+    def __init__(self, db_path: str):
+        """
+        初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+        """
+        self.db_path = db_path
+        self._ensure_table()
+
+    def _ensure_table(self) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (
+                ticker TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                payload TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (ticker, stage)
+            )
+        """)
+        conn.commit()
+        conn.close()
+
+    def get(self, ticker: str, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        保存済みのフィンガープリントを取得
+
+        Args:
+            ticker: ティッカーシンボル
+            stage: ステージ名（'save', 'predict' など）
+
+        Returns:
+            {'fingerprint', 'payload', 'updated_at'} の辞書、未登録ならNone
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        row = conn.execute(
+            f"SELECT fingerprint, payload, updated_at FROM {FINGERPRINT_TABLE} "
+            "WHERE ticker = ? AND stage = ?",
+            (ticker, stage)
+        ).fetchone()
+        conn.close()
+
+        if row is None:
+            return None
+
+        return {
+            'fingerprint': row[0],
+            'payload': json.loads(row[1]) if row[1] else None,
+            'updated_at': row[2],
+        }
+
+    def set(
+        self,
+        ticker: str,
+        stage: str,
+        fingerprint: str,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        フィンガープリントを記録
+
+        Args:
+            ticker: ティッカーシンボル
+            stage: ステージ名
+            fingerprint: 処理した入力のフィンガープリント
+            payload: 次回スキップ時に再利用する処理結果
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {FINGERPRINT_TABLE} "
+            "(ticker, stage, fingerprint, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                ticker, stage, fingerprint,
+                json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                datetime.now().isoformat(timespec='seconds'),
+            )
+        )
+        conn.commit()
+        conn.close()
+
+    def is_unchanged(self, ticker: str, stage: str, fingerprint: str) -> bool:
+        """
+        前回処理時から入力が変わっていないか判定
+
+        Args:
+            ticker: ティッカーシンボル
+            stage: ステージ名
+            fingerprint: 今回の入力のフィンガープリント
+
+        Returns:
+            前回と同一ならTrue
+        """
+        record = self.get(ticker, stage)
+        return record is not None and record['fingerprint'] == fingerprint
+
+
+def is_internal_table(table_name: str) -> bool:
+    """
+    株価以外の管理用テーブルかどうか
+
+    Args:
+        table_name: テーブル名
+
+    Returns:
+        管理用テーブルならTrue
+    """
+    return table_name.startswith('_') or table_name in INTERNAL_TABLES
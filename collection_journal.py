@@ -0,0 +1,178 @@
+"""
+収集ジャーナル
+複数銘柄の収集実行を銘柄単位で記録し、中断した実行の再開に使う
+"""
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_TABLE = '_collection_runs'
+
+# 銘柄ごとの状態
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class CollectionJournal:
+    """収集実行の銘柄別ジャーナル（株価DBと同じファイルに保存）"""
+    
+    def __init__(self, db_path: str):
+        """
+        初期化
+        
+        Args:
+            db_path: SQLiteファイルのパス
+        """
+        self.db_path = db_path
+        self._ensure_table()
+    
+    def _connect(self) -> sqlite3.Connection:
+        # 並列ワーカーからの同時書き込みに備えてロック待ちを長めにとる
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {JOURNAL_TABLE} (
+                run_id TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                status TEXT NOT NULL,
+                rows INTEGER DEFAULT 0,
+                started_at TEXT,
+                finished_at TEXT,
+                elapsed_sec REAL,
+                error TEXT,
+                PRIMARY KEY (run_id, ticker)
+            )
+        """)
+        conn.commit()
+        conn.close()
+    
+    def start_run(self, tickers: List[str]) -> str:
+        """
+        新しい収集実行を登録
+        
+        Args:
+            tickers: 収集対象の銘柄リスト
+        
+        Returns:
+            実行ID
+        """
+        run_id = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT INTO {JOURNAL_TABLE} (run_id, ticker, status) VALUES (?, ?, ?)",
+            [(run_id, ticker, PENDING) for ticker in tickers]
+        )
+        conn.commit()
+        conn.close()
+        
+        logger.info(f"📒 収集実行開始: {run_id} ({len(tickers)}銘柄)")
+        return run_id
+    
+    def latest_incomplete_run(self) -> Optional[str]:
+        """
+        直近の実行に未完了の銘柄が残っていればその実行IDを取得
+        
+        対象は最新の実行だけ（最新の実行が完了していれば、それより古い実行の失敗は再開しない）
+        
+        Returns:
+            実行ID、なければNone
+        """
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT run_id FROM {JOURNAL_TABLE} WHERE run_id = (SELECT MAX(run_id) FROM {JOURNAL_TABLE}) "
+            "AND status IN (?, ?, ?) LIMIT 1",
+            (PENDING, RUNNING, FAILED)
+        ).fetchone()
+        conn.close()
+        
+        return row[0] if row else None
+    
+    def pending_tickers(self, run_id: str) -> List[str]:
+        """
+        実行内で完了していない銘柄を取得
+        
+        Args:
+            run_id: 実行ID
+        
+        Returns:
+            未完了（pending / running / failed）の銘柄リスト
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT ticker FROM {JOURNAL_TABLE} WHERE run_id = ? AND status != ? "
+            "ORDER BY rowid",
+            (run_id, DONE)
+        ).fetchall()
+        conn.close()
+        
+        return [row[0] for row in rows]
+    
+    def mark_running(self, run_id: str, ticker: str) -> None:
+        """銘柄の収集開始を記録"""
+        self._update(
+            run_id, ticker,
+            status=RUNNING,
+            started_at=datetime.now().isoformat(timespec='seconds'),
+            error=None
+        )
+    
+    def mark_done(self, run_id: str, ticker: str, rows: int, elapsed_sec: float) -> None:
+        """銘柄の収集・保存完了を記録"""
+        self._update(
+            run_id, ticker,
+            status=DONE,
+            rows=rows,
+            finished_at=datetime.now().isoformat(timespec='seconds'),
+            elapsed_sec=round(elapsed_sec, 2)
+        )
+    
+    def mark_pending(self, run_id: str, ticker: str) -> None:
+        """銘柄を未処理に戻す（処理中にブラウザが落ちた場合。失敗には数えない）"""
+        self._update(run_id, ticker, status=PENDING, started_at=None, error=None)
+    
+    def mark_failed(self, run_id: str, ticker: str, error: str, elapsed_sec: float) -> None:
+        """銘柄の収集失敗を記録"""
+        self._update(
+            run_id, ticker,
+            status=FAILED,
+            finished_at=datetime.now().isoformat(timespec='seconds'),
+            elapsed_sec=round(elapsed_sec, 2),
+            error=error[:500]
+        )
+    
+    def _update(self, run_id: str, ticker: str, **fields) -> None:
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        conn = self._connect()
+        conn.execute(
+            f"UPDATE {JOURNAL_TABLE} SET {assignments} WHERE run_id = ? AND ticker = ?",
+            (*fields.values(), run_id, ticker)
+        )
+        conn.commit()
+        conn.close()
+    
+    def summary(self, run_id: str) -> Dict[str, int]:
+        """
+        実行内の状態別件数を取得
+        
+        Args:
+            run_id: 実行ID
+        
+        Returns:
+            {status: 件数} の辞書
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT status, COUNT(*) FROM {JOURNAL_TABLE} WHERE run_id = ? GROUP BY status",
+            (run_id,)
+        ).fetchall()
+        conn.close()
+        
+        return dict(rows)
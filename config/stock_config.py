@@ -0,0 +1,228 @@
+"""
+銘柄設定
+監視対象の銘柄（ユニバース）と、上場市場（取引所・タイムゾーン・取引カレンダー）を定義
+
+銘柄は config/universe.csv（ticker, name, exchange, currency, priority）から読み込む。
+銘柄の追加はCSVの編集か `python3 universe.py import` で行い、コードは変更しない
+"""
+import csv
+import os
+from typing import Any, Dict, List, Optional
+
+# 株価DB（パイプラインとAPIで共有。相対パスは run_daily.sh と同じ作業ディレクトリ基準）
+DB_PATH = os.environ.get('STOCK_PROPHET_DB', './data/stock_data.db')
+# 予測スナップショット（predict_system.py が公開し、api.py が配信する）
+SNAPSHOT_PATH = os.environ.get(
+    'STOCK_PROPHET_SNAPSHOT', os.path.join(os.path.dirname(DB_PATH) or '.', 'predictions_snapshot.json')
+)
+# イベントログ（未設定なら株価DBと同じディレクトリの events.jsonl）
+EVENTS_PATH = os.environ.get('STOCK_PROPHET_EVENTS') or None
+
+# 株価履歴の取得元（ベンチマーク時はローカルのフィクスチャサーバーに向ける）
+YAHOO_BASE_URL = os.environ.get('STOCK_PROPHET_YAHOO_URL', 'https://finance.yahoo.com').rstrip('/')
+
+# 常駐ブラウザのCDPエンドポイント（browser_service.py、未設定ならスクレイパーが毎回Chromiumを起動する）
+BROWSER_ENDPOINT = os.environ.get('STOCK_PROPHET_BROWSER_URL') or None
+
+# 複数ノード収集の共有ワークキュー（work_queue.py、'sqlite:///path' など。未設定なら株価DBと同じファイル）
+WORK_QUEUE_URL = os.environ.get('STOCK_PROPHET_QUEUE_URL') or None
+
+# 通知先（notifier.py。設定されている通知先にだけ送る）
+SLACK_WEBHOOK_URL = os.environ.get('STOCK_PROPHET_SLACK_WEBHOOK') or None
+CHATWORK_API_TOKEN = os.environ.get('STOCK_PROPHET_CHATWORK_TOKEN') or None
+CHATWORK_ROOM_ID = os.environ.get('STOCK_PROPHET_CHATWORK_ROOM') or None
+CHATWORK_API_URL = os.environ.get('STOCK_PROPHET_CHATWORK_API_URL', 'https://api.chatwork.com/v2').rstrip('/')
+NOTIFY_WEBHOOK_URL = os.environ.get('STOCK_PROPHET_WEBHOOK_URL') or None
+
+# ユニバース（監視対象銘柄）のファイル
+UNIVERSE_PATH = os.environ.get(
+    'STOCK_PROPHET_UNIVERSE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'universe.csv')
+)
+# 優先度（1が最優先。時間枠に収まらない場合は数字の大きい銘柄から次回以降に回す）
+DEFAULT_PRIORITY = 5
+
+# 1回の実行の時間枠（分）。設定するとセッション終了済みの銘柄を優先度順に枠に収まる分だけ処理する
+TIME_BUDGET_MINUTES: Optional[float] = (
+    float(os.environ['STOCK_PROPHET_TIME_BUDGET_MIN']) if os.environ.get('STOCK_PROPHET_TIME_BUDGET_MIN') else None
+)
+# 時間枠の見積もりに使う1銘柄あたりの所要秒数（ページ読み込み＋銘柄間の待機）
+SECONDS_PER_TICKER = float(os.environ.get('STOCK_PROPHET_SECONDS_PER_TICKER', '6'))
+
+# 取引所定義
+# close: 現地時間の大引け時刻、calendar: 休場日カレンダー名
+EXCHANGES: Dict[str, Dict[str, str]] = {
+    'JPX': {
+        'name': '東京証券取引所',
+        'timezone': 'Asia/Tokyo',
+        'close': '15:30',
+        'calendar': 'JPX',
+    },
+    'NYSE': {
+        'name': 'ニューヨーク証券取引所',
+        'timezone': 'America/New_York',
+        'close': '16:00',
+        'calendar': 'NYSE',
+    },
+    'NASDAQ': {
+        'name': 'NASDAQ',
+        'timezone': 'America/New_York',
+        'close': '16:00',
+        'calendar': 'NYSE',  # NASDAQの休場日はNYSEと同一
+    },
+}
+
+# 取引所ごとの既定の通貨
+CURRENCIES: Dict[str, str] = {
+    'JPX': 'JPY',
+    'NYSE': 'USD',
+    'NASDAQ': 'USD',
+}
+
+# 休場日（土日以外）
+HOLIDAYS: Dict[str, List[str]] = {
+    'JPX': [
+        # 2025年
+        '2025-01-01', '2025-01-02', '2025-01-03', '2025-01-13',
+        '2025-02-11', '2025-02-24', '2025-03-20', '2025-04-29',
+        '2025-05-05', '2025-05-06', '2025-07-21', '2025-08-11',
+        '2025-09-15', '2025-09-23', '2025-10-13', '2025-11-03',
+        '2025-11-24', '2025-12-31',
+        # 2026年
+        '2026-01-01', '2026-01-02', '2026-01-12', '2026-02-11',
+        '2026-02-23', '2026-03-20', '2026-04-29', '2026-05-04',
+        '2026-05-05', '2026-05-06', '2026-07-20', '2026-08-11',
+        '2026-09-21', '2026-09-22', '2026-09-23', '2026-10-12',
+        '2026-11-03', '2026-11-23', '2026-12-31',
+    ],
+    'NYSE': [
+        # 2025年
+        '2025-01-01', '2025-01-09', '2025-01-20', '2025-02-17',
+        '2025-04-18', '2025-05-26', '2025-06-19', '2025-07-04',
+        '2025-09-01', '2025-11-27', '2025-12-25',
+        # 2026年
+        '2026-01-01', '2026-01-19', '2026-02-16', '2026-04-03',
+        '2026-05-25', '2026-06-19', '2026-07-03', '2026-09-07',
+        '2026-11-26', '2026-12-25',
+    ],
+}
+
+
+
+def load_universe(path: str = UNIVERSE_PATH) -> Dict[str, Dict[str, Any]]:
+    """
+    ユニバースのCSVを読み込む
+
+    Args:
+        path: CSVのパス（列: ticker, name, exchange, currency, priority）
+
+    Returns:
+        {ticker: {'name', 'exchange', 'currency', 'priority'}}（ファイルの順。'#' で始まる行は無視）
+    """
+    stocks: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(path):
+        return stocks
+
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            ticker = (row.get('ticker') or '').strip()
+            if not ticker or ticker.startswith('#'):
+                continue
+            exchange = (row.get('exchange') or '').strip() or None
+            stocks[ticker] = {
+                'name': (row.get('name') or '').strip() or ticker,
+                'exchange': exchange,
+                'currency': (row.get('currency') or '').strip() or CURRENCIES.get(exchange or ''),
+                'priority': int(row.get('priority') or DEFAULT_PRIORITY),
+            }
+    return stocks
+
+
+# 監視対象銘柄
+STOCKS: Dict[str, Dict[str, Any]] = load_universe()
+
+
+def get_all_tickers(max_priority: Optional[int] = None) -> List[str]:
+    """
+    全銘柄のティッカーリストを取得
+    
+    Args:
+        max_priority: 指定時はこの優先度以内（数字が小さいほど優先）の銘柄だけ
+    
+    Returns:
+        ティッカーシンボルのリスト
+    """
+    if max_priority is None:
+        return list(STOCKS.keys())
+    return [ticker for ticker, info in STOCKS.items() if info['priority'] <= max_priority]
+
+
+def get_stock_name(ticker: str) -> str:
+    """
+    銘柄名を取得
+    
+    Args:
+        ticker: ティッカーシンボル
+    
+    Returns:
+        銘柄名（未登録の場合はティッカーそのもの）
+    """
+    return STOCKS.get(ticker, {}).get('name', ticker)
+
+
+def get_exchange(ticker: str) -> Optional[str]:
+    """
+    銘柄の上場取引所コードを取得
+    
+    Args:
+        ticker: ティッカーシンボル
+    
+    Returns:
+        取引所コード（例: 'JPX'）、未登録の場合はNone
+    """
+    return STOCKS.get(ticker, {}).get('exchange')
+
+
+def get_currency(ticker: str) -> Optional[str]:
+    """
+    銘柄の通貨を取得
+    
+    Args:
+        ticker: ティッカーシンボル
+    
+    Returns:
+        通貨コード（例: 'JPY'）、未登録の場合はNone
+    """
+    return STOCKS.get(ticker, {}).get('currency')
+
+
+def get_priority(ticker: str) -> int:
+    """
+    銘柄の優先度を取得（未登録の場合は DEFAULT_PRIORITY）
+    """
+    return STOCKS.get(ticker, {}).get('priority', DEFAULT_PRIORITY)
+
+
+def get_exchange_info(exchange: str) -> Dict[str, str]:
+    """
+    取引所の設定（タイムゾーン・大引け時刻・カレンダー）を取得
+    
+    Args:
+        exchange: 取引所コード
+    
+    Returns:
+        取引所設定の辞書
+    """
+    return EXCHANGES[exchange]
+
+
+def get_holidays(calendar: str) -> List[str]:
+    """
+    休場日リストを取得
+    
+    Args:
+        calendar: カレンダー名（例: 'JPX', 'NYSE'）
+    
+    Returns:
+        'YYYY-MM-DD' 形式の休場日リスト
+    """
+    return HOLIDAYS.get(calendar, [])
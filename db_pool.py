@@ -0,0 +1,127 @@
+"""
+読み取り専用SQLite接続プール
+APIサービス用。接続を使い回し、ブロッキングなクエリは専用スレッドで実行する
+"""
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ReadOnlyPool:
+    """上限付きの読み取り専用接続プール（mode=ro、WALモードのDBでも書き込み側をブロックしない）"""
+    
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 5.0):
+        """
+        初期化
+        
+        Args:
+            db_path: SQLiteファイルのパス
+            size: 接続数（＝クエリ実行スレッド数）の上限
+            timeout: ロック待ちのタイムアウト（秒）
+        """
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        # スレッド数を接続数と揃えるので、スレッドが接続待ちで詰まることはない
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='sqlite-ro')
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f'file:{self.db_path}?mode=ro',
+            uri=True,
+            timeout=self.timeout,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        プールから接続を借りる（空きがなければ新規作成、上限到達時は返却を待つ）
+        
+        Yields:
+            読み取り専用の接続
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get(timeout=self.timeout)
+        
+        healthy = True
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # テーブルなし等のクエリエラー以外は、壊れた可能性のある接続として捨てる
+            healthy = isinstance(e, sqlite3.OperationalError)
+            raise
+        finally:
+            if healthy:
+                self._idle.put(conn)
+            else:
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+    
+    def query(self, sql: str, params: Sequence[Any] = ()) -> Tuple[List[str], List[tuple]]:
+        """
+        クエリを同期実行
+        
+        Args:
+            sql: SELECT文
+            params: バインドパラメータ
+        
+        Returns:
+            (列名リスト, 行リスト)
+        """
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description] if cursor.description else []
+            return columns, cursor.fetchall()
+    
+    async def fetch(self, sql: str, params: Sequence[Any] = ()) -> Tuple[List[str], List[tuple]]:
+        """
+        クエリをイベントループ外のスレッドで実行
+        
+        Args:
+            sql: SELECT文
+            params: バインドパラメータ
+        
+        Returns:
+            (列名リスト, 行リスト)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.query, sql, params)
+    
+    def close(self) -> None:
+        """全接続を閉じる"""
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
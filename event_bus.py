@@ -0,0 +1,221 @@
+"""
+イベントバス
+パイプライン（cronで起動される別プロセス）が銘柄ごとの収集・予測結果をイベントログに追記し、
+APIプロセスがそれを追跡して接続中のクライアントへ配信する（ローカル版のブローカー代わり）
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from config.stock_config import EVENTS_PATH
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILENAME = 'events.jsonl'
+# これを超えたらローテーション
+MAX_LOG_BYTES = 5 * 1024 * 1024
+
+
+def events_path_for(db_path: str) -> str:
+    """
+    株価DBと同じディレクトリのイベントログのパスを返す（STOCK_PROPHET_EVENTS があればそちら）
+    
+    Args:
+        db_path: 株価DBのパス
+    
+    Returns:
+        イベントログのパス
+    """
+    if EVENTS_PATH:
+        return EVENTS_PATH
+    return os.path.join(os.path.dirname(db_path) or '.', EVENTS_FILENAME)
+
+
+class EventPublisher:
+    """イベントログへの追記（パイプライン側）"""
+    
+    def __init__(self, path: str):
+        """
+        初期化
+        
+        Args:
+            path: イベントログのパス
+        """
+        self.path = path
+    
+    def publish(self, event_type: str, data: Dict[str, Any]) -> None:
+        """
+        イベントを1行のJSONとして追記
+        
+        O_APPENDで1回のwriteにまとめるので、複数プロセスから同時に書いても行が混ざらない。
+        配信の失敗でパイプラインを止めないよう、例外はログに残すだけにする
+        
+        Args:
+            event_type: イベント種別（'collection', 'prediction' など）
+            data: イベント内容
+        """
+        event = {
+            'id': time.time_ns(),
+            'type': event_type,
+            'time': time.time(),
+            'data': data,
+        }
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+        
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > MAX_LOG_BYTES:
+                os.replace(self.path, self.path + '.1')
+            
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except Exception as e:
+            logger.warning(f"⚠️  イベント配信失敗: {e}")
+
+
+class EventBroadcaster:
+    """購読中のクライアントへのイベント配信（APIプロセス内のpub/sub）"""
+    
+    def __init__(self, history: int = 500, queue_size: int = 100):
+        """
+        初期化
+        
+        Args:
+            history: 再接続時の取りこぼし補完用に保持するイベント数
+            queue_size: クライアントごとの未送信イベント上限
+        """
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def subscribe(self) -> asyncio.Queue:
+        """購読を開始し、イベントを受け取るキューを返す"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """購読を終了"""
+        self._subscribers.discard(queue)
+    
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """プロセス内でイベントを受け取るコールバックを登録（キャッシュ破棄など）"""
+        self._listeners.append(listener)
+    
+    def since(self, last_id: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        指定IDより後の保持中イベントを取得
+        
+        Args:
+            last_id: クライアントが最後に受け取ったイベントID
+        
+        Returns:
+            イベントのリスト
+        """
+        if last_id is None:
+            return []
+        return [event for event in self.recent if event['id'] > last_id]
+    
+    def publish(self, event: Dict[str, Any]) -> None:
+        """全購読者にイベントを配信（受信が追いつかないクライアントは古いイベントを捨てる）"""
+        self.recent.append(event)
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"❌ イベント処理エラー: {e}")
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+class EventLogTailer:
+    """イベントログを追跡し、新しい行をブロードキャスタに流す（APIプロセス側）"""
+    
+    def __init__(self, path: str, broadcaster: EventBroadcaster, interval: float = 0.5):
+        """
+        初期化
+        
+        Args:
+            path: イベントログのパス
+            broadcaster: 配信先
+            interval: ファイル確認間隔（秒）
+        """
+        self.path = path
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self._inode = None
+        self._offset = 0
+        self._partial = b''
+    
+    def _open_position(self, stat) -> None:
+        # 起動直後はファイル末尾の少し手前から読み、直近のイベントを保持しておく
+        # （途中から読んだ先頭行はJSONとして読めないので捨てられる）
+        self._inode = stat.st_ino
+        self._offset = max(0, stat.st_size - 64 * 1024)
+        self._partial = b''
+    
+    def poll(self) -> int:
+        """
+        追記分を読み込んで配信
+        
+        Returns:
+            配信したイベント数
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        
+        if self._inode is None:
+            self._open_position(stat)
+        elif stat.st_ino != self._inode or stat.st_size < self._offset:
+            # ローテーション・切り詰めされたら先頭から読み直す
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._partial = b''
+        
+        if stat.st_size == self._offset:
+            return 0
+        
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        self._offset += len(chunk)
+        
+        lines = (self._partial + chunk).split(b'\n')
+        self._partial = lines.pop()
+        
+        count = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            self.broadcaster.publish(event)
+            count += 1
+        return count
+    
+    async def run(self) -> None:
+        """ファイルを定期的に確認し続ける"""
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"❌ イベントログ読み込みエラー: {e}")
+            await asyncio.sleep(self.interval)
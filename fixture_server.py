@@ -0,0 +1,245 @@
+"""
+Yahoo Finance 履歴ページのフィクスチャサーバー
+ネットワークなしでスクレイパーを動かすためのローカルHTTPサーバー。
+合成した履歴ページ（または保存済みのHTML）を、指定した遅延・エラー率で返す
+
+使い方:
+    python3 fixture_server.py --port 8765 --rows 250 --latency-ms 300 --error-rate 0.05
+    STOCK_PROPHET_YAHOO_URL=http://127.0.0.1:8765 python3 scraper_fixed.py --tickers AAPL
+"""
+import argparse
+import html
+import logging
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = re.compile(r'^/quote/([A-Za-z0-9.\-^=]+)/history/?$')
+HEADER = ['Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+def synthetic_history_html(ticker: str, rows: int, end: Optional[date] = None) -> str:
+    """
+    銘柄ごとに再現性のある合成履歴ページを作る（新しい日付が上、Yahooと同じ表記）
+
+    Args:
+        ticker: ティッカーシンボル（乱数のシードに使う）
+        rows: 行数（営業日数）
+        end: 最新の日付（省略時は今日）
+
+    Returns:
+        HTML文字列
+    """
+    rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')))
+    end = end or date.today()
+
+    days = []
+    day = end
+    while len(days) < rows:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+
+    start_price = rng.uniform(20, 3000)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.015, rows)))
+    open_ = close * (1 + rng.normal(0, 0.005, rows))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, rows))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, rows))
+    volume = rng.integers(100_000, 50_000_000, rows)
+
+    body = []
+    # 配列は古い順、表示は新しい順
+    for i, day in enumerate(reversed(days)):
+        j = rows - 1 - i
+        label = day.strftime('%b %d, %Y')
+        if j % 60 == 30:
+            # 配当行（スクレイパーが読み飛ばす行）
+            body.append(f'<tr><td>{label}</td><td colspan="6">0.25 Dividend</td></tr>')
+        cells = [
+            label,
+            f'{open_[j]:,.2f}',
+            f'{high[j]:,.2f}',
+            f'{low[j]:,.2f}',
+            f'{close[j]:,.2f}',
+            f'{close[j]:,.2f}',
+            f'{volume[j]:,}',
+        ]
+        body.append('<tr>' + ''.join(f'<td>{c}</td>' for c in cells) + '</tr>')
+
+    head = ''.join(f'<th>{h}</th>' for h in HEADER)
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>{html.escape(ticker)} Historical Data</title></head><body>'
+        f'<h1>{html.escape(ticker)}</h1>'
+        f'<table><thead><tr>{head}</tr></thead><tbody>{"".join(body)}</tbody></table>'
+        '</body></html>'
+    )
+
+
+class YahooFixtureServer:
+    """バックグラウンドスレッドで動くフィクスチャサーバー"""
+
+    def __init__(
+        self,
+        port: int = 0,
+        rows: int = 90,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        fixtures_dir: Optional[str] = None,
+        seed: int = 0
+    ):
+        """
+        初期化
+
+        Args:
+            port: 待ち受けポート（0なら空きポート）
+            rows: 合成ページの行数
+            latency_ms: 応答までの遅延（ミリ秒）
+            jitter_ms: 遅延のばらつき（±ミリ秒）
+            error_rate: エラーを返す割合（0〜1、503とテーブルなしページが半々）
+            fixtures_dir: '<ticker>.html' を置いたディレクトリ（あればそちらを返す）
+            seed: エラー・遅延の乱数シード
+        """
+        self.rows = rows
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.fixtures_dir = fixtures_dir
+
+        self.stats: Dict[str, int] = {'requests': 0, 'errors': 0, 'bytes': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pages: Dict[str, bytes] = {}
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'YahooFixtureServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """サーバーを起動"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 フィクスチャサーバー起動: {self.url}")
+
+    def stop(self) -> None:
+        """サーバーを停止"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def page(self, ticker: str) -> bytes:
+        """銘柄のページ本文（保存済みHTMLがあればそれ、なければ合成ページ）"""
+        with self._lock:
+            cached = self._pages.get(ticker)
+        if cached is not None:
+            return cached
+
+        body = None
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f'{ticker}.html')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+        if body is None:
+            body = synthetic_history_html(ticker, self.rows).encode('utf-8')
+
+        with self._lock:
+            self._pages[ticker] = body
+        return body
+
+    def _decide(self):
+        """(遅延秒, エラー種別) を決める"""
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            error = None
+            if self._random.random() < self.error_rate:
+                error = self._random.choice(['503', 'empty'])
+            self.stats['requests'] += 1
+            if error:
+                self.stats['errors'] += 1
+        return max(0.0, delay) / 1000, error
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                match = HISTORY_PATH.match(self.path.split('?', 1)[0])
+                if not match:
+                    self._send(404, b'not found', 'text/plain')
+                    return
+
+                delay, error = server._decide()
+                if delay:
+                    time.sleep(delay)
+
+                if error == '503':
+                    self._send(503, b'service unavailable', 'text/plain')
+                elif error == 'empty':
+                    self._send(200, b'<html><body><p>No data</p></body></html>', 'text/html')
+                else:
+                    self._send(200, server.page(match.group(1)), 'text/html; charset=utf-8')
+
+            def _send(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.stats['bytes'] += len(body)
+
+            def log_message(self, format, *args):
+                # リクエストごとのアクセスログは出さない
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Yahoo履歴ページのフィクスチャサーバー')
+    parser.add_argument('--port', type=int, default=8765, help='待ち受けポート')
+    parser.add_argument('--rows', type=int, default=90, help='合成ページの行数')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='応答遅延（ミリ秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='遅延のばらつき（±ミリ秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='エラー応答の割合（0〜1）')
+    parser.add_argument('--fixtures-dir', help="保存済みHTML（'<ticker>.html'）のディレクトリ")
+    args = parser.parse_args()
+
+    server = YahooFixtureServer(
+        args.port, args.rows, args.latency_ms, args.jitter_ms, args.error_rate, args.fixtures_dir
+    )
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
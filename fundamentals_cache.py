@@ -0,0 +1,162 @@
+"""
+企業情報キャッシュ
+時価総額・PER・ニュースなどクォートページの項目を、項目ごとの有効期限付きで保存する。
+期限切れの項目があるときだけクォートページを再訪問すればよい
+"""
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_TABLE = '_fundamentals'
+
+# 項目ごとの有効期限（指標は日次、ニュースは1時間）
+FIELD_TTLS: Dict[str, timedelta] = {
+    'market_cap': timedelta(days=1),
+    'pe_ratio': timedelta(days=1),
+    'latest_news': timedelta(hours=1),
+}
+
+# クォートページ上のセレクタ
+FIELD_SELECTORS: Dict[str, str] = {
+    'market_cap': '[data-test="MARKET_CAP-value"]',
+    'pe_ratio': '[data-test="PE_RATIO-value"]',
+}
+NEWS_SELECTOR = 'h3 a'
+NEWS_LIMIT = 5
+
+
+class FundamentalsCache:
+    """項目別TTL付きの企業情報キャッシュ（株価DBと同じファイルに保存）"""
+
+    def __init__(self, db_path: str, ttls: Optional[Dict[str, timedelta]] = None):
+        """
+        初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            ttls: 項目ごとの有効期限（省略時は FIELD_TTLS）
+        """
+        self.db_path = db_path
+        self.ttls = ttls or FIELD_TTLS
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._ready:
+            # テーブルは初回アクセス時に作る（スクレイパー生成時にはDBに触れない）
+            self._ensure_table(conn)
+            self._ready = True
+        return conn
+
+    def _ensure_table(self, conn: sqlite3.Connection) -> None:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+                ticker TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (ticker, field)
+            )
+        """)
+        conn.commit()
+
+    def _load(self, ticker: str) -> Dict[str, tuple]:
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT field, value, fetched_at FROM {CACHE_TABLE} WHERE ticker = ?",
+            (ticker,)
+        ).fetchall()
+        conn.close()
+        return {field: (value, fetched_at) for field, value, fetched_at in rows}
+
+    def get(self, ticker: str, include_expired: bool = False) -> Dict[str, Any]:
+        """
+        キャッシュ済みの項目を取得
+
+        Args:
+            ticker: ティッカーシンボル
+            include_expired: Trueなら期限切れの項目も返す
+
+        Returns:
+            {項目: 値}
+        """
+        now = datetime.now()
+        info = {}
+        for field, (value, fetched_at) in self._load(ticker).items():
+            ttl = self.ttls.get(field)
+            if include_expired or ttl is None or now - datetime.fromisoformat(fetched_at) < ttl:
+                info[field] = json.loads(value)
+        return info
+
+    def expired_fields(self, ticker: str) -> List[str]:
+        """
+        取得し直すべき項目（未取得または期限切れ）
+
+        Args:
+            ticker: ティッカーシンボル
+
+        Returns:
+            項目名のリスト（空ならクォートページを訪問しなくてよい）
+        """
+        now = datetime.now()
+        cached = self._load(ticker)
+        return [
+            field for field, ttl in self.ttls.items()
+            if field not in cached or now - datetime.fromisoformat(cached[field][1]) >= ttl
+        ]
+
+    def set(self, ticker: str, info: Dict[str, Any]) -> None:
+        """
+        項目を保存（取得時刻は現在時刻）
+
+        Args:
+            ticker: ティッカーシンボル
+            info: {項目: 値}
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {CACHE_TABLE} (ticker, field, value, fetched_at) VALUES (?, ?, ?, ?)",
+            [(ticker, field, json.dumps(value, ensure_ascii=False), now) for field, value in info.items()]
+        )
+        conn.commit()
+        conn.close()
+
+
+def scrape_quote_fields(page, url: str, fields: List[str]) -> Dict[str, Any]:
+    """
+    クォートページから指定項目を取得（既存のページを使い回す）
+
+    networkidle は待たず、DOM構築後に項目のセレクタだけを待つ
+
+    Args:
+        page: Playwrightのページ
+        url: クォートページのURL
+        fields: 取得する項目
+
+    Returns:
+        {項目: 値}（ページにない項目はNone。次回もキャッシュが効くように値として保存する）
+    """
+    page.goto(url, wait_until='domcontentloaded', timeout=20000)
+
+    selectors = [FIELD_SELECTORS[f] for f in fields if f in FIELD_SELECTORS]
+    if 'latest_news' in fields:
+        selectors.append(NEWS_SELECTOR)
+    if selectors:
+        try:
+            page.wait_for_selector(', '.join(selectors), timeout=10000)
+        except Exception:
+            logger.warning(f"⚠️ クォートページ読み込みタイムアウト: {url}")
+
+    info = {}
+    for field in fields:
+        if field == 'latest_news':
+            info[field] = [item.inner_text() for item in page.query_selector_all(NEWS_SELECTOR)[:NEWS_LIMIT]]
+        elif field in FIELD_SELECTORS:
+            element = page.query_selector(FIELD_SELECTORS[field])
+            info[field] = element.inner_text() if element else None
+    return info
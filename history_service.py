@@ -0,0 +1,253 @@
+"""
+株価履歴の配信
+期間・解像度に応じてサーバー側でOHLCを集約し、列指向のJSONで返す。
+結果は (ticker, range, resolution) 単位でキャッシュし、新しい足が届いたら破棄する
+"""
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db_pool import ReadOnlyPool
+
+# 期間 → 日数（Noneは全期間）
+RANGES = {
+    '1m': 31,
+    '3m': 92,
+    '6m': 183,
+    '1y': 366,
+    '5y': 1827,
+    'max': None,
+}
+
+# 解像度 → pandasのリサンプル規則（Noneは日足のまま）
+RESOLUTIONS = {
+    '1d': None,
+    '1w': 'W-FRI',
+    '1mo': 'MS',
+}
+
+# resolution='auto' のときの最大点数
+MAX_POINTS = 400
+
+
+def choose_resolution(n_bars: int, max_points: int = MAX_POINTS) -> str:
+    """
+    日足の本数から、点数が上限に収まる最も細かい解像度を選ぶ
+    
+    Args:
+        n_bars: 日足の本数
+        max_points: 点数の上限
+    
+    Returns:
+        解像度（'1d', '1w', '1mo'）
+    """
+    if n_bars <= max_points:
+        return '1d'
+    if n_bars / 5 <= max_points:
+        return '1w'
+    return '1mo'
+
+
+def bucket_ohlc(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    日足をOHLCのまま集約（始値=最初、高値=最大、安値=最小、終値=最後、出来高=合計）
+    
+    Args:
+        df: Date をインデックスに持つ日足（Predicted列があれば最後の値を採用）
+        resolution: 解像度
+    
+    Returns:
+        集約後のDataFrame
+    """
+    rule = RESOLUTIONS[resolution]
+    if rule is None or len(df) == 0:
+        return df
+    
+    agg = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+    if 'Predicted' in df.columns:
+        agg['Predicted'] = 'last'
+    
+    return df.resample(rule).agg(agg).dropna(subset=['Close'])
+
+
+def align_predictions(bars: pd.DataFrame, predictions: pd.DataFrame) -> pd.Series:
+    """
+    予測値を予測対象日の足に揃える
+    
+    Args:
+        bars: 日足（Date インデックス）
+        predictions: 'target_date', 'predicted_price' 列を持つ予測（対象日ごとに1行）
+    
+    Returns:
+        bars と同じインデックスの予測値（予測がない足はNaN）
+    """
+    if len(predictions) == 0 or len(bars) == 0:
+        return pd.Series(np.nan, index=bars.index)
+    
+    predicted = pd.Series(
+        predictions['predicted_price'].to_numpy(dtype='float64'),
+        index=pd.to_datetime(predictions['target_date'])
+    )
+    return predicted.reindex(bars.index.normalize()).set_axis(bars.index)
+
+
+def encode_columnar(ticker: str, range_: str, resolution: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    列指向の辞書に変換（時刻はUNIX秒、価格は小数4桁）
+    
+    Args:
+        ticker: ティッカーシンボル
+        range_: 期間
+        resolution: 解像度
+        df: 集約済みのOHLCV
+    
+    Returns:
+        列指向の辞書
+    """
+    def column(name, decimals=4):
+        if name not in df.columns:
+            return None
+        values = df[name].round(decimals).astype(object)
+        return values.where(values.notna(), None).tolist()
+    
+    return {
+        'ticker': ticker,
+        'range': range_,
+        'resolution': resolution,
+        'count': len(df),
+        't': (df.index.values.astype('datetime64[s]').astype(np.int64)).tolist(),
+        'o': column('Open'),
+        'h': column('High'),
+        'l': column('Low'),
+        'c': column('Close'),
+        'v': column('Volume', 0),
+        'pred': column('Predicted'),
+    }
+
+
+class HistoryCache:
+    """(ticker, range, resolution) 単位のレスポンスキャッシュ（LRU）"""
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str, str], Tuple[bytes, str]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def put(self, key: Tuple[str, str, str], body: bytes) -> Tuple[bytes, str]:
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        self._entries[key] = (body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body, etag
+    
+    def evict(self, ticker: str) -> int:
+        """
+        銘柄のキャッシュをすべて破棄
+        
+        Args:
+            ticker: ティッカーシンボル
+        
+        Returns:
+            破棄した件数
+        """
+        keys = [key for key in self._entries if key[0] == ticker]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class HistoryService:
+    """株価履歴の読み込み・集約・キャッシュ"""
+    
+    def __init__(self, pool: ReadOnlyPool, cache: Optional[HistoryCache] = None):
+        """
+        初期化
+        
+        Args:
+            pool: 読み取り専用接続プール
+            cache: レスポンスキャッシュ
+        """
+        self.pool = pool
+        self.cache = cache or HistoryCache()
+    
+    async def get(self, ticker: str, range_: str, resolution: str) -> Tuple[bytes, str]:
+        """
+        履歴レスポンスを取得（キャッシュがあればそれを返す）
+        
+        Args:
+            ticker: ティッカーシンボル
+            range_: 期間（RANGES のキー）
+            resolution: 解像度（RESOLUTIONS のキー または 'auto'）
+        
+        Returns:
+            (JSON本文, ETag)
+        
+        Raises:
+            KeyError: 株価テーブルがない場合
+        """
+        key = (ticker, range_, resolution)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        bars = await self._load_bars(ticker, RANGES[range_])
+        bars['Predicted'] = align_predictions(bars, await self._load_predictions(ticker))
+        
+        if resolution == 'auto':
+            resolution_used = choose_resolution(len(bars))
+        else:
+            resolution_used = resolution
+        
+        payload = encode_columnar(ticker, range_, resolution_used, bucket_ohlc(bars, resolution_used))
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return self.cache.put(key, body)
+    
+    async def _load_bars(self, ticker: str, days: Optional[int]) -> pd.DataFrame:
+        table_name = ticker.replace('.', '_').replace('-', '_')
+        sql = f'SELECT Date, Open, High, Low, Close, Volume FROM "{table_name}"'
+        params: Tuple = ()
+        if days is not None:
+            sql += ' WHERE Date >= ?'
+            params = ((datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d'),)
+        sql += ' ORDER BY Date'
+        
+        try:
+            columns, rows = await self.pool.fetch(sql, params)
+        except sqlite3.OperationalError:
+            raise KeyError(ticker)
+        
+        df = pd.DataFrame(rows, columns=columns)
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df.set_index('Date').astype('float64')
+    
+    async def _load_predictions(self, ticker: str) -> pd.DataFrame:
+        try:
+            columns, rows = await self.pool.fetch(
+                "SELECT target_date, predicted_price FROM predictions "
+                "WHERE ticker = ? ORDER BY target_date, created_at",
+                (ticker,)
+            )
+        except sqlite3.OperationalError:
+            # 予測テーブルがまだない
+            return pd.DataFrame(columns=['target_date', 'predicted_price'])
+        
+        # 対象日に複数モデルの予測があれば最後に作られたものを使う
+        df = pd.DataFrame(rows, columns=columns)
+        return df.drop_duplicates('target_date', keep='last')
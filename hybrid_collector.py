@@ -1,61 +1,111 @@
 # hybrid_collector.py
 import yfinance as yf
+from browser_service import BrowserCrashed
+from bulk_download import download_bulk
 from playwright_scraper import PlaywrightStockScraper
+from playwright_scraper_optimized import OptimizedStockScraper
+from source_health import SourceHealth, TIER_YFINANCE
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+
 class HybridCollector:
     def __init__(self):
         self.playwright_scraper = PlaywrightStockScraper()
-    
+        # フォールバック用（失敗した銘柄だけを1つのブラウザでまとめて取得）
+        self.fallback_scraper = OptimizedStockScraper()
+        # yfinanceで失敗が続いている銘柄は一括取得から外し、最初からplaywrightで取得する
+        self.health = SourceHealth(self.fallback_scraper.db_path)
+
     def collect_with_fallback(self, ticker):
         """yfinanceで取得、失敗時はplaywright"""
         logger.info(f"🔄 {ticker}データ収集開始")
-        
+
         # まずyfinanceで試す（速い）
         try:
             logger.info("📊 yfinanceで取得中...")
             df = yf.download(ticker, period='3mo', progress=False)
-            
+
             if len(df) > 0:
                 logger.info(f"✅ yfinance成功: {len(df)}件")
                 return df, 'yfinance'
         except Exception as e:
             logger.warning(f"⚠️ yfinance失敗: {e}")
-        
+
         # yfinance失敗時はplaywright
         logger.info("🎭 playwrightで取得中...")
         df = self.playwright_scraper.scrape_yahoo_finance(ticker)
-        
+
         if df is not None and len(df) > 0:
             logger.info(f"✅ playwright成功: {len(df)}件")
             return df, 'playwright'
-        
+
         logger.error(f"❌ {ticker}取得失敗（両方とも）")
         return None, None
-    
+
     def collect_all(self, tickers):
-        """全銘柄収集"""
+        """全銘柄収集
+
+        yfinanceで全銘柄を一括取得し、失敗・空だった銘柄だけplaywrightで取得する
+        """
         results = {}
-        
-        for ticker in tickers:
-            df, method = self.collect_with_fallback(ticker)
-            if df is not None:
+
+        skipped = [ticker for ticker in tickers if self.health.is_open(ticker, TIER_YFINANCE)]
+        if skipped:
+            logger.info(f"⏭️ yfinanceで失敗が続いている銘柄を直接playwrightへ: {', '.join(skipped)}")
+        bulk_tickers = [ticker for ticker in tickers if ticker not in skipped]
+
+        logger.info(f"📊 yfinanceで一括取得中... ({len(bulk_tickers)}銘柄)")
+        started = time.perf_counter()
+        frames, failed = download_bulk(bulk_tickers)
+        # 一括取得なので所要時間は銘柄あたりの平均で記録する
+        elapsed = (time.perf_counter() - started) / max(len(bulk_tickers), 1)
+        for ticker in bulk_tickers:
+            ok = ticker in frames
+            self.health.record(ticker, TIER_YFINANCE, elapsed, ok, None if ok else 'データなし')
+        logger.info(f"✅ yfinance成功: {len(frames)}/{len(bulk_tickers)}銘柄")
+        failed = skipped + failed
+
+        for ticker, df in frames.items():
+            results[ticker] = {
+                'data': df,
+                'method': 'yfinance',
+                'records': len(df)
+            }
+
+        if failed:
+            # ブラウザは失敗した銘柄があるときだけ1回起動する
+            logger.info(f"🎭 playwrightで取得中... ({', '.join(failed)})")
+            try:
+                scraped = self.fallback_scraper.scrape_with_single_browser(failed)
+            except BrowserCrashed as e:
+                logger.error(f"❌ {e}: 残りの銘柄は取得失敗として扱います")
+                scraped = e.results
+
+            for ticker, df in scraped.items():
                 results[ticker] = {
                     'data': df,
-                    'method': method,
+                    'method': 'playwright',
                     'records': len(df)
                 }
-        
-        return results
+
+            for ticker in failed:
+                if ticker not in scraped:
+                    logger.error(f"❌ {ticker}取得失敗（両方とも）")
+
+        # 入力順に並べ直す
+        return {ticker: results[ticker] for ticker in tickers if ticker in results}
 
 # 実行
 if __name__ == "__main__":
+    from config.stock_config import get_all_tickers
+
     collector = HybridCollector()
-    
-    tickers = ['7203.T', 'AAPL', 'TSLA']
+
+    tickers = get_all_tickers()
     results = collector.collect_all(tickers)
-    
+
     for ticker, result in results.items():
         print(f"{ticker}: {result['records']}件 ({result['method']})")
@@ -1,12 +1,17 @@
 # integrated_system.py
+from config.stock_config import DB_PATH, get_all_tickers
 from playwright_scraper_optimized import OptimizedStockScraper
 from feature_engineering import FeatureEngineer
+from change_detector import FingerprintStore, compute_fingerprint
+from notifier import Notifier
+from pipeline_metrics import PipelineMetrics
+from resource_sampler import ResourceSampler
 import joblib
+import os
 import pandas as pd
 import sqlite3
 import logging
 from datetime import datetime
-import requests
 import psutil
 
 logging.basicConfig(
@@ -17,9 +22,13 @@ logging.basicConfig(
 
 class IntegratedSystem:
     def __init__(self):
-        self.scraper = OptimizedStockScraper()
+        self.db_path = DB_PATH
+        self.metrics = PipelineMetrics('integrated', self.db_path)
+        self.scraper = OptimizedStockScraper(self.db_path, metrics=self.metrics)
         self.feature_engineer = FeatureEngineer()
-        self.db_path = '/home/stock_prophet/data/stock_data.db'
+        self.model_path = '/home/stock_prophet/models/best_model.pkl'
+        self.fingerprints = FingerprintStore(self.db_path)
+        self.notifier = Notifier(self.db_path)
         
         # リソースチェック
         self.check_system_resources()
@@ -44,12 +53,13 @@ class IntegratedSystem:
         logging.info(f"実行時刻: {datetime.now()}")
         logging.info("=" * 60)
         
+        # Chromiumを含むプロセスのRSS・CPUをステージ別に記録
+        sampler = ResourceSampler(self.metrics)
+        sampler.start()
+        
         try:
-            # ティッカーリスト
-            tickers = [
-                '7203.T', '6758.T', '9984.T', '6501.T', '8306.T',  # 日本株
-                'AAPL', 'TSLA', 'NVDA', 'GOOGL', 'MSFT'  # 米国株
-            ]
+            # ティッカーリスト（config/universe.csv）
+            tickers = get_all_tickers()
             
             # 1. データ収集（playwright）
             logging.info("\n📊 Phase 1: データ収集")
@@ -62,13 +72,25 @@ class IntegratedSystem:
             # 2. 予測
             logging.info("\n🤖 Phase 2: 予測実行")
             predictions = []
+            skipped = []
             
-            model = joblib.load('/home/stock_prophet/models/best_model.pkl')
+            model = joblib.load(self.model_path)
+            model_mtime = os.path.getmtime(self.model_path)
             
             for ticker, df in results.items():
                 try:
+                    # 株価・モデルとも前回から変化がなければ前回の予測を再利用
+                    fingerprint = f"{compute_fingerprint(df)}:{model_mtime:.0f}"
+                    record = self.fingerprints.get(ticker, 'predict')
+                    if record and record['fingerprint'] == fingerprint and record['payload']:
+                        predictions.append(record['payload'])
+                        skipped.append(ticker)
+                        self.metrics.inc('cache_hits', stage='predict')
+                        continue
+                    
                     # 特徴量作成
-                    df_features = self.feature_engineer.create_technical_indicators(df)
+                    with self.metrics.stage('features'):
+                        df_features = self.feature_engineer.create_technical_indicators(df)
                     
                     if len(df_features) < 20:
                         logging.warning(f"⚠️  {ticker}: データ不足")
@@ -78,30 +100,38 @@ class IntegratedSystem:
                     feature_cols = self.feature_engineer.get_feature_columns()
                     X_latest = df_features[feature_cols].iloc[-1:].values
                     
-                    predicted_price = model.predict(X_latest)[0]
+                    with self.metrics.stage('predict'):
+                        predicted_price = model.predict(X_latest)[0]
                     current_price = df_features['Close'].iloc[-1]
                     change_percent = ((predicted_price - current_price) / current_price) * 100
                     
-                    predictions.append({
+                    prediction = {
                         'ticker': ticker,
                         'current_price': float(current_price),
                         'predicted_price': float(predicted_price),
                         'change_percent': float(change_percent)
-                    })
+                    }
+                    predictions.append(prediction)
+                    self.fingerprints.set(ticker, 'predict', fingerprint, prediction)
                     
                     logging.info(f"✅ {ticker}: {change_percent:+.2f}%")
                     
                 except Exception as e:
                     logging.error(f"❌ {ticker}予測エラー: {e}")
             
+            if skipped:
+                logging.info(f"⏭️  変更なしで特徴量・予測スキップ: {len(skipped)}銘柄 ({', '.join(skipped)})")
+            
             # 3. 通知
             if len(predictions) > 0:
                 logging.info("\n📢 Phase 3: 通知送信")
-                self.send_slack_notification(predictions)
+                with self.metrics.stage('notify'):
+                    self.send_slack_notification(predictions)
             
             # 4. リソース使用状況ログ
             memory = psutil.virtual_memory()
             logging.info(f"\n💾 処理後メモリ使用率: {memory.percent:.1f}%")
+            self.metrics.set('memory_percent', memory.percent)
             
             logging.info("\n✅ 処理完了")
             logging.info("=" * 60)
@@ -109,11 +139,14 @@ class IntegratedSystem:
         except Exception as e:
             logging.error(f"❌ システムエラー: {e}")
             raise
+        finally:
+            sampler.stop()
+            # 送りきれなかった通知は次回送信
+            self.notifier.close()
+            self.metrics.export()
     
     def send_slack_notification(self, predictions):
-        """Slack通知"""
-        webhook_url = "YOUR_SLACK_WEBHOOK_URL"
-        
+        """Slack・ChatWork通知（キューに保存してバックグラウンドで送信）"""
         # 上昇率順にソート
         sorted_preds = sorted(predictions, key=lambda x: x['change_percent'], reverse=True)
         
@@ -131,14 +164,7 @@ class IntegratedSystem:
             message += f"• *{pred['ticker']}*: {pred['change_percent']:+.2f}% "
             message += f"(¥{pred['current_price']:,.0f} → ¥{pred['predicted_price']:,.0f})\n"
         
-        try:
-            response = requests.post(webhook_url, json={"text": message}, timeout=10)
-            if response.status_code == 200:
-                logging.info("✅ Slack通知送信完了")
-            else:
-                logging.warning(f"⚠️  Slack通知失敗: {response.status_code}")
-        except Exception as e:
-            logging.error(f"❌ Slack通知エラー: {e}")
+        self.notifier.notify(message)
 
 if __name__ == "__main__":
     system = IntegratedSystem()
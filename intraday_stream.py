@@ -0,0 +1,548 @@
+"""
+日中ストリーミングモード
+フィードから1分足を受け取り、銘柄ごとの直近の足を固定長のNumPyリングバッファに保持する。
+テクニカル指標は窓の合計を差分で更新し（足ごとにDataFrameを作り直さない）、
+同じ時刻の足が届いた銘柄をまとめてモデルで再スコアする。足ごとの処理レイテンシを分位点で記録する
+
+指標は predict_system.py の create_features と同じ定義（SMA_5, SMA_20, RSI, Return_1d, Return_5d,
+Volatility, Volume_SMA。1d・5d は1分足では1本・5本前との比較になる）。
+モデルは日足で訓練したものも読めるが、日中の予測に使う場合は1分足で訓練したものを指定すること
+
+使い方:
+    python3 intraday_stream.py --synthetic 300 --minutes 390          # 合成リプレイでレイテンシ計測
+    python3 intraday_stream.py --replay ./data/replay/20261019.csv --speed 60
+    python3 intraday_stream.py --synthetic 20 --minutes 200 --verify  # 指標を create_features と突き合わせ
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from config.stock_config import DB_PATH
+from pipeline_metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = './models/stock_model.pkl'
+
+# predict_system.py / train_model.py と同じ並び
+FEATURE_COLUMNS = [
+    'Open', 'High', 'Low', 'Close', 'Volume',
+    'SMA_5', 'SMA_20', 'RSI',
+    'Return_1d', 'Return_5d', 'Volatility', 'Volume_SMA'
+]
+REPLAY_COLUMNS = ['timestamp', 'ticker', 'open', 'high', 'low', 'close', 'volume']
+
+# 保持する足の本数（米国株の1立会日 = 390分）
+DEFAULT_CAPACITY = 390
+# 全指標がそろうのに必要な足の本数（20本分のリターン = 21本の終値）
+WARMUP_BARS = 21
+# 窓の合計の浮動小数点誤差を消すため、この本数ごとにバッファから計算し直す
+RESYNC_BARS = 1000
+
+# 1時刻分の足: (時刻, 銘柄リスト, OHLCV の (銘柄数, 5) 配列)
+BarSlice = Tuple[pd.Timestamp, List[str], np.ndarray]
+
+
+class BarFeed(ABC):
+    """
+    1分足のフィード
+
+    同じ時刻の足をまとめた BarSlice を時刻順に返す。実際の配信元（WebSocketなど）は
+    これを継承して __iter__ を実装する（同じ時刻に同じ銘柄が重複した場合はエンジンが最後の足だけを使う）
+    """
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[BarSlice]:
+        """足を時刻順に返す"""
+
+
+class ReplayFeed(BarFeed):
+    """保存済みの1分足CSV（timestamp, ticker, open, high, low, close, volume）を再生するフィード"""
+
+    def __init__(self, path: str, speed: float = 0.0):
+        """
+        初期化
+
+        Args:
+            path: リプレイファイルのパス
+            speed: 再生速度（60なら1分足を1秒ごと、0なら待たずに流す）
+        """
+        self.path = path
+        self.speed = speed
+
+    def __iter__(self) -> Iterator[BarSlice]:
+        df = pd.read_csv(self.path, parse_dates=['timestamp'])
+        df = df.sort_values(['timestamp', 'ticker'], kind='stable')
+        values = df[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype='float64')
+        tickers = df['ticker'].to_numpy()
+        timestamps = df['timestamp'].to_numpy()
+
+        # 時刻が変わる位置で切り分ける
+        bounds = np.flatnonzero(timestamps[1:] != timestamps[:-1]) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(df)]])
+
+        previous = None
+        for start, end in zip(starts, ends):
+            timestamp = pd.Timestamp(timestamps[start])
+            if self.speed and previous is not None:
+                time.sleep(max(0.0, (timestamp - previous).total_seconds() / self.speed))
+            previous = timestamp
+            yield timestamp, tickers[start:end].tolist(), values[start:end]
+
+
+def write_synthetic_replay(path: str, tickers: List[str], minutes: int, seed: int = 0) -> str:
+    """
+    合成の1分足リプレイファイルを作る（約1%の足は欠ける）
+
+    Args:
+        path: 出力先
+        tickers: 銘柄
+        minutes: 本数
+        seed: 乱数シード
+
+    Returns:
+        出力先のパス
+    """
+    rng = np.random.default_rng(seed)
+    n = len(tickers)
+    times = pd.date_range('2026-01-05 09:30', periods=minutes, freq='min')
+
+    close = rng.uniform(20, 3000, n) * np.exp(np.cumsum(rng.normal(0, 0.0008, (minutes, n)), axis=0))
+    open_ = close * (1 + rng.normal(0, 0.0003, (minutes, n)))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.0005, (minutes, n)))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.0005, (minutes, n)))
+    volume = rng.integers(100, 100_000, (minutes, n))
+
+    df = pd.DataFrame({
+        'timestamp': np.repeat(times, n),
+        'ticker': np.tile(tickers, minutes),
+        'open': open_.ravel().round(4),
+        'high': high.ravel().round(4),
+        'low': low.ravel().round(4),
+        'close': close.ravel().round(4),
+        'volume': volume.ravel(),
+    })
+    df = df[rng.random(len(df)) >= 0.01]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+class RingBufferBars:
+    """
+    全銘柄の直近の足を (銘柄数, capacity) のリングバッファで保持し、指標を差分更新する
+
+    窓の合計（終値5本・20本、出来高20本、上昇幅・下落幅14本、リターン20本とその二乗）を持っておき、
+    新しい足では窓に入る値を足して窓から出る値を引くだけにする
+    """
+
+    def __init__(self, tickers: List[str], capacity: int = DEFAULT_CAPACITY):
+        """
+        初期化
+
+        Args:
+            tickers: 銘柄（並びが行番号になる）
+            capacity: 銘柄ごとに保持する足の本数（WARMUP_BARS 以上）
+        """
+        if capacity < WARMUP_BARS:
+            raise ValueError(f"capacity は {WARMUP_BARS} 以上にしてください: {capacity}")
+
+        self.tickers = list(tickers)
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.capacity = capacity
+        n = len(self.tickers)
+
+        self.timestamp = np.zeros((n, capacity), dtype='datetime64[ns]')
+        self.ohlcv = np.zeros((n, capacity, 5))
+        # 直前の足との差から作る系列（1本目は0）
+        self.ret = np.zeros((n, capacity))
+        self.gain = np.zeros((n, capacity))
+        self.loss = np.zeros((n, capacity))
+        self.count = np.zeros(n, dtype=np.int64)
+
+        # 窓の合計
+        self.sums = {
+            name: np.zeros(n)
+            for name in ('close5', 'close20', 'volume20', 'gain14', 'loss14', 'ret20', 'ret_sq20')
+        }
+
+    def _at(self, rows: np.ndarray, back: np.ndarray) -> np.ndarray:
+        """各銘柄の back 本前（0が最新）のバッファ位置"""
+        return (self.count[rows] - 1 - back) % self.capacity
+
+    def _leaving(self, values: np.ndarray, rows: np.ndarray, n: np.ndarray, window: int) -> np.ndarray:
+        """窓から出る値（足りなければ0）。新しい足を書き込む前に読む"""
+        out = values[rows, (n - window) % self.capacity]
+        return np.where(n >= window, out, 0.0)
+
+    def update(self, rows: np.ndarray, timestamp, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        同じ時刻の足をまとめて追加し、その銘柄の特徴量を返す
+
+        Args:
+            rows: 銘柄の行番号（重複なし）
+            timestamp: 足の時刻
+            values: OHLCV の (len(rows), 5) 配列
+
+        Returns:
+            (特徴量の (len(rows), 12) 配列, 全指標がそろった行のマスク)
+        """
+        cap = self.capacity
+        n = self.count[rows]
+        close = values[:, 3]
+        volume = values[:, 4]
+
+        prev_close = self.ohlcv[rows, (n - 1) % cap, 3]
+        has_prev = n >= 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.where(has_prev, close - prev_close, 0.0)
+            ret = np.where(has_prev, close / prev_close - 1, 0.0)
+        gain = np.maximum(delta, 0.0)
+        loss = np.maximum(-delta, 0.0)
+
+        closes = self.ohlcv[:, :, 3]
+        volumes = self.ohlcv[:, :, 4]
+        sums = self.sums
+        ret_leaving = self._leaving(self.ret, rows, n, 20)
+        sums['close5'][rows] += close - self._leaving(closes, rows, n, 5)
+        sums['close20'][rows] += close - self._leaving(closes, rows, n, 20)
+        sums['volume20'][rows] += volume - self._leaving(volumes, rows, n, 20)
+        sums['gain14'][rows] += gain - self._leaving(self.gain, rows, n, 14)
+        sums['loss14'][rows] += loss - self._leaving(self.loss, rows, n, 14)
+        sums['ret20'][rows] += ret - ret_leaving
+        sums['ret_sq20'][rows] += ret * ret - ret_leaving * ret_leaving
+        close_5_back = closes[rows, (n - 5) % cap]
+
+        position = n % cap
+        self.timestamp[rows, position] = timestamp
+        self.ohlcv[rows, position] = values
+        self.ret[rows, position] = ret
+        self.gain[rows, position] = gain
+        self.loss[rows, position] = loss
+        self.count[rows] = n + 1
+
+        resync = rows[(n + 1) % RESYNC_BARS == 0]
+        if len(resync):
+            self.recompute(resync)
+
+        return self._features(rows, values, close_5_back)
+
+    def _features(self, rows: np.ndarray, values: np.ndarray, close_5_back: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        sums = self.sums
+        count = self.count[rows]
+        features = np.empty((len(rows), len(FEATURE_COLUMNS)))
+        features[:, :5] = values
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            features[:, 5] = sums['close5'][rows] / 5
+            features[:, 6] = sums['close20'][rows] / 20
+            rs = sums['gain14'][rows] / sums['loss14'][rows]
+            features[:, 7] = 100 - 100 / (1 + rs)
+            features[:, 8] = self.ret[rows, (count - 1) % self.capacity]
+            features[:, 9] = values[:, 3] / close_5_back - 1
+            # 標本標準偏差（ddof=1）。打ち消し誤差で負にならないよう0で下限
+            variance = (sums['ret_sq20'][rows] - sums['ret20'][rows] ** 2 / 20) / 19
+            features[:, 10] = np.sqrt(np.maximum(variance, 0.0))
+            features[:, 11] = sums['volume20'][rows] / 20
+
+        return features, count >= WARMUP_BARS
+
+    def recompute(self, rows: np.ndarray) -> None:
+        """窓の合計をバッファから計算し直す（差分更新の誤差をリセット）"""
+        count = self.count[rows]
+
+        def window_sum(values: np.ndarray, window: int, first: int = 0, square: bool = False) -> np.ndarray:
+            # first: 系列の最初の有効な足（差から作る系列は1本目が0なので1）
+            back = np.arange(window)
+            positions = (count[:, None] - 1 - back[None, :]) % self.capacity
+            gathered = values[rows[:, None], positions]
+            valid = (count[:, None] - 1 - back[None, :]) >= first
+            gathered = np.where(valid, gathered, 0.0)
+            return (gathered * gathered if square else gathered).sum(axis=1)
+
+        closes = self.ohlcv[:, :, 3]
+        self.sums['close5'][rows] = window_sum(closes, 5)
+        self.sums['close20'][rows] = window_sum(closes, 20)
+        self.sums['volume20'][rows] = window_sum(self.ohlcv[:, :, 4], 20)
+        self.sums['gain14'][rows] = window_sum(self.gain, 14, 1)
+        self.sums['loss14'][rows] = window_sum(self.loss, 14, 1)
+        self.sums['ret20'][rows] = window_sum(self.ret, 20, 1)
+        self.sums['ret_sq20'][rows] = window_sum(self.ret, 20, 1, square=True)
+
+    def frame(self, ticker: str) -> pd.DataFrame:
+        """銘柄のバッファを古い順のDataFrameにする（確認・デバッグ用）"""
+        row = self.index[ticker]
+        count = int(self.count[row])
+        positions = (np.arange(max(0, count - self.capacity), count)) % self.capacity
+        return pd.DataFrame(
+            self.ohlcv[row, positions], columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+            index=pd.DatetimeIndex(self.timestamp[row, positions], name='Date')
+        )
+
+
+def model_scorer(model) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    モデルを特徴量行列 → 予測値の関数にする
+
+    XGBoost は predict の DMatrix 作成を省ける inplace_predict を使う
+    """
+    get_booster = getattr(model, 'get_booster', None)
+    if get_booster is not None:
+        booster = get_booster()
+        return lambda X: booster.inplace_predict(X)
+    return model.predict
+
+
+def sma_scorer(X: np.ndarray) -> np.ndarray:
+    """モデルがない場合の代用（SMA_5 を予測値とする。レイテンシ計測用）"""
+    return X[:, FEATURE_COLUMNS.index('SMA_5')]
+
+
+class LatencyRecorder:
+    """時刻ごとの処理時間を記録して分位点を出す"""
+
+    def __init__(self, initial: int = 4096):
+        self._data = np.zeros((initial, 3))
+        self._size = 0
+
+    def record(self, bars: int, feature_seconds: float, score_seconds: float) -> None:
+        if self._size == len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._data[self._size] = (bars, feature_seconds, score_seconds)
+        self._size += 1
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns:
+            slice_*: 1時刻分（全銘柄の特徴量＋スコア）の処理時間（μs）。最後の銘柄のスコアが出るまでの待ち時間
+            per_bar_*: 1銘柄1本あたりに按分した特徴量＋スコアの処理時間（μs）
+        """
+        data = self._data[:self._size]
+        if len(data) == 0:
+            return {}
+        bars, feature, score = data[:, 0], data[:, 1], data[:, 2]
+        total = (feature + score) * 1e6
+        per_bar = total / bars
+
+        summary = {'slices': len(data), 'bars': int(bars.sum())}
+        for name, values in (('slice', total), ('per_bar', per_bar)):
+            for q in (50, 95, 99):
+                summary[f'{name}_p{q}_us'] = float(np.percentile(values, q))
+            summary[f'{name}_max_us'] = float(values.max())
+        summary['feature_share'] = float(feature.sum() / (feature.sum() + score.sum()))
+        return summary
+
+
+class IntradayEngine:
+    """フィードの足ごとに指標を更新して再スコアする"""
+
+    def __init__(
+        self,
+        tickers: List[str],
+        scorer: Callable[[np.ndarray], np.ndarray] = sma_scorer,
+        capacity: int = DEFAULT_CAPACITY,
+        metrics: Optional[PipelineMetrics] = None,
+        publisher=None
+    ):
+        """
+        初期化
+
+        Args:
+            tickers: 対象銘柄（フィードに含まれる他の銘柄は無視する）
+            scorer: 特徴量行列 → 予測終値の関数
+            capacity: 銘柄ごとに保持する足の本数
+            metrics: 計測の記録先（指定時は終了時にレイテンシの分位点を記録）
+            publisher: EventPublisher（指定時は時刻ごとに予測を 'intraday' イベントとして配信）
+        """
+        self.bars = RingBufferBars(tickers, capacity)
+        self.scorer = scorer
+        self.metrics = metrics
+        self.publisher = publisher
+        self.latency = LatencyRecorder()
+        # 同じ時刻に重複して届き、捨てた足の本数
+        self.duplicates = 0
+
+        n = len(tickers)
+        # 銘柄ごとの最新の予測
+        self.predicted = np.full(n, np.nan)
+        self.last_close = np.full(n, np.nan)
+        self.scored_at = np.zeros(n, dtype='datetime64[ns]')
+
+    def on_slice(self, timestamp, tickers: List[str], values: np.ndarray) -> int:
+        """
+        1時刻分の足を処理
+
+        Returns:
+            スコアした銘柄数
+        """
+        index = self.bars.index
+        keep = [i for i, ticker in enumerate(tickers) if ticker in index]
+        if len(keep) != len(tickers):
+            tickers = [tickers[i] for i in keep]
+            values = values[keep]
+        if not tickers:
+            return 0
+        rows = np.fromiter((index[t] for t in tickers), dtype=np.int64, count=len(tickers))
+
+        # update は行の重複を扱えない（窓の合計への加算が1回分しか反映されず、再計算まで値がずれる）
+        unique_rows, last = np.unique(rows[::-1], return_index=True)
+        if len(unique_rows) != len(rows):
+            keep = np.sort(len(rows) - 1 - last)
+            self.duplicates += len(rows) - len(keep)
+            logger.warning(f"⚠️ {timestamp}: 重複した足 {len(rows) - len(keep)}本（最後の足を使用）")
+            rows, values = rows[keep], values[keep]
+
+        started = time.perf_counter()
+        features, ready = self.bars.update(rows, np.datetime64(timestamp, 'ns'), values)
+        featured = time.perf_counter()
+
+        scored = rows[ready]
+        if len(scored):
+            self.predicted[scored] = self.scorer(features[ready])
+        finished = time.perf_counter()
+
+        self.last_close[rows] = values[:, 3]
+        self.scored_at[scored] = np.datetime64(timestamp, 'ns')
+        self.latency.record(len(rows), featured - started, finished - featured)
+
+        if self.publisher is not None and len(scored):
+            self.publisher.publish('intraday', {
+                'time': pd.Timestamp(timestamp).isoformat(),
+                'predictions': {
+                    self.bars.tickers[r]: round(float(self.predicted[r]), 4) for r in scored
+                },
+            })
+        return len(scored)
+
+    def run(self, feed: BarFeed) -> Dict[str, float]:
+        """
+        フィードが終わるまで処理
+
+        Returns:
+            レイテンシの集計（LatencyRecorder.summary）
+        """
+        for timestamp, tickers, values in feed:
+            self.on_slice(timestamp, tickers, values)
+
+        summary = self.latency.summary()
+        if summary:
+            summary['duplicates'] = self.duplicates
+        if self.metrics is not None and summary:
+            self.metrics.set('intraday_bars', summary['bars'])
+            self.metrics.set('intraday_duplicate_bars', self.duplicates)
+            for key, value in summary.items():
+                if key.endswith('_us'):
+                    self.metrics.set('intraday_latency_us', value, kind=key[:-3])
+        return summary
+
+    def predictions(self) -> pd.DataFrame:
+        """銘柄ごとの最新の予測"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = (self.predicted - self.last_close) / self.last_close * 100
+        return pd.DataFrame({
+            'ticker': self.bars.tickers,
+            'current_price': self.last_close,
+            'predicted_price': self.predicted,
+            'change_percent': change,
+            'scored_at': self.scored_at,
+        }).dropna(subset=['predicted_price'])
+
+
+def verify_features(engine: IntradayEngine, create_features: Callable[[pd.DataFrame], pd.DataFrame]) -> float:
+    """
+    差分更新の特徴量を、バッファ全体から create_features で作り直したものと比べる
+
+    Returns:
+        最大の相対誤差
+    """
+    worst = 0.0
+    for ticker in engine.bars.tickers:
+        df = engine.bars.frame(ticker)
+        if len(df) < WARMUP_BARS:
+            continue
+        expected = create_features(df.copy())
+        if len(expected) == 0:
+            continue
+
+        row = engine.bars.index[ticker]
+        # 最新の足の特徴量を、書き込み済みの合計から作り直す
+        count = engine.bars.count[row:row + 1]
+        close_5_back = engine.bars.ohlcv[row, (count - 6) % engine.bars.capacity, 3]
+        actual, _ = engine.bars._features(np.array([row]), df.iloc[-1:].to_numpy(), close_5_back)
+
+        expected_row = expected[FEATURE_COLUMNS].iloc[-1].to_numpy()
+        scale = np.maximum(np.abs(expected_row), 1e-12)
+        worst = max(worst, float(np.nanmax(np.abs(actual[0] - expected_row) / scale)))
+    return worst
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='日中ストリーミング（1分足のリングバッファと再スコア）')
+    parser.add_argument('--replay', help='1分足のリプレイCSV（timestamp, ticker, open, high, low, close, volume）')
+    parser.add_argument('--synthetic', type=int, help='合成リプレイの銘柄数（--replay の代わり）')
+    parser.add_argument('--minutes', type=int, default=390, help='合成リプレイの本数')
+    parser.add_argument('--speed', type=float, default=0.0, help='再生速度（60なら1分足を1秒ごと、0なら待たない）')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help='銘柄ごとに保持する足の本数')
+    parser.add_argument('--model', default=MODEL_PATH, help='スコアに使うモデル（なければ SMA_5 で代用）')
+    parser.add_argument('--publish', action='store_true', help="予測を 'intraday' イベントとして配信")
+    parser.add_argument('--verify', action='store_true', help='終了時に指標を create_features と突き合わせる')
+    parser.add_argument('--db', default=DB_PATH, help='メトリクス・イベントの保存先の株価DB')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        tickers = [f'SYN{i:04d}' for i in range(args.synthetic)]
+        path = write_synthetic_replay(f'./data/replay/synthetic_{args.synthetic}x{args.minutes}.csv', tickers, args.minutes)
+    elif args.replay:
+        path = args.replay
+        tickers = sorted(pd.read_csv(path, usecols=['ticker'])['ticker'].unique())
+    else:
+        parser.error('--replay か --synthetic を指定してください')
+
+    if os.path.exists(args.model):
+        scorer = model_scorer(joblib.load(args.model))
+        logger.info(f"🤖 モデル: {args.model}")
+    else:
+        scorer = sma_scorer
+        logger.warning(f"⚠️ モデルがないため SMA_5 で代用します: {args.model}")
+
+    publisher = None
+    if args.publish:
+        from event_bus import EventPublisher, events_path_for
+        publisher = EventPublisher(events_path_for(args.db))
+
+    metrics = PipelineMetrics('intraday', args.db)
+    engine = IntradayEngine(tickers, scorer, args.capacity, metrics, publisher)
+
+    logger.info(f"📡 日中ストリーミング開始: {len(tickers)}銘柄 ({path})")
+    with metrics.stage('stream'):
+        summary = engine.run(ReplayFeed(path, args.speed))
+    metrics.export()
+
+    logger.info(
+        f"⏱️  {summary['bars']}本 / {summary['slices']}時刻: "
+        f"1銘柄1本あたり p50 {summary['per_bar_p50_us']:.1f}μs, p99 {summary['per_bar_p99_us']:.1f}μs / "
+        f"1時刻分 p50 {summary['slice_p50_us']:.0f}μs, p99 {summary['slice_p99_us']:.0f}μs "
+        f"(特徴量 {summary['feature_share']:.0%})"
+    )
+
+    if args.verify:
+        from predict_system import StockPredictionSystem
+        error = verify_features(engine, StockPredictionSystem(args.db).create_features)
+        logger.info(f"🔍 create_features との最大相対誤差: {error:.2e}")
+
+    top = engine.predictions().sort_values('change_percent', ascending=False)
+    print(top.head(5).to_string(index=False))
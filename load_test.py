@@ -0,0 +1,149 @@
+"""
+APIの負荷テスト
+ローカルで起動したAPIに対してKeep-Aliveの並列リクエストを送り、
+レイテンシ（p50/p99）とスループット（req/s）を計測する
+
+使い方:
+    uvicorn api:app --port 8000 &
+    python3 load_test.py --url http://127.0.0.1:8000 --paths / /predictions --concurrency 50 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import numpy as np
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    """HTTP/1.1レスポンスを1件読み、ステータスコードを返す"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("接続が閉じられました")
+    status = int(status_line.split()[1])
+    
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    
+    return status
+
+
+async def client(
+    host: str,
+    port: int,
+    paths: List[str],
+    deadline: float,
+    latencies: List[float],
+    statuses: Counter
+) -> None:
+    """1接続を使い回してdeadlineまでリクエストを送り続ける"""
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n"
+            
+            started = time.perf_counter()
+            writer.write(request.encode('ascii'))
+            await writer.drain()
+            try:
+                status = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                statuses['error'] += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run_load_test(url: str, paths: List[str], concurrency: int, duration: float) -> Dict:
+    """
+    負荷テストを実行
+    
+    Args:
+        url: APIのベースURL
+        paths: リクエストするパス（順番に使う）
+        concurrency: 同時接続数
+        duration: 計測時間（秒）
+    
+    Returns:
+        計測結果の辞書
+    """
+    parsed = urlparse(url)
+    host = parsed.hostname or '127.0.0.1'
+    port = parsed.port or 80
+    
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[
+        client(host, port, paths, deadline, latencies, statuses)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    
+    ms = np.array(latencies) * 1000 if latencies else np.array([0.0])
+    return {
+        'url': url,
+        'paths': paths,
+        'concurrency': concurrency,
+        'duration_sec': round(elapsed, 2),
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(float(np.percentile(ms, 50)), 2),
+            'p90': round(float(np.percentile(ms, 90)), 2),
+            'p99': round(float(np.percentile(ms, 99)), 2),
+            'max': round(float(ms.max()), 2),
+        },
+        'status': {str(k): v for k, v in statuses.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='API負荷テスト')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='APIのベースURL')
+    parser.add_argument('--paths', nargs='+', default=['/predictions'], help='リクエストするパス')
+    parser.add_argument('--concurrency', type=int, default=20, help='同時接続数')
+    parser.add_argument('--duration', type=float, default=10.0, help='計測時間（秒）')
+    args = parser.parse_args()
+    
+    result = asyncio.run(run_load_test(args.url, args.paths, args.concurrency, args.duration))
+    
+    print("=" * 60)
+    print("📊 負荷テスト結果")
+    print("=" * 60)
+    print(f"  リクエスト数: {result['requests']} ({result['rps']} req/s)")
+    print(f"  p50: {result['latency_ms']['p50']}ms / p99: {result['latency_ms']['p99']}ms")
+    print(f"  ステータス: {result['status']}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
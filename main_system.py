@@ -1,12 +1,14 @@
 # main_system.py
 import yfinance as yf
+from config.stock_config import DB_PATH, get_all_tickers
 from hybrid_collector import HybridCollector
+from notifier import Notifier
 from feature_engineering import FeatureEngineer
 from model_training import StockPredictor
-import sqlite3
-import pandas as pd
+from prediction_store import PredictionStore, model_version_for
+from pipeline_metrics import PipelineMetrics
+from resource_sampler import ResourceSampler
 import logging
-import requests
 from datetime import datetime
 
 logging.basicConfig(
@@ -20,7 +22,11 @@ class StockProphetSystem:
         self.collector = HybridCollector()
         self.feature_engineer = FeatureEngineer()
         self.predictor = StockPredictor()
-        self.db_path = '/home/stock_prophet/data/stock_data.db'
+        # 予測履歴のモデルバージョン（predict_system.py と同じくモデルファイルの内容から決める）
+        self.model_path = getattr(self.predictor, 'model_path', './models/stock_model.pkl')
+        self.db_path = DB_PATH
+        self.metrics = PipelineMetrics('main', self.db_path)
+        self.notifier = Notifier(self.db_path)
         
     def run_daily_prediction(self):
         """毎日の予測実行"""
@@ -29,20 +35,13 @@ class StockProphetSystem:
         logging.info(f"実行時刻: {datetime.now()}")
         logging.info("=" * 50)
         
-        tickers = [
-            '7203.T',   # トヨタ
-            '6758.T',   # ソニー
-            '9984.T',   # ソフトバンク
-            '6501.T',   # 日立
-            'AAPL',     # Apple
-            'TSLA',     # Tesla
-            'NVDA',     # NVIDIA
-            'GOOGL',    # Google
-        ]
+        # 監視対象は config/universe.csv
+        tickers = get_all_tickers()
         
         # 1. データ収集
         logging.info("\n📊 Phase 1: データ収集")
-        results = self.collector.collect_all(tickers)
+        with self.metrics.stage('collect'):
+            results = self.collector.collect_all(tickers)
         
         # 2. 特徴量作成 & 予測
         logging.info("\n🤖 Phase 2: 予測実行")
@@ -53,10 +52,12 @@ class StockProphetSystem:
                 df = result['data']
                 
                 # 特徴量作成
-                df = self.feature_engineer.create_technical_indicators(df)
+                with self.metrics.stage('features'):
+                    df = self.feature_engineer.create_technical_indicators(df)
                 
                 # 予測
-                pred = self.predictor.predict_next_day(df, ticker)
+                with self.metrics.stage('predict'), self.metrics.ticker('predict', ticker):
+                    pred = self.predictor.predict_next_day(df, ticker)
                 predictions.append(pred)
                 
             except Exception as e:
@@ -64,18 +65,21 @@ class StockProphetSystem:
         
         # 3. 通知
         logging.info("\n📢 Phase 3: 通知送信")
-        self.send_notifications(predictions)
+        with self.metrics.stage('notify'):
+            self.send_notifications(predictions)
         
         # 4. 予測履歴保存
-        self.save_predictions(predictions)
+        with self.metrics.stage('save'):
+            self.save_predictions(predictions)
+        
+        # 送りきれなかった通知は次回送信
+        self.notifier.close()
         
         logging.info("\n✅ 処理完了")
         logging.info("=" * 50)
     
     def send_notifications(self, predictions):
-        """Slack通知"""
-        webhook_url = "YOUR_SLACK_WEBHOOK_URL"
-        
+        """Slack・ChatWork通知（キューに保存してバックグラウンドで送信）"""
         message = f"📈 *Stock Prophet 予測レポート*\n"
         message += f"日時: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
         
@@ -90,21 +94,16 @@ class StockProphetSystem:
         for pred in sorted_preds[-3:]:
             message += f"• {pred['ticker']}: {pred['change_percent']:.2f}%\n"
         
-        try:
-            requests.post(webhook_url, json={"text": message})
-            logging.info("✅ Slack通知送信完了")
-        except Exception as e:
-            logging.error(f"❌ Slack通知失敗: {e}")
+        self.notifier.notify(message)
     
     def save_predictions(self, predictions):
-        """予測履歴をDBに保存"""
-        conn = sqlite3.connect(self.db_path)
-        df = pd.DataFrame(predictions)
-        df['timestamp'] = datetime.now()
-        df.to_sql('predictions_history', conn, if_exists='append', index=False)
-        conn.close()
+        """予測履歴をDBに保存（銘柄・予測対象日・モデルごとに1行）"""
+        store = PredictionStore(self.db_path)
+        store.save(predictions, model_version_for(self.model_path))
         logging.info("💾 予測履歴保存完了")
 
 if __name__ == "__main__":
     system = StockProphetSystem()
-    system.run_daily_prediction()
+    with ResourceSampler(system.metrics):
+        system.run_daily_prediction()
+    system.metrics.export()
@@ -0,0 +1,368 @@
+"""
+市場カレンダー対応スケジューラ
+前回実行以降に取引セッションが終了した銘柄だけを処理対象にする
+"""
+import sys
+sys.path.append('.')
+
+import json
+import os
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+
+from config.stock_config import (
+    SECONDS_PER_TICKER, TIME_BUDGET_MINUTES,
+    get_all_tickers, get_exchange, get_exchange_info, get_holidays, get_priority
+)
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = './data/scheduler_state.json'
+# 同じセッションで予測に失敗し続けた銘柄を諦めて処理済みにするまでの回数
+# （諦めないと優先度の高い失敗銘柄が毎回先頭の時間枠を占め、残りの銘柄が処理されない）
+MAX_ATTEMPTS_PER_SESSION = 3
+
+# 休場日が未登録で警告済みの (カレンダー, 年)
+_warned_calendar_years = set()
+
+
+def check_holiday_coverage(calendar: str, year: int) -> bool:
+    """
+    休場日カレンダーにその年の登録があるか確認（なければ1度だけ警告）
+
+    Args:
+        calendar: 休場日カレンダー名
+        year: 確認する年
+
+    Returns:
+        登録があればTrue
+    """
+    prefix = f'{year}-'
+    if any(day.startswith(prefix) for day in get_holidays(calendar)):
+        return True
+
+    if (calendar, year) not in _warned_calendar_years:
+        _warned_calendar_years.add((calendar, year))
+        logger.warning(
+            f"⚠️  {calendar} の{year}年の休場日が未登録です。休場日も取引日として扱われます"
+            f"（config/stock_config.py の HOLIDAYS に追加してください）"
+        )
+    return False
+
+
+def is_trading_day(exchange: str, day: date) -> bool:
+    """
+    取引日かどうかを判定（土日・休場日を除外）
+
+    Args:
+        exchange: 取引所コード
+        day: 判定する日付（現地日付）
+
+    Returns:
+        取引日ならTrue
+    """
+    if day.weekday() >= 5:
+        return False
+
+    calendar = get_exchange_info(exchange)['calendar']
+    return day.isoformat() not in get_holidays(calendar)
+
+
+def previous_trading_day(exchange: str, day: date) -> date:
+    """
+    指定日より前の直近取引日を取得
+
+    Args:
+        exchange: 取引所コード
+        day: 基準日
+
+    Returns:
+        直近の取引日
+    """
+    day -= timedelta(days=1)
+    while not is_trading_day(exchange, day):
+        day -= timedelta(days=1)
+    return day
+
+
+def next_trading_day(exchange: str, day: date) -> date:
+    """
+    指定日より後の直近取引日を取得
+
+    Args:
+        exchange: 取引所コード
+        day: 基準日
+
+    Returns:
+        次の取引日
+    """
+    day += timedelta(days=1)
+    while not is_trading_day(exchange, day):
+        day += timedelta(days=1)
+    return day
+
+
+def last_closed_session(exchange: str, now: Optional[datetime] = None) -> date:
+    """
+    直近で大引けを迎えた取引セッションの日付を取得
+
+    Args:
+        exchange: 取引所コード
+        now: 基準時刻（タイムゾーン付き、省略時は現在時刻）
+
+    Returns:
+        直近に終了したセッションの現地日付
+    """
+    info = get_exchange_info(exchange)
+    tz = pytz.timezone(info['timezone'])
+
+    if now is None:
+        now = datetime.now(pytz.utc)
+    local_now = now.astimezone(tz)
+
+    close_hour, close_minute = map(int, info['close'].split(':'))
+    today = local_now.date()
+    check_holiday_coverage(info['calendar'], today.year)
+
+    if is_trading_day(exchange, today) and local_now.time() >= time(close_hour, close_minute):
+        return today
+    return previous_trading_day(exchange, today)
+
+
+class MarketScheduler:
+    """セッション終了済みの銘柄を選ぶスケジューラ"""
+
+    def __init__(self, state_path: str = STATE_PATH, max_attempts: int = MAX_ATTEMPTS_PER_SESSION):
+        """
+        初期化
+
+        Args:
+            state_path: 銘柄ごとの処理済みセッションを記録するJSONファイル
+            max_attempts: 同じセッションで失敗した銘柄を処理済みにするまでの回数
+        """
+        self.state_path = state_path
+        # 失敗回数は別ファイル（処理済みセッションの記録の形式は変えない）
+        self.attempts_path = os.path.splitext(state_path)[0] + '_attempts.json'
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _load_json(path: str) -> Dict:
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️  スケジューラ状態の読み込み失敗: {e}")
+            return {}
+
+    @staticmethod
+    def _save_json(path: str, data: Dict) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def load_state(self) -> Dict[str, str]:
+        """
+        処理済みセッションの記録を読み込み
+
+        Returns:
+            {ticker: 'YYYY-MM-DD'} の辞書
+        """
+        return self._load_json(self.state_path)
+
+    def save_state(self, state: Dict[str, str]) -> None:
+        """
+        処理済みセッションの記録を保存（一時ファイル経由で置き換え）
+
+        Args:
+            state: {ticker: 'YYYY-MM-DD'} の辞書
+        """
+        self._save_json(self.state_path, state)
+
+    def get_due_tickers(
+        self,
+        tickers: Optional[List[str]] = None,
+        now: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        新しくセッションが終了した銘柄を取得
+
+        Args:
+            tickers: 候補の銘柄リスト（省略時は全銘柄）
+            now: 基準時刻（省略時は現在時刻）
+
+        Returns:
+            処理対象のティッカーリスト
+        """
+        if tickers is None:
+            tickers = get_all_tickers()
+
+        state = self.load_state()
+        sessions = {}
+        due = []
+
+        for ticker in tickers:
+            exchange = get_exchange(ticker)
+            if exchange is None:
+                # 取引所未登録の銘柄は毎回処理する
+                due.append(ticker)
+                continue
+
+            if exchange not in sessions:
+                sessions[exchange] = last_closed_session(exchange, now).isoformat()
+
+            if state.get(ticker, '') < sessions[exchange]:
+                due.append(ticker)
+
+        for exchange, session in sessions.items():
+            logger.info(f"🗓️  {exchange}: 直近セッション {session}")
+        logger.info(f"🎯 処理対象: {len(due)}/{len(tickers)}銘柄")
+
+        return due
+
+    def mark_processed(
+        self,
+        tickers: List[str],
+        now: Optional[datetime] = None
+    ) -> None:
+        """
+        銘柄の直近セッションを処理済みとして記録
+
+        Args:
+            tickers: 処理が完了した銘柄リスト
+            now: 基準時刻（省略時は現在時刻）
+        """
+        state = self.load_state()
+        attempts = self._load_json(self.attempts_path)
+
+        for ticker in tickers:
+            exchange = get_exchange(ticker)
+            if exchange is None:
+                continue
+            state[ticker] = last_closed_session(exchange, now).isoformat()
+            attempts.pop(ticker, None)
+
+        self.save_state(state)
+        self._save_json(self.attempts_path, attempts)
+        logger.info(f"🗓️  処理済み記録: {len(tickers)}銘柄")
+
+    def mark_failed(
+        self,
+        tickers: List[str],
+        now: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        銘柄の直近セッションの失敗を記録
+
+        同じセッションで max_attempts 回失敗した銘柄は処理済みとして記録し、次のセッションまで対象から外す
+
+        Args:
+            tickers: 処理に失敗した銘柄リスト
+            now: 基準時刻（省略時は現在時刻）
+
+        Returns:
+            今回諦めて処理済みにした銘柄リスト
+        """
+        state = self.load_state()
+        attempts = self._load_json(self.attempts_path)
+        given_up = []
+
+        for ticker in tickers:
+            exchange = get_exchange(ticker)
+            if exchange is None:
+                continue
+            session = last_closed_session(exchange, now).isoformat()
+            record = attempts.get(ticker)
+            count = record['attempts'] + 1 if record and record['session'] == session else 1
+
+            if count >= self.max_attempts:
+                state[ticker] = session
+                attempts.pop(ticker, None)
+                given_up.append(ticker)
+            else:
+                attempts[ticker] = {'session': session, 'attempts': count}
+
+        if given_up:
+            self.save_state(state)
+            logger.warning(
+                f"⚠️  {self.max_attempts}回失敗したため今回のセッションは処理済みにします: {', '.join(given_up)}"
+            )
+        self._save_json(self.attempts_path, attempts)
+        return given_up
+
+
+def time_boxed_shards(
+    tickers: List[str],
+    budget_minutes: float,
+    seconds_per_ticker: float = SECONDS_PER_TICKER
+) -> List[List[str]]:
+    """
+    銘柄を時間枠に収まるシャードに分割（優先度順、同じ優先度内は元の順）
+
+    シャードの大きさは銘柄数だけで決まるので、収集と予測のように別プロセスで
+    同じ銘柄リストから分割しても同じシャードになる
+
+    Args:
+        tickers: 銘柄リスト
+        budget_minutes: 1シャードの時間枠（分）
+        seconds_per_ticker: 1銘柄あたりの見積もり秒数
+
+    Returns:
+        シャードのリスト（先頭から処理する）
+    """
+    ordered = sorted(tickers, key=get_priority)
+    size = max(1, int(budget_minutes * 60 // seconds_per_ticker))
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+def resolve_tickers(
+    scheduled: bool,
+    tickers: Optional[List[str]] = None,
+    time_budget: Optional[float] = TIME_BUDGET_MINUTES
+) -> List[str]:
+    """
+    コマンドライン引数から処理対象の銘柄を決定
+
+    --scheduled で時間枠を指定すると、対象のうち優先度の高い順に枠に収まる分だけを返す。
+    残りは処理済みにならないので、次回の実行（1日に複数回のcron）で処理される。
+    --scheduled なしでは残りを覚えておけないので、時間枠は使わず全件を返す
+
+    Args:
+        scheduled: Trueならセッション終了済みの銘柄だけに絞る
+        tickers: 明示指定された銘柄（省略時は全銘柄）
+        time_budget: 1回の実行の時間枠（分、Noneなら全件。scheduled のときだけ使う）
+
+    Returns:
+        処理対象のティッカーリスト
+    """
+    if not tickers:
+        tickers = get_all_tickers()
+
+    if scheduled:
+        tickers = MarketScheduler().get_due_tickers(tickers)
+
+    if time_budget and tickers and not scheduled:
+        logger.info(f"⏱️  時間枠 {time_budget:g}分は --scheduled のときだけ使います（{len(tickers)}銘柄をすべて処理）")
+    elif time_budget and tickers:
+        shards = time_boxed_shards(tickers, time_budget)
+        if len(shards) > 1:
+            logger.info(
+                f"⏱️  時間枠 {time_budget:g}分: {len(shards[0])}/{len(tickers)}銘柄を処理"
+                f"（残り{len(shards) - 1}枠分は次回以降）"
+            )
+        tickers = shards[0]
+
+    return tickers
+
+
+if __name__ == "__main__":
+    # 処理対象の銘柄をスペース区切りで出力（run_daily.sh から利用）
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    print(' '.join(MarketScheduler().get_due_tickers()))
@@ -0,0 +1,402 @@
+"""
+通知ディスパッチャー
+通知はまずSQLiteのキューに保存し、バックグラウンドのスレッドが送信する。
+パイプラインは保存した時点で先に進み、チャットサービスの遅延・障害を待たない。
+送信に失敗した通知は間隔を空けて再送し、溜まった通知は通知先ごとに1通のダイジェストにまとめて送る。
+実行終了までに送れなかった通知はキューに残り、次回の実行か `python3 notifier.py flush` で送られる
+
+通知先（環境変数で設定したものだけ）:
+    Slack      STOCK_PROPHET_SLACK_WEBHOOK
+    ChatWork   STOCK_PROPHET_CHATWORK_TOKEN, STOCK_PROPHET_CHATWORK_ROOM
+    Webhook    STOCK_PROPHET_WEBHOOK_URL（{"text": ..., "messages": [...]} をPOST）
+
+使い方:
+    python3 notifier.py send "テスト通知"
+    python3 notifier.py flush
+    python3 notifier.py stats
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+from config.stock_config import (
+    CHATWORK_API_TOKEN, CHATWORK_API_URL, CHATWORK_ROOM_ID, DB_PATH, NOTIFY_WEBHOOK_URL, SLACK_WEBHOOK_URL
+)
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TABLE = '_notifications'
+
+# 通知の状態
+PENDING = 'pending'
+SENT = 'sent'
+DEAD = 'dead'
+
+# 接続・応答の待ち時間（秒）
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+# 送信中の通知を他のプロセスが取らない時間（送信中に落ちた場合はこの後に再送される）
+SEND_LEASE_SECONDS = 60.0
+# 再送までの待ち時間（秒）。失敗ごとに2倍にし、上限で頭打ち
+RETRY_BACKOFF = 30.0
+MAX_BACKOFF = 3600.0
+# この回数失敗したら送信をあきらめる
+MAX_ATTEMPTS = 8
+# ダイジェスト1通にまとめる上限
+DIGEST_MAX_MESSAGES = 20
+DIGEST_MAX_CHARS = 8000
+DIGEST_SEPARATOR = '\n\n――――――――――\n\n'
+# 送信後に残った通知を確認する間隔（秒）
+POLL_INTERVAL = 5.0
+# 送信済みの通知の保持日数
+RETENTION_DAYS = 30
+
+
+class SlackSink:
+    """Slack Incoming Webhook"""
+
+    name = 'slack'
+
+    def __init__(self, webhook_url: str):
+        self.webhook_url = webhook_url
+
+    def send(self, session: requests.Session, messages: List[str]) -> None:
+        response = session.post(
+            self.webhook_url, json={'text': DIGEST_SEPARATOR.join(messages)},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        response.raise_for_status()
+
+
+class ChatWorkSink:
+    """ChatWork API（ルームへのメッセージ投稿）"""
+
+    name = 'chatwork'
+
+    def __init__(self, token: str, room_id: str, api_url: str = CHATWORK_API_URL):
+        self.token = token
+        self.room_id = room_id
+        self.api_url = api_url
+
+    def send(self, session: requests.Session, messages: List[str]) -> None:
+        # ChatWork はSlackの *太字* を解釈しないので記号を外す
+        body = DIGEST_SEPARATOR.join(messages).replace('*', '')
+        response = session.post(
+            f'{self.api_url}/rooms/{self.room_id}/messages',
+            headers={'X-ChatWorkToken': self.token}, data={'body': body},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        response.raise_for_status()
+
+
+class WebhookSink:
+    """汎用Webhook（本文をまとめた text と、個々の通知の messages をJSONでPOST）"""
+
+    name = 'webhook'
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def send(self, session: requests.Session, messages: List[str]) -> None:
+        response = session.post(
+            self.url, json={'text': DIGEST_SEPARATOR.join(messages), 'messages': messages},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        response.raise_for_status()
+
+
+def configured_sinks() -> List:
+    """環境変数で設定されている通知先"""
+    sinks = []
+    if SLACK_WEBHOOK_URL:
+        sinks.append(SlackSink(SLACK_WEBHOOK_URL))
+    if CHATWORK_API_TOKEN and CHATWORK_ROOM_ID:
+        sinks.append(ChatWorkSink(CHATWORK_API_TOKEN, CHATWORK_ROOM_ID))
+    if NOTIFY_WEBHOOK_URL:
+        sinks.append(WebhookSink(NOTIFY_WEBHOOK_URL))
+    return sinks
+
+
+def build_digest(rows: List[tuple]) -> List[tuple]:
+    """
+    先頭からダイジェスト1通に収まる分の通知を選ぶ（1件目は長さに関係なく必ず含める）
+
+    Args:
+        rows: (id, message, attempts) のリスト（古い順）
+
+    Returns:
+        ダイジェストに含める行
+    """
+    digest = []
+    length = 0
+    for row in rows[:DIGEST_MAX_MESSAGES]:
+        length += len(row[1]) + len(DIGEST_SEPARATOR)
+        if digest and length > DIGEST_MAX_CHARS:
+            break
+        digest.append(row)
+    return digest
+
+
+class Notifier:
+    """通知の保存とバックグラウンド送信"""
+
+    def __init__(self, db_path: str = DB_PATH, sinks: Optional[List] = None):
+        """
+        初期化
+
+        Args:
+            db_path: 通知キューのSQLiteファイル（株価DBと同じファイルでよい）
+            sinks: 通知先（省略時は環境変数で設定されたもの）
+        """
+        self.db_path = db_path
+        self.sinks = {sink.name: sink for sink in (configured_sinks() if sinks is None else sinks)}
+        self.stats: Dict[str, int] = {'sent': 0, 'digests': 0, 'failures': 0, 'dead': 0}
+
+        self._session: Optional[requests.Session] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._stop = threading.Event()
+        self._ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {NOTIFICATION_TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sink TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                error TEXT
+            )
+        """)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx{NOTIFICATION_TABLE}_pending "
+            f"ON {NOTIFICATION_TABLE} (sink, status, available_at)"
+        )
+        conn.execute(
+            f"DELETE FROM {NOTIFICATION_TABLE} WHERE status = ? AND sent_at < ?",
+            (SENT, time.time() - RETENTION_DAYS * 86400)
+        )
+        conn.close()
+
+    def notify(self, message: str) -> int:
+        """
+        通知をキューに保存して送信スレッドを起こす（送信は待たない）
+
+        Args:
+            message: 本文（Slack形式の *太字* を含んでよい）
+
+        Returns:
+            保存した件数（通知先の数）
+        """
+        if not self.sinks:
+            logger.warning("⚠️ 通知先が設定されていません（STOCK_PROPHET_SLACK_WEBHOOK など）")
+            return 0
+
+        now = time.time()
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT INTO {NOTIFICATION_TABLE} (sink, message, status, available_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(name, message, PENDING, now, now) for name in self.sinks]
+        )
+        conn.close()
+
+        self.start()
+        self._wake.set()
+        logger.info(f"📮 通知をキューに保存: {', '.join(self.sinks)}")
+        return len(self.sinks)
+
+    def _claim(self, sink: str) -> List[tuple]:
+        """送信可能な通知をダイジェスト1通分取り出し、送信中の間は他のプロセスが取らないようにする"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(
+                f"SELECT id, message, attempts FROM {NOTIFICATION_TABLE} "
+                "WHERE sink = ? AND status = ? AND available_at <= ? ORDER BY id LIMIT ?",
+                (sink, PENDING, now, DIGEST_MAX_MESSAGES)
+            ).fetchall()
+            digest = build_digest(rows)
+            conn.executemany(
+                f"UPDATE {NOTIFICATION_TABLE} SET available_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + SEND_LEASE_SECONDS, row[0]) for row in digest]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return digest
+
+    def _mark_sent(self, ids: List[int]) -> None:
+        conn = self._connect()
+        conn.executemany(
+            f"UPDATE {NOTIFICATION_TABLE} SET status = ?, sent_at = ?, error = NULL WHERE id = ?",
+            [(SENT, time.time(), i) for i in ids]
+        )
+        conn.close()
+
+    def _mark_failed(self, digest: List[tuple], error: str) -> None:
+        now = time.time()
+        updates = []
+        for notification_id, _, attempts in digest:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                updates.append((DEAD, now, error, notification_id))
+                self.stats['dead'] += 1
+            else:
+                delay = min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+                updates.append((PENDING, now + delay, error, notification_id))
+
+        conn = self._connect()
+        conn.executemany(
+            f"UPDATE {NOTIFICATION_TABLE} SET status = ?, available_at = ?, error = ? WHERE id = ?", updates
+        )
+        conn.close()
+
+    def dispatch_once(self) -> int:
+        """
+        通知先ごとに送信可能な通知をダイジェスト1通ずつ送る
+
+        Returns:
+            送信できた通知の件数
+        """
+        if self._session is None:
+            # 接続を使い回す（送信スレッドからだけ使う）
+            self._session = requests.Session()
+
+        delivered = 0
+        for name, sink in self.sinks.items():
+            digest = self._claim(name)
+            if not digest:
+                continue
+
+            try:
+                sink.send(self._session, [row[1] for row in digest])
+            except Exception as e:
+                self.stats['failures'] += 1
+                logger.warning(f"⚠️ {name}通知失敗（{len(digest)}件、後で再送）: {e}")
+                self._mark_failed(digest, str(e)[:500])
+                continue
+
+            self._mark_sent([row[0] for row in digest])
+            self.stats['sent'] += len(digest)
+            self.stats['digests'] += 1
+            delivered += len(digest)
+            logger.info(f"✅ {name}通知送信完了（{len(digest)}件）")
+        return delivered
+
+    def flush(self) -> int:
+        """送信可能な通知がなくなるまで送る（呼び出し元のスレッドで実行）"""
+        total = 0
+        while True:
+            delivered = self.dispatch_once()
+            if delivered == 0:
+                return total
+            total += delivered
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delivered = self.dispatch_once()
+            except Exception as e:
+                logger.error(f"❌ 通知の送信処理でエラー: {e}")
+                delivered = 0
+
+            if delivered == 0:
+                if self._closing.is_set():
+                    return
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+
+    def start(self) -> None:
+        """送信スレッドを起動（起動済みなら何もしない）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._closing.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        送信可能な通知を最大 timeout 秒まで送ってから送信スレッドを止める
+
+        送りきれなかった通知・再送待ちの通知はキューに残る
+
+        Args:
+            timeout: 待つ上限（秒）
+        """
+        if self._thread is not None:
+            self._closing.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            # 送信中の通知があればそれだけ終えて止まる（デーモンスレッドなのでプロセス終了は待たない）
+            self._stop.set()
+
+        remaining = self.pending_count()
+        if remaining:
+            logger.info(f"📮 未送信の通知 {remaining}件はキューに残しました（次回送信）")
+
+    def pending_count(self) -> int:
+        conn = self._connect()
+        count = conn.execute(
+            f"SELECT COUNT(*) FROM {NOTIFICATION_TABLE} WHERE status = ?", (PENDING,)
+        ).fetchone()[0]
+        conn.close()
+        return count
+
+    def queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """通知先・状態ごとの件数"""
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT sink, status, COUNT(*) FROM {NOTIFICATION_TABLE} GROUP BY sink, status"
+        ).fetchall()
+        conn.close()
+
+        stats: Dict[str, Dict[str, int]] = {}
+        for sink, status, count in rows:
+            stats.setdefault(sink, {})[status] = count
+        return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='通知キューの操作')
+    parser.add_argument('--db', default=DB_PATH, help='通知キューのSQLiteファイル')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    send_parser = subparsers.add_parser('send', help='通知を保存して送信')
+    send_parser.add_argument('message', help='本文')
+    subparsers.add_parser('flush', help='送信可能な通知をすべて送る（cronでの再送用）')
+    subparsers.add_parser('stats', help='通知先・状態ごとの件数を表示')
+    args = parser.parse_args()
+
+    notifier = Notifier(args.db)
+    if args.command == 'send':
+        notifier.notify(args.message)
+        notifier.close(timeout=READ_TIMEOUT * 2)
+    elif args.command == 'flush':
+        logger.info(f"📤 {notifier.flush()}件送信")
+    elif args.command == 'stats':
+        for sink, counts in notifier.queue_stats().items():
+            print(f"{sink}: " + ', '.join(f"{k}={v}" for k, v in sorted(counts.items())))
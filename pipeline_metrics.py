@@ -0,0 +1,352 @@
+"""
+パイプライン計測
+ステージ・銘柄ごとの所要時間、ページ読み込みレイテンシ、取り込み行数、キャッシュヒット、
+転送バイト数を記録し、node-exporter の textfile と run_metrics テーブルに出力する
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_TABLE = 'run_metrics'
+METRIC_PREFIX = 'stock_prophet_'
+# node-exporter の --collector.textfile.directory に合わせる
+TEXTFILE_DIR = os.environ.get('STOCK_PROPHET_METRICS_DIR', './data/metrics')
+
+# ページ読み込みレイテンシのバケット（秒）
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(pipeline: str, labels: Dict[str, object]) -> Labels:
+    return (('pipeline', pipeline),) + tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    body = ','.join(
+        '{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels
+    )
+    return '{' + body + '}'
+
+
+class PipelineMetrics:
+    """1回の実行分のメトリクス（スレッドセーフ）"""
+
+    def __init__(
+        self,
+        pipeline: str,
+        db_path: str,
+        textfile_dir: str = TEXTFILE_DIR
+    ):
+        """
+        初期化
+
+        Args:
+            pipeline: パイプライン名（'collect', 'train', 'predict' など）
+            db_path: run_metrics テーブルを置くSQLiteファイルのパス
+            textfile_dir: textfile の出力先ディレクトリ
+        """
+        self.pipeline = pipeline
+        self.db_path = db_path
+        self.textfile_dir = textfile_dir
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        self.started = time.time()
+
+        self._lock = threading.Lock()
+        # (name, labels) → 値
+        self._values: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) → [バケットごとの件数..., 合計, 件数]
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+        # スレッドごとの実行中のステージ（入れ子になったら内側が末尾）
+        # 他のスレッド（リソースサンプラー・スタックサンプラー）からも参照するので threading.local ではなくスレッドIDで引く
+        self._stages: Dict[int, List[str]] = {}
+        self._owner = threading.get_ident()
+        # --profile 指定時だけ設定される（未設定なら計測コストはかからない）
+        self.profiler = None
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """
+        値を加算（行数・キャッシュヒット・バイト数など）
+
+        Args:
+            name: メトリクス名
+            value: 加算する値
+            **labels: ラベル
+        """
+        key = (name, _labels(self.pipeline, labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """値を設定"""
+        key = (name, _labels(self.pipeline, labels))
+        with self._lock:
+            self._values[key] = float(value)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        **labels
+    ) -> None:
+        """
+        ヒストグラムに観測値を追加
+
+        Args:
+            name: メトリクス名
+            value: 観測値
+            buckets: バケットの上限値
+            **labels: ラベル
+        """
+        key = (name, _labels(self.pipeline, labels))
+        with self._lock:
+            self._buckets.setdefault(name, buckets)
+            bounds = self._buckets[name]
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0.0] * (len(bounds) + 2)
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        ステージの所要時間を計測
+
+        stage_seconds は実時間ではなく累積時間。同じステージに複数回入った場合や、
+        複数スレッドで並行して入った場合は合算する（並列実行中のステージは実時間を超えうる）。
+        入れ子のステージの時間は外側のステージにも含まれる
+
+        Args:
+            name: ステージ名（'collect', 'save', 'features', 'train', 'predict', 'notify'）
+        """
+        started = time.perf_counter()
+        ident = threading.get_ident()
+        with self._lock:
+            stack = self._stages.setdefault(ident, [])
+        stack.append(name)
+        if self.profiler is not None:
+            self.profiler.enter(name)
+        try:
+            yield
+        finally:
+            if self.profiler is not None:
+                self.profiler.exit(name)
+            stack.pop()
+            if not stack:
+                with self._lock:
+                    self._stages.pop(ident, None)
+            self.inc('stage_seconds', time.perf_counter() - started, stage=name)
+    
+    def stage_of(self, ident: Optional[int] = None) -> str:
+        """
+        スレッドの実行中のステージ名
+
+        Args:
+            ident: スレッドID（省略時は呼び出し元。ステージに入っていないスレッドは
+                メトリクスを作成したスレッドのステージを返す）
+
+        Returns:
+            ステージ名（どこにも入っていなければ 'idle'）
+        """
+        stack = self._stages.get(threading.get_ident() if ident is None else ident)
+        if not stack:
+            stack = self._stages.get(self._owner)
+        # 他のスレッドが pop した直後でも IndexError にならないようスライスで読む
+        top = stack[-1:] if stack else []
+        return top[0] if top else 'idle'
+
+    @property
+    def current_stage(self) -> str:
+        """呼び出し元スレッドの実行中のステージ名（ステージ外のスレッドからはメトリクスを作成したスレッドのステージ）"""
+        return self.stage_of()
+
+    @contextmanager
+    def ticker(self, stage: str, ticker: str) -> Iterator[None]:
+        """
+        銘柄ごとの所要時間を計測
+
+        Args:
+            stage: ステージ名
+            ticker: ティッカーシンボル
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc('ticker_seconds', time.perf_counter() - started, stage=stage, ticker=ticker)
+
+    def enable_profiling(self, flamegraph: bool = False) -> None:
+        """
+        ステージ別プロファイルを有効にする（export 時に書き出される）
+        
+        Args:
+            flamegraph: Trueなら折り畳みスタックも出力
+        """
+        from stage_profiler import StageProfiler
+        
+        self.profiler = StageProfiler(
+            self.pipeline,
+            self.stage_of,
+            flamegraph=flamegraph
+        )
+    
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        """
+        全メトリクスを (名前, ラベル, 値) のリストで取得（ヒストグラムは展開）
+
+        Returns:
+            サンプルのリスト
+        """
+        samples = [('run_duration_seconds', _labels(self.pipeline, {}), time.time() - self.started)]
+        with self._lock:
+            for (name, labels), value in sorted(self._values.items()):
+                samples.append((name, labels, value))
+            for (name, labels), hist in sorted(self._histograms.items()):
+                for bound, count in zip(self._buckets[name], hist):
+                    samples.append((f'{name}_bucket', labels + (('le', str(bound)),), count))
+                samples.append((f'{name}_bucket', labels + (('le', '+Inf'),), hist[-1]))
+                samples.append((f'{name}_sum', labels, hist[-2]))
+                samples.append((f'{name}_count', labels, hist[-1]))
+        samples.append(('last_run_timestamp_seconds', _labels(self.pipeline, {}), time.time()))
+        return samples
+
+    def render(self) -> str:
+        """
+        Prometheus テキスト形式に変換
+
+        Returns:
+            textfile の内容
+        """
+        histograms = {name for name, _ in self._histograms}
+        lines = []
+        declared = set()
+
+        for name, labels, value in self.samples():
+            base = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in histograms:
+                    base = name[:-len(suffix)]
+            if base not in declared:
+                kind = 'histogram' if base in histograms else 'gauge'
+                lines.append(f'# TYPE {METRIC_PREFIX}{base} {kind}')
+                declared.add(base)
+            lines.append(f'{METRIC_PREFIX}{name}{_format_labels(labels)} {float(value)!r}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self) -> Optional[str]:
+        """
+        textfile を書き出し（一時ファイル経由で置き換え、node-exporter が途中の内容を読まないようにする）
+
+        Returns:
+            書き出したパス（失敗時はNone）
+        """
+        path = os.path.join(self.textfile_dir, f'{METRIC_PREFIX}{self.pipeline}.prom')
+        try:
+            os.makedirs(self.textfile_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+            return path
+        except Exception as e:
+            logger.warning(f"⚠️  メトリクス書き出し失敗: {e}")
+            return None
+
+    def save_to_db(self) -> int:
+        """
+        run_metrics テーブルに追記
+
+        Returns:
+            書き込んだ行数
+        """
+        recorded_at = datetime.now().isoformat(timespec='seconds')
+        rows = [
+            (self.run_id, self.pipeline, name, json.dumps(dict(labels[1:]), ensure_ascii=False), value, recorded_at)
+            for name, labels, value in self.samples()
+        ]
+
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+                    run_id TEXT NOT NULL,
+                    pipeline TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    recorded_at TEXT NOT NULL
+                )
+            """)
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{METRICS_TABLE}_metric
+                ON {METRICS_TABLE} (pipeline, metric, recorded_at)
+            """)
+            conn.executemany(f"INSERT INTO {METRICS_TABLE} VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️  メトリクス保存失敗: {e}")
+            return 0
+
+        return len(rows)
+
+    def export(self, textfile: bool = True) -> None:
+        """
+        textfile・DBに出力し、ステージ別の所要時間をログに出す
+
+        Args:
+            textfile: Falseなら DB にだけ書く（並列ワーカーなど、textfile は親プロセスが書く場合）
+        """
+        stages = sorted(
+            ((dict(labels)['stage'], value) for (name, labels), value in self._values.items()
+             if name == 'stage_seconds'),
+            key=lambda item: -item[1]
+        )
+        if stages:
+            logger.info("⏱️  ステージ別所要時間: " + ', '.join(f"{stage} {sec:.1f}s" for stage, sec in stages))
+
+        if textfile:
+            self.write_textfile()
+        self.save_to_db()
+        
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+
+
+# ページが読み込んだリソースの転送量（Resource Timing API、キャッシュ分は0）
+_TRANSFER_SIZE_JS = """
+() => performance.getEntries().reduce((total, entry) => total + (entry.transferSize || 0), 0)
+"""
+
+
+def page_transfer_bytes(page) -> int:
+    """
+    Playwrightのページが読み込んだバイト数を取得
+
+    Args:
+        page: Playwrightのページ
+
+    Returns:
+        転送バイト数（取得できなければ0）
+    """
+    try:
+        return int(page.evaluate(_TRANSFER_SIZE_JS))
+    except Exception:
+        return 0
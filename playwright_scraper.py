@@ -1,85 +1,54 @@
 # playwright_scraper.py
 from playwright.sync_api import sync_playwright
-import pandas as pd
 import sqlite3
 from datetime import datetime, timedelta
 import time
 import logging
 
+from browser_service import open_browser
+from config.stock_config import DB_PATH, YAHOO_BASE_URL, get_all_tickers
+from fundamentals_cache import FundamentalsCache, scrape_quote_fields
+from history_parser import extract_columns, parse_history
+from price_store import merge_prices, table_name_for
+from source_health import SourceHealth, TIER_PLAYWRIGHT
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class PlaywrightStockScraper:
-    def __init__(self):
-        self.db_path = '/home/stock_prophet/data/stock_data.db'
+    def __init__(self, base_url=YAHOO_BASE_URL):
+        self.db_path = DB_PATH
+        # 株価履歴の取得元（ベンチマーク時はフィクスチャサーバーのURL）
+        self.base_url = base_url.rstrip('/')
+        # 時価総額・PER・ニュースのキャッシュ（項目ごとの有効期限付き）
+        self.fundamentals = FundamentalsCache(self.db_path)
+        # 銘柄ごとのレイテンシ履歴（タイムアウト・サーキットブレーカー）
+        self.health = SourceHealth(self.db_path)
+    
+    def _launch(self, p):
+        """Headless Chromium起動（常駐ブラウザがあれば接続）"""
+        browser = open_browser(p, args=['--no-sandbox', '--disable-dev-shm-usage'])
+        
+        context = browser.new_context(
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        )
+        
+        return browser, context
         
     def scrape_yahoo_finance(self, ticker, days=90):
-        """Yahoo Financeから株価データをスクレイピング"""
+        """Yahoo Financeから株価データをスクレイピング（失敗が続いている銘柄はNone）"""
+        if self.health.is_open(ticker, TIER_PLAYWRIGHT):
+            logger.warning(f"⏭️ {ticker}: 失敗が続いているためスキップ（サーキットブレーカー）")
+            return None
+        
         logger.info(f"🎭 Playwright起動: {ticker}")
         
         with sync_playwright() as p:
-            # Headless Chromium起動
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-dev-shm-usage']
-            )
-            
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            )
-            
+            browser, context = self._launch(p)
             page = context.new_page()
             
             try:
-                # Yahoo Finance履歴ページ
-                url = f'https://finance.yahoo.com/quote/{ticker}/history'
-                logger.info(f"📊 アクセス: {url}")
-                
-                page.goto(url, wait_until='networkidle', timeout=30000)
-                
-                # ページが完全に読み込まれるまで待機
-                page.wait_for_selector('table', timeout=10000)
-                
-                # テーブルデータ取得
-                rows = page.query_selector_all('table tbody tr')
-                
-                data = []
-                for row in rows:
-                    try:
-                        cells = row.query_selector_all('td')
-                        if len(cells) >= 7:
-                            date_str = cells[0].inner_text()
-                            open_price = cells[1].inner_text().replace(',', '')
-                            high_price = cells[2].inner_text().replace(',', '')
-                            low_price = cells[3].inner_text().replace(',', '')
-                            close_price = cells[4].inner_text().replace(',', '')
-                            adj_close = cells[5].inner_text().replace(',', '')
-                            volume = cells[6].inner_text().replace(',', '')
-                            
-                            # データクリーニング
-                            if open_price != '-' and close_price != '-':
-                                data.append({
-                                    'Date': date_str,
-                                    'Open': float(open_price),
-                                    'High': float(high_price),
-                                    'Low': float(low_price),
-                                    'Close': float(close_price),
-                                    'Adj Close': float(adj_close),
-                                    'Volume': int(volume) if volume != '-' else 0
-                                })
-                    except Exception as e:
-                        logger.warning(f"行の解析エラー: {e}")
-                        continue
-                
-                logger.info(f"✅ {ticker}: {len(data)}件取得")
-                
-                # DataFrameに変換
-                df = pd.DataFrame(data)
-                df['Date'] = pd.to_datetime(df['Date'])
-                df = df.sort_values('Date')
-                df.set_index('Date', inplace=True)
-                
-                return df
+                return self._scrape_history(page, ticker, days)
                 
             except Exception as e:
                 logger.error(f"❌ スクレイピングエラー: {e}")
@@ -88,96 +57,114 @@ class PlaywrightStockScraper:
             finally:
                 browser.close()
     
+    def _scrape_history(self, page, ticker, days=90):
+        """開いているページで履歴ページを読み込んで解析"""
+        # Yahoo Finance履歴ページ
+        url = f'{self.base_url}/quote/{ticker}/history'
+        logger.info(f"📊 アクセス: {url}")
+        
+        started = time.perf_counter()
+        try:
+            page.goto(url, wait_until='networkidle', timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 30000))
+            
+            # ページが完全に読み込まれるまで待機
+            page.wait_for_selector('table', timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 10000))
+        except Exception as e:
+            self.health.record(ticker, TIER_PLAYWRIGHT, time.perf_counter() - started, False, str(e))
+            raise
+        self.health.record(ticker, TIER_PLAYWRIGHT, time.perf_counter() - started, True)
+        
+        # テーブルデータ取得（1回の evaluate で列ごとに取り出して一括変換）
+        df = parse_history(extract_columns(page))
+        
+        logger.info(f"✅ {ticker}: {0 if df is None else len(df)}件取得")
+        
+        return df
+    
     def scrape_additional_info(self, ticker):
-        """追加情報をスクレイピング（ニュース、指標など）"""
-        logger.info(f"📰 追加情報取得: {ticker}")
+        """追加情報をスクレイピング（ニュース、指標など）
+        
+        キャッシュが有効な項目はそのまま返し、期限切れの項目があるときだけブラウザを起動する
+        """
+        expired = self.fundamentals.expired_fields(ticker)
+        if not expired:
+            return self.fundamentals.get(ticker)
+        
+        logger.info(f"📰 追加情報取得: {ticker} ({', '.join(expired)})")
         
         with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+            browser, context = self._launch(p)
+            page = context.new_page()
             
             try:
-                url = f'https://finance.yahoo.com/quote/{ticker}'
-                page.goto(url, wait_until='networkidle')
-                
-                # 企業情報
-                info = {}
-                
-                # 時価総額
-                try:
-                    market_cap = page.query_selector('[data-test="MARKET_CAP-value"]')
-                    if market_cap:
-                        info['market_cap'] = market_cap.inner_text()
-                except:
-                    pass
-                
-                # PER
-                try:
-                    pe_ratio = page.query_selector('[data-test="PE_RATIO-value"]')
-                    if pe_ratio:
-                        info['pe_ratio'] = pe_ratio.inner_text()
-                except:
-                    pass
-                
-                # 最新ニュース取得
-                try:
-                    news_items = page.query_selector_all('h3 a')
-                    news = [item.inner_text() for item in news_items[:5]]
-                    info['latest_news'] = news
-                except:
-                    pass
-                
-                logger.info(f"✅ 追加情報取得完了")
-                return info
+                return self._refresh_fundamentals(page, ticker, expired)
                 
             except Exception as e:
                 logger.error(f"❌ 追加情報取得エラー: {e}")
-                return {}
+                return self.fundamentals.get(ticker, include_expired=True)
                 
             finally:
                 browser.close()
     
+    def _refresh_fundamentals(self, page, ticker, fields):
+        """開いているページでクォートページを読み、期限切れの項目を更新"""
+        info = scrape_quote_fields(page, f'{self.base_url}/quote/{ticker}', fields)
+        self.fundamentals.set(ticker, info)
+        logger.info(f"✅ 追加情報取得完了")
+        return self.fundamentals.get(ticker)
+    
     def save_to_db(self, ticker, df):
         """SQLiteに保存"""
         if df is not None and len(df) > 0:
             conn = sqlite3.connect(self.db_path)
-            table_name = ticker.replace('.', '_').replace('-', '_')
-            df.to_sql(table_name, conn, if_exists='replace')
+            table_name = table_name_for(ticker)
+            # 取得した期間だけ置き換える（バックフィル済みの過去データは残す）
+            merge_prices(conn, table_name, df)
             conn.close()
             logger.info(f"💾 DB保存完了: {table_name}")
     
     def run(self, tickers):
-        """複数銘柄を順次スクレイピング"""
-        for ticker in tickers:
+        """複数銘柄を順次スクレイピング
+        
+        ブラウザは1回だけ起動し、履歴ページと同じページでクォートページも読む
+        （追加情報はキャッシュが期限切れの銘柄だけ）
+        """
+        with sync_playwright() as p:
+            browser, context = self._launch(p)
+            page = context.new_page()
+            
             try:
-                # 株価データ
-                df = self.scrape_yahoo_finance(ticker)
-                if df is not None:
-                    self.save_to_db(ticker, df)
-                
-                # 追加情報
-                info = self.scrape_additional_info(ticker)
-                
-                # レート制限対策
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"❌ {ticker}処理エラー: {e}")
-                continue
+                for ticker in tickers:
+                    try:
+                        # 株価データ（失敗が続いている銘柄は履歴ページを開かない）
+                        if self.health.is_open(ticker, TIER_PLAYWRIGHT):
+                            logger.warning(f"⏭️ {ticker}: 失敗が続いているためスキップ（サーキットブレーカー）")
+                        else:
+                            logger.info(f"🎭 取得中: {ticker}")
+                            df = self._scrape_history(page, ticker)
+                            if df is not None:
+                                self.save_to_db(ticker, df)
+                        
+                        # 追加情報
+                        expired = self.fundamentals.expired_fields(ticker)
+                        if expired:
+                            logger.info(f"📰 追加情報取得: {ticker} ({', '.join(expired)})")
+                            self._refresh_fundamentals(page, ticker, expired)
+                        
+                        # レート制限対策
+                        time.sleep(2)
+                        
+                    except Exception as e:
+                        logger.error(f"❌ {ticker}処理エラー: {e}")
+                        continue
+                        
+            finally:
+                browser.close()
 
 # 実行
 if __name__ == "__main__":
     scraper = PlaywrightStockScraper()
     
-    tickers = [
-        '7203.T',   # トヨタ
-        '6758.T',   # ソニー
-        '9984.T',   # ソフトバンク
-        'AAPL',     # Apple
-        'TSLA',     # Tesla
-        'NVDA',     # NVIDIA
-        'GOOGL',    # Google
-        'MSFT',     # Microsoft
-    ]
+    tickers = get_all_tickers()
     
     scraper.run(tickers)
@@ -1,39 +1,64 @@
 # playwright_scraper_optimized.py
 from playwright.sync_api import sync_playwright
-import pandas as pd
 import sqlite3
 from datetime import datetime
 import logging
+import time
 import gc  # ガベージコレクション
+from browser_service import BrowserCrashed, is_browser_lost, open_browser
+from change_detector import FingerprintStore, compute_fingerprint
+from config.stock_config import DB_PATH, YAHOO_BASE_URL, get_all_tickers
+from collection_journal import CollectionJournal
+from event_bus import EventPublisher, events_path_for
+from history_parser import extract_columns, parse_history
+from pipeline_metrics import PipelineMetrics, page_transfer_bytes
+from price_store import merge_prices, table_name_for
+from source_health import SourceHealth, TIER_PLAYWRIGHT
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class OptimizedStockScraper:
-    def __init__(self):
-        self.db_path = '/home/stock_prophet/data/stock_data.db'
+    def __init__(self, db_path=DB_PATH, single_process=True, metrics=None, base_url=YAHOO_BASE_URL):
+        self.db_path = db_path
+        # 株価履歴の取得元（ベンチマーク時はフィクスチャサーバーのURL）
+        self.base_url = base_url.rstrip('/')
+        # Trueなら --single-process で起動（省メモリだがレンダラ障害でブラウザごと落ちる）
+        self.single_process = single_process
+        self.fingerprints = FingerprintStore(self.db_path)
+        self.journal = CollectionJournal(self.db_path)
+        self.events = EventPublisher(events_path_for(self.db_path))
+        self.metrics = metrics or PipelineMetrics('collect', self.db_path)
+        # 銘柄ごとのレイテンシ履歴（タイムアウト・サーキットブレーカー）
+        self.health = SourceHealth(self.db_path)
+        # 銘柄間の待機秒数（レート制限対策）
+        self.request_interval = 1.0
+    
+    def scrape_with_single_browser(self, tickers, run_id=None):
+        """1つのブラウザで全銘柄を処理（メモリ節約）
         
-    def scrape_with_single_browser(self, tickers):
-        """1つのブラウザで全銘柄を処理（メモリ節約）"""
+        run_idを指定すると銘柄ごとに取得直後にDB保存し、ジャーナルに記録する
+        tickersはイテレータでもよい（並列ワーカーがキューから順次取り出す場合）
+        """
         logger.info("🎭 Playwright起動（最適化モード）")
         
+        args = [
+            '--no-sandbox',
+            '--disable-dev-shm-usage',
+            '--disable-gpu',
+            '--disable-software-rasterizer',
+            '--disable-extensions',
+            # メモリ節約設定
+            '--disable-background-networking',
+            '--disable-default-apps',
+            '--disable-sync',
+        ]
+        if self.single_process:
+            args.append('--single-process')
+        
         with sync_playwright() as p:
-            # ブラウザは1回だけ起動
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-software-rasterizer',
-                    '--disable-extensions',
-                    # メモリ節約設定
-                    '--single-process',
-                    '--disable-background-networking',
-                    '--disable-default-apps',
-                    '--disable-sync',
-                ]
-            )
+            # ブラウザは1回だけ起動（常駐ブラウザがあれば接続）
+            browser = open_browser(p, args=args)
             
             context = browser.new_context(
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
@@ -42,78 +67,43 @@ class OptimizedStockScraper:
             results = {}
             
             for ticker in tickers:
+                started = time.monotonic()
+                if run_id:
+                    self.journal.mark_running(run_id, ticker)
+                
                 try:
-                    logger.info(f"📊 処理中: {ticker}")
-                    
-                    # 新しいページを開く
-                    page = context.new_page()
-                    
-                    # Yahoo Finance履歴ページ
-                    url = f'https://finance.yahoo.com/quote/{ticker}/history'
-                    page.goto(url, wait_until='domcontentloaded', timeout=20000)
+                    with self.metrics.stage('collect'), self.metrics.ticker('collect', ticker):
+                        df = self.scrape_ticker(context, ticker)
                     
-                    # テーブル取得を待つ
-                    try:
-                        page.wait_for_selector('table tbody tr', timeout=10000)
-                    except:
-                        logger.warning(f"⚠️ {ticker}: テーブル読み込みタイムアウト")
-                        page.close()
-                        continue
-                    
-                    # データ抽出
-                    rows = page.query_selector_all('table tbody tr')
-                    
-                    data = []
-                    for row in rows[:90]:  # 最新90日分のみ（メモリ節約）
-                        try:
-                            cells = row.query_selector_all('td')
-                            if len(cells) >= 7:
-                                date_str = cells[0].inner_text()
-                                
-                                # "Dividend"行はスキップ
-                                if 'Dividend' in date_str or 'Split' in date_str:
-                                    continue
-                                
-                                open_price = cells[1].inner_text().replace(',', '')
-                                high_price = cells[2].inner_text().replace(',', '')
-                                low_price = cells[3].inner_text().replace(',', '')
-                                close_price = cells[4].inner_text().replace(',', '')
-                                adj_close = cells[5].inner_text().replace(',', '')
-                                volume = cells[6].inner_text().replace(',', '')
-                                
-                                if open_price != '-' and close_price != '-':
-                                    data.append({
-                                        'Date': date_str,
-                                        'Open': float(open_price),
-                                        'High': float(high_price),
-                                        'Low': float(low_price),
-                                        'Close': float(close_price),
-                                        'Adj Close': float(adj_close) if adj_close != '-' else float(close_price),
-                                        'Volume': int(volume) if volume != '-' else 0
-                                    })
-                        except Exception as e:
-                            continue
-                    
-                    if len(data) > 0:
-                        df = pd.DataFrame(data)
-                        df['Date'] = pd.to_datetime(df['Date'])
-                        df = df.sort_values('Date')
-                        df.set_index('Date', inplace=True)
-                        
+                    if df is not None:
                         results[ticker] = df
-                        logger.info(f"✅ {ticker}: {len(df)}件取得")
+                        if run_id:
+                            # 途中でクラッシュしても取得済み分が残るよう即時保存
+                            self.save_to_db(ticker, df)
+                            self.journal.mark_done(run_id, ticker, len(df), time.monotonic() - started)
+                        self.events.publish('collection', {
+                            'ticker': ticker, 'status': 'done', 'rows': len(df),
+                            'elapsed_sec': round(time.monotonic() - started, 2),
+                        })
                     else:
-                        logger.warning(f"⚠️ {ticker}: データなし")
-                    
-                    # ページを閉じてメモリ解放
-                    page.close()
+                        if run_id:
+                            self.journal.mark_failed(run_id, ticker, 'データなし', time.monotonic() - started)
+                        self.events.publish('collection', {'ticker': ticker, 'status': 'failed', 'error': 'データなし'})
                     
                     # 短い待機（レート制限対策）
-                    import time
-                    time.sleep(1)
-                    
+                    time.sleep(self.request_interval)
+                
                 except Exception as e:
+                    if is_browser_lost(browser, e):
+                        # 残りの銘柄もすべて即失敗するので、この銘柄を未処理に戻して中断する
+                        logger.error(f"💥 ブラウザが落ちました（{ticker}の処理中）: {e}")
+                        if run_id:
+                            self.journal.mark_pending(run_id, ticker)
+                        raise BrowserCrashed(ticker, results) from e
                     logger.error(f"❌ {ticker}エラー: {e}")
+                    if run_id:
+                        self.journal.mark_failed(run_id, ticker, str(e), time.monotonic() - started)
+                    self.events.publish('collection', {'ticker': ticker, 'status': 'failed', 'error': str(e)})
                     continue
             
             browser.close()
@@ -123,46 +113,160 @@ class OptimizedStockScraper:
             
             return results
     
+    def scrape_ticker(self, context, ticker):
+        """1銘柄の履歴ページを取得（失敗時はNone）
+        
+        タイムアウトは銘柄のレイテンシ履歴から決め、失敗が続いている銘柄はページを開かずにスキップする
+        """
+        if self.health.is_open(ticker, TIER_PLAYWRIGHT):
+            logger.warning(f"⏭️ {ticker}: 失敗が続いているためスキップ（サーキットブレーカー）")
+            self.metrics.inc('circuit_open')
+            return None
+        
+        logger.info(f"📊 処理中: {ticker}")
+        
+        # 新しいページを開く
+        page = context.new_page()
+        started = time.perf_counter()
+        
+        try:
+            df = self._scrape_page(page, ticker, started)
+            if df is None:
+                self.health.record(ticker, TIER_PLAYWRIGHT, time.perf_counter() - started, False, 'データなし')
+            return df
+        
+        except Exception as e:
+            # ブラウザごと落ちた場合は銘柄の失敗として記録しない（サーキットブレーカーを開かない）
+            if not is_browser_lost(context.browser, e):
+                self.health.record(ticker, TIER_PLAYWRIGHT, time.perf_counter() - started, False, str(e))
+            raise
+        
+        finally:
+            # ページを閉じてメモリ解放
+            page.close()
+    
+    def _scrape_page(self, page, ticker, started):
+        """開いたページで履歴ページを読み込んで解析"""
+        # Yahoo Finance履歴ページ
+        url = f'{self.base_url}/quote/{ticker}/history'
+        page.goto(url, wait_until='domcontentloaded', timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 20000))
+        
+        # テーブル取得を待つ
+        try:
+            page.wait_for_selector('table tbody tr', timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 10000))
+        except:
+            logger.warning(f"⚠️ {ticker}: テーブル読み込みタイムアウト")
+            self.metrics.inc('page_timeouts')
+            return None
+        
+        elapsed = time.perf_counter() - started
+        self.metrics.observe('page_load_seconds', elapsed)
+        self.metrics.inc('bytes_transferred', page_transfer_bytes(page))
+        
+        # データ抽出（最新90日分のみ。表は1回の evaluate で列ごとに取り出して一括変換）
+        df = parse_history(extract_columns(page, limit=90))
+        
+        if df is None:
+            logger.warning(f"⚠️ {ticker}: データなし")
+            return None
+        
+        self.health.record(ticker, TIER_PLAYWRIGHT, elapsed, True)
+        logger.info(f"✅ {ticker}: {len(df)}件取得")
+        return df
+    
+    def save_to_db(self, ticker, df):
+        """1銘柄をDB保存（前回から変化がなければスキップ）
+        
+        Returns:
+            書き込んだ場合True、変更なしでスキップした場合False
+        """
+        with self.metrics.stage('save'):
+            fingerprint = compute_fingerprint(df)
+            if self.fingerprints.is_unchanged(ticker, 'save', fingerprint):
+                logger.info(f"⏭️  {ticker}: 変更なし（保存スキップ）")
+                self.metrics.inc('cache_hits', stage='save')
+                return False
+            
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                # 取得した期間だけ置き換える（バックフィル済みの過去データは残す）
+                merge_prices(conn, table_name_for(ticker), df)
+            finally:
+                conn.close()
+            
+            self.fingerprints.set(ticker, 'save', fingerprint)
+            self.metrics.inc('rows_ingested', len(df))
+        logger.info(f"💾 {ticker}保存完了")
+        return True
+    
     def save_all_to_db(self, results):
-        """一括でDB保存"""
-        conn = sqlite3.connect(self.db_path)
+        """一括でDB保存（前回から変化のない銘柄はスキップ）"""
+        unchanged = []
         
         for ticker, df in results.items():
             try:
-                table_name = ticker.replace('.', '_').replace('-', '_')
-                df.to_sql(table_name, conn, if_exists='replace')
-                logger.info(f"💾 {ticker}保存完了")
+                if not self.save_to_db(ticker, df):
+                    unchanged.append(ticker)
             except Exception as e:
                 logger.error(f"❌ {ticker}保存エラー: {e}")
         
-        conn.close()
+        if unchanged:
+            logger.info(f"⏭️  変更なしで保存スキップ: {len(unchanged)}銘柄 ({', '.join(unchanged)})")
+        return unchanged
     
-    def run(self, tickers):
-        """実行"""
-        results = self.scrape_with_single_browser(tickers)
-        self.save_all_to_db(results)
+    def run(self, tickers, resume=False):
+        """実行（銘柄ごとに即時保存・ジャーナル記録）
+        
+        resume=True の場合は直近の未完了実行のうち、完了していない銘柄だけを再取得する
+        """
+        run_id = None
+        
+        if resume:
+            run_id = self.journal.latest_incomplete_run()
+            if run_id:
+                tickers = self.journal.pending_tickers(run_id)
+                logger.info(f"🔁 実行 {run_id} を再開: 残り{len(tickers)}銘柄")
+            else:
+                logger.info("✅ 再開対象の未完了実行なし")
+                return {}
+        
+        if run_id is None:
+            run_id = self.journal.start_run(tickers)
+        
+        try:
+            results = self.scrape_with_single_browser(tickers, run_id)
+        except BrowserCrashed as e:
+            logger.error(f"❌ {e}: 取得済み{len(e.results)}銘柄で中断")
+            results = e.results
+        
+        summary = self.journal.summary(run_id)
+        logger.info(f"📒 実行 {run_id}: " + ', '.join(f"{k}={v}" for k, v in sorted(summary.items())))
+        if summary.get('failed') or summary.get('pending') or summary.get('running'):
+            logger.info("💡 未完了の銘柄は --resume で再取得できます")
+        
         return results
 
 # 実行
 if __name__ == "__main__":
+    import argparse
+    from resource_sampler import ResourceSampler
+    from stage_profiler import add_profile_arguments
+    
+    parser = argparse.ArgumentParser(description='最適化版スクレイパー')
+    parser.add_argument('--resume', action='store_true',
+                        help='直近の未完了実行のうち、完了していない銘柄だけ再取得')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     scraper = OptimizedStockScraper()
+    if args.profile:
+        scraper.metrics.enable_profiling(args.flamegraph)
     
-    # 日本株 + 米国株
-    tickers = [
-        # 日本株
-        '7203.T',   # トヨタ
-        '6758.T',   # ソニー
-        '9984.T',   # ソフトバンク
-        '6501.T',   # 日立
-        '8306.T',   # 三菱UFJ
-        # 米国株
-        'AAPL',     # Apple
-        'TSLA',     # Tesla
-        'NVDA',     # NVIDIA
-        'GOOGL',    # Google
-        'MSFT',     # Microsoft
-    ]
+    # 日本株 + 米国株（config/universe.csv）
+    tickers = get_all_tickers()
     
     logger.info("🚀 最適化版スクレイパー起動")
-    results = scraper.run(tickers)
+    with ResourceSampler(scraper.metrics):
+        results = scraper.run(tickers, resume=args.resume)
+    scraper.metrics.export()
     logger.info(f"✅ 完了: {len(results)}銘柄")
@@ -10,8 +10,13 @@ import numpy as np
 import sqlite3
 import joblib
 import logging
+import os
 from datetime import datetime
-from config.stock_config import get_all_tickers, get_stock_name
+from config.stock_config import DB_PATH, TIME_BUDGET_MINUTES, get_all_tickers, get_stock_name
+from change_detector import FingerprintStore, fingerprint_from_db
+from adaptive_controller import AdaptiveController, run_adaptive
+from event_bus import EventPublisher, events_path_for
+from pipeline_metrics import PipelineMetrics
 from typing import Optional, List, Dict
 
 logging.basicConfig(level=logging.INFO)
@@ -20,11 +25,27 @@ logger = logging.getLogger(__name__)
 class StockPredictionSystem:
     """株価予測システム"""
     
-    def __init__(self):
-        """初期化"""
-        self.db_path = './data/stock_data.db'
-        self.model_path = './models/stock_model.pkl'
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        model_path: str = './models/stock_model.pkl',
+        metrics: Optional[PipelineMetrics] = None
+    ):
+        """
+        初期化
+        
+        Args:
+            db_path: 株価DBのパス
+            model_path: 訓練済みモデルのパス
+            metrics: 計測の記録先（省略時は新規作成）
+        """
+        self.db_path = db_path
+        self.model_path = model_path
         self.model = None
+        self.fingerprints = FingerprintStore(self.db_path)
+        self.events = EventPublisher(events_path_for(self.db_path))
+        self.metrics = metrics or PipelineMetrics('predict', self.db_path)
+        self.skipped = []
     
     def load_model(self) -> bool:
         """
@@ -84,11 +105,24 @@ class StockPredictionSystem:
             conn = sqlite3.connect(self.db_path)
             table_name = ticker.replace('.', '_').replace('-', '_')
             
-            df = pd.read_sql(
-                f"SELECT * FROM '{table_name}'",
-                conn,
-                parse_dates=['Date']
-            )
+            # 直近の株価とモデルが前回予測時と同じなら前回結果を再利用
+            fingerprint = fingerprint_from_db(conn, table_name)
+            if fingerprint is not None:
+                fingerprint += f":{os.path.getmtime(self.model_path):.0f}"
+                record = self.fingerprints.get(ticker, 'predict')
+                if record and record['fingerprint'] == fingerprint and record['payload']:
+                    conn.close()
+                    self.skipped.append(ticker)
+                    self.metrics.inc('cache_hits', stage='predict')
+                    self.events.publish('prediction', {**record['payload'], 'skipped': True})
+                    return record['payload']
+            
+            with self.metrics.stage('load'):
+                df = pd.read_sql(
+                    f"SELECT * FROM '{table_name}' ORDER BY Date",
+                    conn,
+                    parse_dates=['Date']
+                )
             conn.close()
             
             if len(df) < 50:
@@ -96,7 +130,8 @@ class StockPredictionSystem:
                 return None
             
             df = df.set_index('Date')
-            df = self.create_features(df)
+            with self.metrics.stage('features'):
+                df = self.create_features(df)
             
             if len(df) == 0:
                 logger.warning(f"⚠️  {ticker}: 特徴量作成後データなし")
@@ -115,7 +150,7 @@ class StockPredictionSystem:
             change = predicted_price - current_price
             change_percent = (change / current_price) * 100
             
-            return {
+            result = {
                 'ticker': ticker,
                 'name': get_stock_name(ticker),
                 'current_price': float(current_price),
@@ -125,14 +160,23 @@ class StockPredictionSystem:
                 'date': df.index[-1].strftime('%Y-%m-%d')
             }
             
+            if fingerprint is not None:
+                self.fingerprints.set(ticker, 'predict', fingerprint, result)
+            
+            self.events.publish('prediction', result)
+            return result
+            
         except Exception as e:
             logger.error(f"❌ {ticker}予測エラー: {e}")
             return None
     
-    def predict_all(self) -> List[Dict[str, float]]:
+    def predict_all(self, tickers: Optional[List[str]] = None) -> List[Dict[str, float]]:
         """
         全銘柄の予測を実行
         
+        Args:
+            tickers: 対象銘柄のリスト（省略時は全銘柄）
+        
         Returns:
             予測結果のリスト
         """
@@ -141,16 +185,35 @@ class StockPredictionSystem:
         logger.info(f"実行時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info("=" * 60)
         
-        if not self.load_model():
-            return []
+        with self.metrics.stage('load_model'):
+            if not self.load_model():
+                return []
         
-        tickers = get_all_tickers()
+        if tickers is None:
+            tickers = get_all_tickers()
         predictions = []
+        self.skipped = []
         
         logger.info(f"\n🎯 対象: {len(tickers)}銘柄\n")
         
-        for ticker in tickers:
-            pred = self.predict_single(ticker)
+        def predict_timed(ticker):
+            with self.metrics.ticker('predict', ticker):
+                return self.predict_single(ticker)
+        
+        with self.metrics.stage('predict'):
+            if self.metrics.profiler is not None:
+                # プロファイラは呼び出し元スレッドだけを計測するので、スレッドプールを使わず逐次実行する
+                results = [predict_timed(ticker) for ticker in tickers]
+            else:
+                # 銘柄ごとの予測を並列実行（並列数はメモリ・CPU使用率に応じて自動調整）
+                controller = AdaptiveController(
+                    'predict',
+                    initial=2,
+                    max_limit=os.cpu_count() or 1
+                )
+                results = run_adaptive(controller, tickers, predict_timed)
+        
+        for pred in results:
             if pred:
                 predictions.append(pred)
                 
@@ -184,6 +247,12 @@ class StockPredictionSystem:
             avg_change = np.mean([p['change_percent'] for p in predictions])
             logger.info(f"\n📊 平均予測変動率: {avg_change:+.2f}%")
         
+        if self.skipped:
+            logger.info(
+                f"\n⏭️  変更なしで特徴量・予測スキップ: {len(self.skipped)}銘柄 "
+                f"({', '.join(self.skipped)})"
+            )
+        
         logger.info("\n" + "=" * 60)
         logger.info(f"✅ 予測完了: {len(predictions)}/{len(tickers)}銘柄")
         logger.info("=" * 60)
@@ -191,9 +260,68 @@ class StockPredictionSystem:
         return predictions
 
 if __name__ == "__main__":
+    import argparse
+    from market_scheduler import MarketScheduler, resolve_tickers
+    from prediction_snapshot import publish_snapshot
+    from prediction_store import PredictionStore, model_version_for
+    from resource_sampler import ResourceSampler
+    from snapshot_export import export_snapshot
+    from stage_profiler import add_profile_arguments
+    
+    parser = argparse.ArgumentParser(description='株価予測')
+    parser.add_argument('--tickers', nargs='*', help='対象銘柄（省略時は全銘柄）')
+    parser.add_argument('--scheduled', action='store_true',
+                        help='大引け後の未処理セッションがある銘柄だけ予測し、完了を記録')
+    parser.add_argument('--time-budget', type=float, default=TIME_BUDGET_MINUTES,
+                        help='1回の実行の時間枠（分、--scheduled のときだけ）。超える分は優先度の低い銘柄から次回以降に回す')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
+    tickers = resolve_tickers(args.scheduled, args.tickers, args.time_budget)
+    
+    if len(tickers) == 0:
+        logger.info("💤 予測対象の銘柄なし（休場日または処理済み）")
+        sys.exit(0)
+    
     system = StockPredictionSystem()
-    predictions = system.predict_all()
+    if args.profile:
+        system.metrics.enable_profiling(args.flamegraph)
+    
+    with ResourceSampler(system.metrics):
+        predictions = system.predict_all(tickers)
+        
+        if len(predictions) > 0:
+            with system.metrics.stage('save'):
+                # 予測対象日・モデルバージョンをキーに保存（バックテスト用）
+                PredictionStore(system.db_path).save(predictions, model_version_for(system.model_path))
+                
+                # API（ダッシュボード）向けにスナップショットを公開
+                snapshot = publish_snapshot(predictions)
+            
+            # 分析用に株価・特徴量・予測を書き出す（他チームは株価DBではなくこちらを読む）
+            with system.metrics.stage('export'):
+                try:
+                    export_snapshot(
+                        snapshot['predictions'],
+                        get_all_tickers(),
+                        system.db_path,
+                        create_features=system.create_features,
+                        model_version=model_version_for(system.model_path)
+                    )
+                except Exception as e:
+                    logger.error(f"❌ スナップショットのエクスポート失敗: {e}")
+    
+    if args.scheduled:
+        scheduler = MarketScheduler()
+        predicted = {p['ticker'] for p in predictions}
+        if predicted:
+            scheduler.mark_processed(sorted(predicted))
+        # 失敗した銘柄は回数を数え、上限に達したらこのセッションは諦める（先頭の時間枠を占め続けないように）
+        scheduler.mark_failed([ticker for ticker in tickers if ticker not in predicted])
     
     if len(predictions) == 0:
         logger.error("❌ 予測結果なし")
+        system.metrics.export()
         sys.exit(1)
+    
+    system.metrics.export()
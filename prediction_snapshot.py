@@ -0,0 +1,149 @@
+"""
+予測スナップショット
+パイプラインが予測結果をJSONファイルとして公開し、APIはそれをメモリに保持して配信する
+（APIのリクエスト処理がSQLiteやcron実行中の書き込みに影響されないようにする）
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config.stock_config import SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def publish_snapshot(
+    predictions: List[Dict[str, Any]],
+    path: str = SNAPSHOT_PATH
+) -> Dict[str, Any]:
+    """
+    予測結果をスナップショットとして公開
+    
+    スケジュール実行では一部の市場の銘柄だけを予測するため、
+    前回のスナップショットに今回の結果を銘柄単位で上書きして保存する。
+    書き込みは一時ファイル経由の置き換えなので、読み手が途中状態を見ることはない
+    
+    Args:
+        predictions: 予測結果のリスト
+        path: スナップショットファイルのパス
+    
+    Returns:
+        公開したスナップショット
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    previous = read_snapshot(path)
+    if previous:
+        merged.update({p['ticker']: p for p in previous['predictions']})
+    merged.update({p['ticker']: p for p in predictions})
+    
+    ordered = sorted(merged.values(), key=lambda p: p['change_percent'], reverse=True)
+    content = json.dumps(ordered, ensure_ascii=False, sort_keys=True)
+    
+    snapshot = {
+        'version': hashlib.sha1(content.encode('utf-8')).hexdigest()[:16],
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'predictions': ordered,
+    }
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    
+    logger.info(f"📤 スナップショット公開: {len(ordered)}銘柄 (version {snapshot['version']})")
+    return snapshot
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH) -> Optional[Dict[str, Any]]:
+    """
+    スナップショットを読み込み
+    
+    Args:
+        path: スナップショットファイルのパス
+    
+    Returns:
+        スナップショット、ファイルがなければNone
+    """
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️  スナップショット読み込み失敗: {e}")
+        return None
+
+
+class PredictionSnapshot:
+    """メモリ上の予測スナップショット（配信用に直列化済みの本文を保持）"""
+    
+    def __init__(self, data: Dict[str, Any]):
+        self.version = data['version']
+        self.generated_at = datetime.fromisoformat(data['generated_at'])
+        self.predictions = data['predictions']
+        self.by_ticker = {p['ticker']: p for p in self.predictions}
+        
+        self.body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.ticker_bodies = {
+            ticker: json.dumps(pred, ensure_ascii=False).encode('utf-8')
+            for ticker, pred in self.by_ticker.items()
+        }
+        # ダッシュボードHTMLは初回表示時に生成してキャッシュ
+        self.html: Optional[str] = None
+    
+    @classmethod
+    def empty(cls) -> 'PredictionSnapshot':
+        """予測がまだ公開されていない状態のスナップショット"""
+        return cls({
+            'version': 'empty',
+            'generated_at': datetime.fromtimestamp(0, timezone.utc).isoformat(),
+            'predictions': [],
+        })
+
+
+class SnapshotStore:
+    """スナップショットファイルを監視し、更新時にメモリ上の参照を差し替える"""
+    
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        """
+        初期化
+        
+        Args:
+            path: スナップショットファイルのパス
+        """
+        self.path = path
+        self.current = PredictionSnapshot.empty()
+        self._stat_key = None
+    
+    def refresh(self) -> bool:
+        """
+        ファイルが更新されていれば読み込み直す
+        
+        読み込みが完了してから参照を1回で差し替えるため、
+        処理中のリクエストは常に一貫したスナップショットを参照する
+        
+        Returns:
+            差し替えた場合True
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if stat_key == self._stat_key:
+            return False
+        
+        data = read_snapshot(self.path)
+        if data is None:
+            return False
+        
+        self.current = PredictionSnapshot(data)
+        self._stat_key = stat_key
+        logger.info(f"🔄 スナップショット更新: {len(self.current.predictions)}銘柄 (version {self.current.version})")
+        return True
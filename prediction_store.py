@@ -0,0 +1,262 @@
+"""
+予測ストア
+予測を (銘柄, 予測対象日, モデルバージョン) をキーに保存する。
+同じ日に何度実行しても1行に上書きされ、古い予測は保持期間を過ぎたら削除する
+"""
+import sys
+sys.path.append('.')
+
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from config.stock_config import DB_PATH, get_exchange
+from market_scheduler import next_trading_day
+
+logger = logging.getLogger(__name__)
+
+PREDICTIONS_TABLE = 'predictions'
+LEGACY_TABLE = 'predictions_history'
+
+# 予測の保持期間（日）
+RETENTION_DAYS = 730
+# 削除件数がこれを超えたらVACUUMで領域を回収
+VACUUM_THRESHOLD = 10000
+
+
+def model_version_for(model_path: str) -> str:
+    """
+    モデルファイルの内容からバージョン文字列を作る
+
+    Args:
+        model_path: モデルファイルのパス
+
+    Returns:
+        内容のsha1先頭12文字（ファイルがなければ 'unknown'）
+    """
+    if not os.path.exists(model_path):
+        return 'unknown'
+
+    digest = hashlib.sha1()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def target_date_for(ticker: str, base_date: date) -> date:
+    """
+    最終足の日付から予測対象日（次の取引日）を求める
+
+    Args:
+        ticker: ティッカーシンボル
+        base_date: 予測に使った最終足の日付
+
+    Returns:
+        予測対象日（取引所未登録の銘柄は翌平日）
+    """
+    exchange = get_exchange(ticker)
+    if exchange is not None:
+        return next_trading_day(exchange, base_date)
+
+    day = base_date + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+class PredictionStore:
+    """キー・インデックス付きの予測テーブル（株価DBと同じファイルに保存）"""
+
+    def __init__(self, db_path: str):
+        """
+        初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+        """
+        self.db_path = db_path
+        self._ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PREDICTIONS_TABLE} (
+                ticker TEXT NOT NULL,
+                target_date TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                base_date TEXT NOT NULL,
+                current_price REAL NOT NULL,
+                predicted_price REAL NOT NULL,
+                change_percent REAL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (ticker, target_date, model_version)
+            )
+        """)
+        # 日付範囲での突き合わせ・モデル別集計用
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{PREDICTIONS_TABLE}_target
+            ON {PREDICTIONS_TABLE} (target_date)
+        """)
+        conn.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{PREDICTIONS_TABLE}_model
+            ON {PREDICTIONS_TABLE} (model_version, target_date)
+        """)
+        conn.commit()
+        conn.close()
+
+    def save(self, predictions: List[Dict[str, Any]], model_version: str) -> int:
+        """
+        予測結果を保存（同じキーの予測は上書き）
+
+        Args:
+            predictions: 予測結果のリスト（ticker, current_price, predicted_price, date を含む）
+            model_version: モデルバージョン
+
+        Returns:
+            保存した件数
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = []
+
+        for pred in predictions:
+            base = pred.get('date')
+            base_date = pd.Timestamp(base).date() if base else date.today()
+            rows.append((
+                pred['ticker'],
+                target_date_for(pred['ticker'], base_date).isoformat(),
+                model_version,
+                base_date.isoformat(),
+                float(pred['current_price']),
+                float(pred['predicted_price']),
+                pred.get('change_percent'),
+                now,
+            ))
+
+        conn = self._connect()
+        conn.executemany(f"""
+            INSERT INTO {PREDICTIONS_TABLE}
+                (ticker, target_date, model_version, base_date,
+                 current_price, predicted_price, change_percent, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (ticker, target_date, model_version) DO UPDATE SET
+                base_date = excluded.base_date,
+                current_price = excluded.current_price,
+                predicted_price = excluded.predicted_price,
+                change_percent = excluded.change_percent,
+                created_at = excluded.created_at
+        """, rows)
+        conn.commit()
+        conn.close()
+
+        logger.info(f"💾 予測保存: {len(rows)}件 (model={model_version})")
+        return len(rows)
+
+    def load(
+        self,
+        since: Optional[str] = None,
+        model_version: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        予測を読み込み
+
+        Args:
+            since: この日付以降の予測対象日に絞る（'YYYY-MM-DD'）
+            model_version: モデルバージョンで絞る
+
+        Returns:
+            予測のDataFrame
+        """
+        sql = f"SELECT * FROM {PREDICTIONS_TABLE} WHERE 1 = 1"
+        params: List[Any] = []
+        if since is not None:
+            sql += " AND target_date >= ?"
+            params.append(since)
+        if model_version is not None:
+            sql += " AND model_version = ?"
+            params.append(model_version)
+
+        conn = self._connect()
+        df = pd.read_sql(sql, conn, params=params)
+        conn.close()
+        return df
+
+    def migrate_legacy(self) -> int:
+        """
+        旧 predictions_history（キーなしの追記テーブル）の内容を取り込む
+
+        同じ銘柄・予測対象日の重複は最後の1件だけ残す
+
+        Returns:
+            取り込んだ件数
+        """
+        conn = self._connect()
+        try:
+            legacy = pd.read_sql(f"SELECT * FROM {LEGACY_TABLE}", conn)
+        except Exception:
+            conn.close()
+            return 0
+        conn.close()
+
+        required = {'ticker', 'current_price', 'predicted_price'}
+        if len(legacy) == 0 or not required.issubset(legacy.columns):
+            return 0
+
+        if 'date' not in legacy.columns:
+            legacy['date'] = pd.to_datetime(legacy.get('timestamp')).dt.strftime('%Y-%m-%d')
+        legacy = legacy.dropna(subset=['date']).drop_duplicates(['ticker', 'date'], keep='last')
+
+        count = self.save(legacy.to_dict('records'), 'legacy')
+        logger.info(f"📦 旧予測履歴を移行: {count}件")
+        return count
+
+    def compact(self, retention_days: int = RETENTION_DAYS) -> int:
+        """
+        保持期間を過ぎた予測を削除
+
+        Args:
+            retention_days: 保持日数
+
+        Returns:
+            削除した件数
+        """
+        cutoff = (date.today() - timedelta(days=retention_days)).isoformat()
+
+        conn = self._connect()
+        deleted = conn.execute(
+            f"DELETE FROM {PREDICTIONS_TABLE} WHERE target_date < ?", (cutoff,)
+        ).rowcount
+        conn.commit()
+
+        if deleted > VACUUM_THRESHOLD:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+        logger.info(f"🧹 予測コンパクション: {deleted}件削除 ({cutoff}より前)")
+        return deleted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='予測ストアの保守')
+    parser.add_argument('--db', default=DB_PATH, help='株価DBのパス')
+    parser.add_argument('--migrate', action='store_true', help='旧 predictions_history を取り込む')
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS, help='予測の保持日数')
+    args = parser.parse_args()
+
+    store = PredictionStore(args.db)
+    if args.migrate:
+        store.migrate_legacy()
+    store.compact(args.retention_days)
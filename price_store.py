@@ -0,0 +1,76 @@
+"""
+株価テーブルへのマージ保存
+取得した期間の行だけを置き換え、それ以外の期間（バックフィル済みの過去データなど）は残す。
+同じデータを何度保存しても結果は変わらない（冪等）
+"""
+import logging
+import sqlite3
+from typing import List
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def table_name_for(ticker: str) -> str:
+    """ティッカーから株価テーブル名を作る（'7203.T' → '7203_T'）"""
+    return ticker.replace('.', '_').replace('-', '_')
+
+
+def _table_columns(conn: sqlite3.Connection, table_name: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info('{table_name}')")]
+
+
+def merge_prices(conn: sqlite3.Connection, table_name: str, df: pd.DataFrame, commit: bool = True) -> int:
+    """
+    株価を期間単位でマージ保存
+
+    df の最初の日付〜最後の日付の行を削除してから追記する。テーブルがなければ作成する。
+    既存テーブルにない列は捨て、df にない列はNULLになる（Adj Close の有無が違う保存元が混在しても保存できる）
+
+    Args:
+        conn: SQLite接続
+        table_name: 株価テーブル名
+        df: Date をインデックスに持つ株価データ
+        commit: Trueならコミットする（呼び出し側で他の更新と同じトランザクションにする場合はFalse）
+
+    Returns:
+        書き込んだ行数
+    """
+    if df is None or len(df) == 0:
+        return 0
+
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df = df.set_axis(index.rename('Date'), axis=0)
+
+    columns = _table_columns(conn, table_name)
+    if not columns:
+        # 空のDataFrameで作成（to_sql と同じ列型・Dateのインデックスになる）
+        df.iloc[:0].to_sql(table_name, conn, if_exists='append')
+        columns = _table_columns(conn, table_name)
+
+    df = df[[c for c in df.columns if c in columns]]
+    conn.execute(
+        f"DELETE FROM '{table_name}' WHERE Date >= ? AND Date <= ?",
+        (index.min().strftime(DATE_FORMAT), index.max().strftime(DATE_FORMAT))
+    )
+
+    # to_sql はコミットしてしまうので、同じトランザクションに入るよう executemany で追記する
+    values = [index.strftime(DATE_FORMAT).tolist()] + [
+        df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns
+    ]
+    names = ', '.join(f'"{c}"' for c in ['Date'] + list(df.columns))
+    placeholders = ', '.join('?' * len(values))
+    conn.executemany(
+        f"INSERT INTO '{table_name}' ({names}) VALUES ({placeholders})",
+        zip(*values)
+    )
+
+    if commit:
+        conn.commit()
+    return len(df)
@@ -0,0 +1,183 @@
+"""
+ワークキューのワーカー
+ワークキューから銘柄のジョブをリースして1つのブラウザで順に収集し、取得結果をキューに書き戻す。
+ワーカーを増やせばその分だけ並列に処理され、ワーカーが落ちてもそのワーカーがリース中の銘柄が
+リース期限まで遅れるだけで済む
+
+使い方:
+    python3 queue_worker.py --queue sqlite:///home/stock_prophet/data/queue.db --worker-id w1   # 同じホスト
+    python3 queue_worker.py --queue <register_backend で登録したブローカーのURL> --worker-id vps2    # 複数ノード
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import logging
+import os
+import socket
+import time
+from typing import Any, Dict, Optional
+
+from playwright.sync_api import sync_playwright
+
+from browser_service import BrowserCrashed, is_browser_lost, open_browser
+from config.stock_config import DB_PATH
+from playwright_scraper_optimized import OptimizedStockScraper
+from work_queue import DEAD, LeaseKeeper, WorkQueue, open_queue, result_from_frame
+
+logger = logging.getLogger(__name__)
+
+# キューが空になってから終了するまでの待ち時間（秒）
+IDLE_EXIT_SECONDS = 60.0
+# キューが空の間の問い合わせ間隔（秒）
+POLL_INTERVAL = 5.0
+# ジョブを完了できないままブラウザが続けて落ちた場合に起動し直す上限回数（超えたらワーカーを終了）
+MAX_BROWSER_RESTARTS = 3
+# ノードのローカルDB（レイテンシ履歴・メトリクス用。株価はキュー経由でコーディネーターへ返す）
+LOCAL_DB_PATH = DB_PATH
+
+
+class QueueWorker:
+    """ワークキューからジョブを取り出して収集するワーカー"""
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        worker_id: Optional[str] = None,
+        db_path: str = LOCAL_DB_PATH,
+        idle_exit: float = IDLE_EXIT_SECONDS
+    ):
+        """
+        初期化
+
+        Args:
+            queue: ワークキュー
+            worker_id: ワーカー名（省略時は ホスト名-PID）
+            db_path: ノードのローカルDB
+            idle_exit: キューが空になってから終了するまでの秒数（0なら空になったらすぐ終了）
+        """
+        self.queue = queue
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.idle_exit = idle_exit
+        self.scraper = OptimizedStockScraper(db_path, single_process=False)
+        self.metrics = self.scraper.metrics
+        self.stats = {'done': 0, 'failed': 0, 'dead': 0, 'lost': 0, 'released': 0}
+
+    def process(self, context, job: Dict[str, Any]) -> None:
+        """
+        1件のジョブを処理（リースを延長しながら収集し、結果を書き戻す）
+
+        ブラウザが落ちていた場合は試行回数に数えずにリースを手放して BrowserCrashed を送出する
+        （失敗として記録すると、以降に取り出すジョブもすべて即失敗してキュー全体がデッドレターになる）
+        """
+        ticker = job['ticker']
+        browser_lost = False
+        with LeaseKeeper(self.queue, job) as keeper:
+            try:
+                with self.metrics.stage('collect'), self.metrics.ticker('collect', ticker):
+                    df = self.scraper.scrape_ticker(context, ticker)
+                error = None if df is not None else 'データなし'
+            except Exception as e:
+                browser_lost = is_browser_lost(context.browser, e)
+                if not browser_lost:
+                    logger.error(f"❌ {ticker}エラー: {e}")
+                df, error = None, str(e)
+
+        if browser_lost:
+            if self.queue.release(job):
+                self.stats['released'] += 1
+            raise BrowserCrashed(ticker)
+
+        if keeper.lost:
+            # 期限切れで他のワーカーに回っているので報告しない
+            self.stats['lost'] += 1
+            return
+
+        if error is None:
+            if self.queue.complete(job, result_from_frame(df)):
+                self.stats['done'] += 1
+            else:
+                self.stats['lost'] += 1
+        elif self.queue.fail(job, error) == DEAD:
+            self.stats['dead'] += 1
+        else:
+            self.stats['failed'] += 1
+
+    def _open(self, p):
+        """ブラウザとコンテキストを用意"""
+        browser = open_browser(p, args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'])
+        context = browser.new_context(
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        )
+        return browser, context
+
+    @staticmethod
+    def _close(browser) -> None:
+        """ブラウザを閉じる（既に落ちていればエラーは無視）"""
+        try:
+            browser.close()
+        except Exception as e:
+            logger.debug(f"ブラウザ終了時のエラー: {e}")
+
+    def run(self) -> Dict[str, int]:
+        """
+        キューが空のまま idle_exit 秒たつまでジョブを処理
+
+        ブラウザが落ちたら起動し直して続ける（ジョブを完了できないまま MAX_BROWSER_RESTARTS 回を超えたら終了）
+
+        Returns:
+            {'done', 'failed', 'dead', 'lost', 'released'} の件数
+        """
+        logger.info(f"👷 ワーカー {self.worker_id} 起動")
+
+        with sync_playwright() as p:
+            browser, context = self._open(p)
+            idle_since = None
+            restarts = 0
+
+            try:
+                while True:
+                    job = self.queue.claim(self.worker_id)
+                    if job is None:
+                        idle_since = idle_since or time.monotonic()
+                        if time.monotonic() - idle_since >= self.idle_exit:
+                            break
+                        time.sleep(POLL_INTERVAL)
+                        continue
+
+                    idle_since = None
+                    try:
+                        self.process(context, job)
+                    except BrowserCrashed as e:
+                        restarts += 1
+                        if restarts > MAX_BROWSER_RESTARTS:
+                            logger.error(f"❌ ブラウザが続けて落ちたためワーカーを終了: {e}")
+                            break
+                        logger.warning(f"💥 {e}: ブラウザを起動し直します（{restarts}/{MAX_BROWSER_RESTARTS}）")
+                        self._close(browser)
+                        browser, context = self._open(p)
+                        continue
+
+                    restarts = 0
+                    # 短い待機（レート制限対策）
+                    time.sleep(self.scraper.request_interval)
+            finally:
+                self._close(browser)
+
+        self.metrics.export()
+        logger.info(f"👷 ワーカー {self.worker_id} 終了: " + ', '.join(f"{k}={v}" for k, v in self.stats.items()))
+        return self.stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='ワークキューのワーカー')
+    parser.add_argument('--queue', help='キューのURL（省略時は STOCK_PROPHET_QUEUE_URL）')
+    parser.add_argument('--worker-id', help='ワーカー名（省略時は ホスト名-PID）')
+    parser.add_argument('--db', default=LOCAL_DB_PATH, help='ノードのローカルDB（レイテンシ履歴・メトリクス）')
+    parser.add_argument('--idle-exit', type=float, default=IDLE_EXIT_SECONDS,
+                        help='キューが空になってから終了するまでの秒数')
+    args = parser.parse_args()
+
+    QueueWorker(open_queue(args.queue), args.worker_id, args.db, args.idle_exit).run()
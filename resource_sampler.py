@@ -0,0 +1,243 @@
+"""
+リソースサンプラー
+パイプライン実行中にバックグラウンドスレッドで自プロセスと配下のプロセス（Chromium・並列ワーカー）の
+RSS・CPUを一定間隔で記録し、実行中のステージごとのピーク・平均を集計する
+"""
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import psutil
+
+from adaptive_controller import CHROMIUM_PROCESS_NAMES
+from pipeline_metrics import PipelineMetrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_TABLE = '_resource_samples'
+MB = 1024 ** 2
+
+
+class ResourceSampler:
+    """バックグラウンドのリソース計測（with文で実行全体を囲んで使う）"""
+
+    def __init__(self, metrics: PipelineMetrics, interval: float = 1.0):
+        """
+        初期化
+
+        Args:
+            metrics: ステージ情報の取得元・集計結果の出力先
+            interval: 計測間隔（秒）
+        """
+        self.metrics = metrics
+        self.interval = interval
+        self.samples: List[Dict] = []
+
+        self._root = psutil.Process()
+        # CPU使用率は前回呼び出しからの差分なので、プロセスオブジェクトを使い回す
+        self._procs: Dict[int, psutil.Process] = {self._root.pid: self._root}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'ResourceSampler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """計測スレッドを開始"""
+        self._root.cpu_percent(None)
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """計測を止め、集計結果をメトリクスに反映してサンプルを保存"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        # 短いステージでも最低1件は残るよう、停止時にも計測する
+        self.sample()
+        self.report()
+        self.save()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"⚠️  リソース計測エラー: {e}")
+
+    def sample(self) -> Dict:
+        """
+        1回分を計測
+
+        Returns:
+            計測値の辞書
+        """
+        python_rss = python_cpu = 0.0
+        chromium_rss = chromium_cpu = 0.0
+        chromium_procs = 0
+
+        try:
+            children = self._root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            children = []
+
+        alive = {self._root.pid}
+        for child in children:
+            proc = self._procs.get(child.pid)
+            if proc is None:
+                # 新しいプロセスは次回からCPU使用率が取れる
+                proc = self._procs[child.pid] = child
+                try:
+                    proc.cpu_percent(None)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+            alive.add(child.pid)
+
+        for pid in list(self._procs):
+            if pid not in alive:
+                del self._procs[pid]
+                continue
+            proc = self._procs[pid]
+            try:
+                with proc.oneshot():
+                    name = proc.name().lower()
+                    rss = proc.memory_info().rss
+                    cpu = proc.cpu_percent(None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+            if any(n in name for n in CHROMIUM_PROCESS_NAMES):
+                chromium_rss += rss
+                chromium_cpu += cpu
+                chromium_procs += 1
+            else:
+                python_rss += rss
+                python_cpu += cpu
+
+        record = {
+            'time': time.time(),
+            'stage': self.metrics.current_stage,
+            'python_rss_mb': python_rss / MB,
+            'python_cpu_percent': python_cpu,
+            'chromium_rss_mb': chromium_rss / MB,
+            'chromium_cpu_percent': chromium_cpu,
+            'chromium_procs': chromium_procs,
+            'system_memory_percent': psutil.virtual_memory().percent,
+        }
+        record['total_rss_mb'] = record['python_rss_mb'] + record['chromium_rss_mb']
+        self.samples.append(record)
+        return record
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        ステージごとのピーク・平均を集計
+
+        Returns:
+            {stage: {'samples', 'peak_rss_mb', 'avg_rss_mb', 'peak_chromium_rss_mb',
+                     'peak_cpu_percent', 'avg_cpu_percent', 'peak_chromium_procs'}}
+        """
+        grouped: Dict[str, List[Dict]] = {}
+        for record in self.samples:
+            grouped.setdefault(record['stage'], []).append(record)
+
+        summary = {}
+        for stage, records in grouped.items():
+            rss = [r['total_rss_mb'] for r in records]
+            cpu = [r['python_cpu_percent'] + r['chromium_cpu_percent'] for r in records]
+            summary[stage] = {
+                'samples': len(records),
+                'peak_rss_mb': max(rss),
+                'avg_rss_mb': sum(rss) / len(rss),
+                'peak_chromium_rss_mb': max(r['chromium_rss_mb'] for r in records),
+                'peak_cpu_percent': max(cpu),
+                'avg_cpu_percent': sum(cpu) / len(cpu),
+                'peak_chromium_procs': max(r['chromium_procs'] for r in records),
+            }
+        return summary
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        ステージ別の集計をログに出し、メトリクスに記録
+
+        Returns:
+            stage_summary の結果
+        """
+        summary = self.stage_summary()
+
+        for stage, values in sorted(summary.items(), key=lambda item: -item[1]['peak_rss_mb']):
+            logger.info(
+                f"📈 {stage}: RSSピーク {values['peak_rss_mb']:.0f}MB "
+                f"(平均 {values['avg_rss_mb']:.0f}MB, Chromium {values['peak_chromium_rss_mb']:.0f}MB / "
+                f"{values['peak_chromium_procs']}プロセス), "
+                f"CPUピーク {values['peak_cpu_percent']:.0f}% (平均 {values['avg_cpu_percent']:.0f}%)"
+            )
+            for key in ('peak_rss_mb', 'avg_rss_mb', 'peak_chromium_rss_mb',
+                        'peak_cpu_percent', 'avg_cpu_percent', 'peak_chromium_procs'):
+                self.metrics.set(f'resource_{key}', values[key], stage=stage)
+
+        return summary
+
+    def save(self) -> int:
+        """
+        サンプルを株価DBに保存（傾向分析用）
+
+        Returns:
+            保存した件数
+        """
+        if not self.samples:
+            return 0
+
+        rows = [
+            (
+                self.metrics.run_id,
+                self.metrics.pipeline,
+                datetime.fromtimestamp(r['time']).isoformat(timespec='milliseconds'),
+                r['stage'],
+                round(r['python_rss_mb'], 1),
+                round(r['python_cpu_percent'], 1),
+                round(r['chromium_rss_mb'], 1),
+                round(r['chromium_cpu_percent'], 1),
+                r['chromium_procs'],
+                r['system_memory_percent'],
+            )
+            for r in self.samples
+        ]
+
+        try:
+            conn = sqlite3.connect(self.metrics.db_path, timeout=30)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SAMPLES_TABLE} (
+                    run_id TEXT NOT NULL,
+                    pipeline TEXT NOT NULL,
+                    sampled_at TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    python_rss_mb REAL,
+                    python_cpu_percent REAL,
+                    chromium_rss_mb REAL,
+                    chromium_cpu_percent REAL,
+                    chromium_procs INTEGER,
+                    system_memory_percent REAL
+                )
+            """)
+            conn.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx{SAMPLES_TABLE}_run
+                ON {SAMPLES_TABLE} (pipeline, sampled_at)
+            """)
+            conn.executemany(f"INSERT INTO {SAMPLES_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️  リソースサンプル保存失敗: {e}")
+            return 0
+
+        return len(rows)
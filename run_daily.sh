@@ -2,6 +2,7 @@
 ##############################################
 # Stock Prophet 自動実行スクリプト
 # 毎日自動でデータ収集 → 予測実行
+# 大引けを迎えた市場の銘柄だけ処理（土日・休場日はスキップ）
 ##############################################
 
 echo "=========================================="
@@ -18,13 +19,19 @@ echo "" | tee -a $LOG_FILE
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
 echo "Phase 1: データ収集" | tee -a $LOG_FILE
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
-python3 scraper_fixed.py 2>&1 | tee -a $LOG_FILE
+python3 scraper_fixed.py --scheduled 2>&1 | tee -a $LOG_FILE
 
 echo "" | tee -a $LOG_FILE
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
 echo "Phase 2: 予測実行" | tee -a $LOG_FILE
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
-python3 predict_system.py 2>&1 | tee -a $LOG_FILE
+python3 predict_system.py --scheduled 2>&1 | tee -a $LOG_FILE
+
+echo "" | tee -a $LOG_FILE
+echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
+echo "Phase 3: 予測精度の検証" | tee -a $LOG_FILE
+echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━" | tee -a $LOG_FILE
+python3 backtest.py --compact 2>&1 | tee -a $LOG_FILE
 
 echo "" | tee -a $LOG_FILE
 echo "=========================================="
@@ -9,15 +9,44 @@ import logging
 import sqlite3
 from typing import Optional, Dict
 
+from browser_service import is_browser_lost, open_browser
+from change_detector import FingerprintStore, compute_fingerprint
+from config.stock_config import DB_PATH, TIME_BUDGET_MINUTES, YAHOO_BASE_URL
+from event_bus import EventPublisher, events_path_for
+from history_parser import extract_columns, parse_history
+from pipeline_metrics import PipelineMetrics, page_transfer_bytes
+from price_store import merge_prices, table_name_for
+from source_health import SourceHealth, TIER_PLAYWRIGHT
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 class StockScraperFixed:
     """株価データスクレイパー"""
     
-    def __init__(self):
-        """初期化"""
-        self.db_path = './data/stock_data.db'
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        metrics: Optional[PipelineMetrics] = None,
+        base_url: str = YAHOO_BASE_URL
+    ):
+        """
+        初期化
+        
+        Args:
+            db_path: 保存先SQLiteファイルのパス
+            metrics: 計測の記録先（省略時は新規作成）
+            base_url: 株価履歴の取得元（ベンチマーク時はフィクスチャサーバーのURL）
+        """
+        self.db_path = db_path
+        self.base_url = base_url.rstrip('/')
+        self.fingerprints = FingerprintStore(self.db_path)
+        self.events = EventPublisher(events_path_for(self.db_path))
+        self.metrics = metrics or PipelineMetrics('collect', self.db_path)
+        # 銘柄ごとのレイテンシ履歴（タイムアウト・サーキットブレーカー）
+        self.health = SourceHealth(self.db_path)
+        # 銘柄間の待機秒数（レート制限対策）
+        self.request_interval = 3.0
     
     def scrape_single_stock(
         self,
@@ -32,7 +61,7 @@ class StockScraperFixed:
             days: 取得日数（デフォルト: 90日）
         
         Returns:
-            株価データのDataFrame、失敗時はNone
+            株価データのDataFrame、失敗時はNone（失敗が続いている銘柄はブラウザを起動せずNone）
             columns: ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
         
         Examples:
@@ -40,68 +69,50 @@ class StockScraperFixed:
             >>> df = scraper.scrape_single_stock('AAPL')
             >>> print(df.head())
         """
+        if self.health.is_open(ticker, TIER_PLAYWRIGHT):
+            logger.warning(f"⏭️ {ticker}: 失敗が続いているためスキップ（サーキットブレーカー）")
+            self.metrics.inc('circuit_open')
+            return None
+        
         logger.info(f"📊 処理開始: {ticker}")
         
         with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                ]
-            )
+            browser = open_browser(p, args=[
+                '--no-sandbox',
+                '--disable-dev-shm-usage',
+                '--disable-gpu',
+            ])
             
             page = browser.new_page()
             
             try:
-                url = f'https://finance.yahoo.com/quote/{ticker}/history'
-                page.goto(url, wait_until='domcontentloaded', timeout=60000)
-                page.wait_for_selector('table tbody tr', timeout=20000)
-                
-                rows = page.query_selector_all('table tbody tr')
+                url = f'{self.base_url}/quote/{ticker}/history'
+                started = time.perf_counter()
+                page.goto(url, wait_until='domcontentloaded',
+                          timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 60000))
+                page.wait_for_selector('table tbody tr',
+                                       timeout=self.health.timeout_ms(ticker, TIER_PLAYWRIGHT, 20000))
+                elapsed = time.perf_counter() - started
+                self.metrics.observe('page_load_seconds', elapsed)
+                self.metrics.inc('bytes_transferred', page_transfer_bytes(page))
                 
-                data = []
-                for row in rows[:days]:
-                    try:
-                        cells = row.query_selector_all('td')
-                        if len(cells) >= 7:
-                            date_str = cells[0].inner_text()
-                            
-                            if 'Dividend' in date_str or 'Split' in date_str:
-                                continue
-                            
-                            open_p = cells[1].inner_text().replace(',', '')
-                            high_p = cells[2].inner_text().replace(',', '')
-                            low_p = cells[3].inner_text().replace(',', '')
-                            close_p = cells[4].inner_text().replace(',', '')
-                            volume = cells[6].inner_text().replace(',', '')
-                            
-                            if open_p != '-' and close_p != '-':
-                                data.append({
-                                    'Date': date_str,
-                                    'Open': float(open_p),
-                                    'High': float(high_p),
-                                    'Low': float(low_p),
-                                    'Close': float(close_p),
-                                    'Volume': int(volume) if volume != '-' else 0
-                                })
-                    except:
-                        continue
+                # 表は1回の evaluate で列ごとに取り出して一括変換（Adj Close は保存しない）
+                df = parse_history(extract_columns(page, limit=days))
                 
-                if len(data) > 0:
-                    df = pd.DataFrame(data)
-                    df['Date'] = pd.to_datetime(df['Date'])
-                    df = df.sort_values('Date')
-                    df.set_index('Date', inplace=True)
-                    
+                if df is not None:
+                    df = df.drop(columns=['Adj Close'])
+                    self.health.record(ticker, TIER_PLAYWRIGHT, elapsed, True)
                     logger.info(f"✅ {ticker}: {len(df)}件取得")
                     return df
                 else:
+                    self.health.record(ticker, TIER_PLAYWRIGHT, elapsed, False, 'データなし')
                     logger.warning(f"⚠️  {ticker}: データなし")
                     return None
                     
             except Exception as e:
+                # ブラウザごと落ちた場合は銘柄の失敗として記録しない（サーキットブレーカーを開かない）
+                if not is_browser_lost(browser, e):
+                    self.health.record(ticker, TIER_PLAYWRIGHT, time.perf_counter() - started, False, str(e))
                 logger.error(f"❌ {ticker}エラー: {e}")
                 return None
             finally:
@@ -121,18 +132,32 @@ class StockScraperFixed:
             {ticker: DataFrame} の辞書
         """
         results = {}
+        unchanged = []
         
         for i, ticker in enumerate(tickers, 1):
             logger.info(f"\n進捗: {i}/{len(tickers)}")
             
-            df = self.scrape_single_stock(ticker)
+            with self.metrics.stage('collect'), self.metrics.ticker('collect', ticker):
+                df = self.scrape_single_stock(ticker)
             
             if df is not None:
-                results[ticker] = df
-                self.save_to_db(ticker, df)
+                try:
+                    if not self.save_to_db(ticker, df):
+                        unchanged.append(ticker)
+                except Exception as e:
+                    logger.error(f"❌ {ticker} DB保存エラー: {e}")
+                    self.events.publish('collection', {'ticker': ticker, 'status': 'failed', 'error': str(e)})
+                else:
+                    results[ticker] = df
+                    self.events.publish('collection', {'ticker': ticker, 'status': 'done', 'rows': len(df)})
+            else:
+                self.events.publish('collection', {'ticker': ticker, 'status': 'failed'})
             
             if i < len(tickers):
-                time.sleep(3)
+                time.sleep(self.request_interval)
+        
+        if unchanged:
+            logger.info(f"⏭️  変更なしで保存スキップ: {len(unchanged)}銘柄 ({', '.join(unchanged)})")
         
         return results
     
@@ -140,31 +165,67 @@ class StockScraperFixed:
         self,
         ticker: str,
         df: pd.DataFrame
-    ) -> None:
+    ) -> bool:
         """
         SQLiteにデータ保存
         
+        直近の株価が前回保存時と同じ場合は書き込みをスキップする
+        
         Args:
             ticker: ティッカーシンボル
             df: 株価データのDataFrame
+        
+        Returns:
+            書き込んだ場合True、変更なしでスキップした場合False（書き込みに失敗した場合は例外）
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            table_name = ticker.replace('.', '_').replace('-', '_')
-            df.to_sql(table_name, conn, if_exists='replace')
-            conn.close()
-            logger.info(f"💾 DB保存完了: {table_name}")
-        except Exception as e:
-            logger.error(f"❌ DB保存エラー: {e}")
+        with self.metrics.stage('save'):
+            fingerprint = compute_fingerprint(df)
+            if self.fingerprints.is_unchanged(ticker, 'save', fingerprint):
+                logger.info(f"⏭️  {ticker}: 変更なし（保存スキップ）")
+                self.metrics.inc('cache_hits', stage='save')
+                return False
+            
+            table_name = table_name_for(ticker)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                # 取得した期間だけ置き換える（バックフィル済みの過去データは残す）
+                merge_prices(conn, table_name, df)
+            finally:
+                conn.close()
+            
+            self.fingerprints.set(ticker, 'save', fingerprint)
+            self.metrics.inc('rows_ingested', len(df))
+        logger.info(f"💾 DB保存完了: {table_name}")
+        return True
 
 if __name__ == "__main__":
     import sys
+    import argparse
     sys.path.append('.')
-    from config.stock_config import get_all_tickers
+    from market_scheduler import resolve_tickers
+    from resource_sampler import ResourceSampler
+    from stage_profiler import add_profile_arguments
+    
+    parser = argparse.ArgumentParser(description='株価スクレイパー')
+    parser.add_argument('--tickers', nargs='*', help='対象銘柄（省略時は全銘柄）')
+    parser.add_argument('--scheduled', action='store_true',
+                        help='大引け後の未処理セッションがある銘柄だけ処理')
+    parser.add_argument('--time-budget', type=float, default=TIME_BUDGET_MINUTES,
+                        help='1回の実行の時間枠（分、--scheduled のときだけ）。超える分は優先度の低い銘柄から次回以降に回す')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
     
     scraper = StockScraperFixed()
-    tickers = get_all_tickers()
+    if args.profile:
+        scraper.metrics.enable_profiling(args.flamegraph)
+    tickers = resolve_tickers(args.scheduled, args.tickers, args.time_budget)
+    
+    if len(tickers) == 0:
+        logger.info("💤 処理対象の銘柄なし（休場日または処理済み）")
+        sys.exit(0)
     
     logger.info(f"🚀 スクレイピング開始: {len(tickers)}銘柄")
-    results = scraper.scrape_multiple(tickers)
+    with ResourceSampler(scraper.metrics):
+        results = scraper.scrape_multiple(tickers)
+    scraper.metrics.export()
     logger.info(f"✅ 完了: {len(results)}/{len(tickers)}銘柄")
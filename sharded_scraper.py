@@ -0,0 +1,317 @@
+"""
+並列シャード収集
+銘柄リストを複数のワーカープロセスに分配し、ワーカーごとに独立したブラウザで収集する
+1つのブラウザがクラッシュしても、影響はそのワーカーが処理中の銘柄だけに留まる
+"""
+import sys
+sys.path.append('.')
+
+import logging
+import multiprocessing as mp
+import os
+import queue as queue_module
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from adaptive_controller import AdaptiveController
+from browser_service import BrowserCrashed
+from collection_journal import CollectionJournal, RUNNING
+from config.stock_config import DB_PATH, YAHOO_BASE_URL
+from playwright_scraper_optimized import OptimizedStockScraper
+from pipeline_metrics import PipelineMetrics
+from resource_monitor import check_resources
+
+logger = logging.getLogger(__name__)
+
+# ワーカー1つ（Chromium + Python）あたりの想定メモリ
+PER_WORKER_MEMORY_GB = 0.6
+# OS・他プロセス用に残しておくメモリ
+RESERVED_MEMORY_GB = 0.5
+# クラッシュしたワーカーを再起動する上限回数
+MAX_RESTARTS = 3
+# ブラウザが落ちたワーカーの終了コード（監視側が異常終了として数え、新しいワーカーを起動する）
+BROWSER_CRASH_EXITCODE = 3
+# 実行中のメモリ使用率の上限（4GB VPSでOOM Killerに達しない水準）
+MEMORY_CEILING_PERCENT = 85.0
+
+
+def choose_worker_count(
+    n_tickers: int,
+    max_workers: Optional[int] = None,
+    per_worker_gb: float = PER_WORKER_MEMORY_GB,
+    reserved_gb: float = RESERVED_MEMORY_GB
+) -> int:
+    """
+    メモリ予算からワーカー数を決定
+    
+    Args:
+        n_tickers: 収集対象の銘柄数
+        max_workers: ワーカー数の上限（省略時はCPUコア数）
+        per_worker_gb: ワーカー1つあたりの想定メモリ
+        reserved_gb: 確保しておくメモリ
+    
+    Returns:
+        ワーカー数（最低1）
+    """
+    resources = check_resources()
+    budget_gb = resources['memory_available_gb'] - reserved_gb
+    
+    by_memory = int(budget_gb // per_worker_gb)
+    by_cpu = max_workers or os.cpu_count() or 1
+    workers = max(1, min(by_memory, by_cpu, n_tickers))
+    
+    if by_memory < 1:
+        logger.warning(f"⚠️  メモリ予算不足（残り{budget_gb:.2f}GB）: 1ワーカーで実行")
+    
+    logger.info(
+        f"🧮 ワーカー数: {workers} "
+        f"(メモリ上限 {by_memory} / CPU上限 {by_cpu} / 銘柄数 {n_tickers})"
+    )
+    return workers
+
+
+def _iter_queue(queue, stop_event):
+    """停止指示があるか、キューが空になるまで銘柄を取り出す"""
+    while not stop_event.is_set():
+        try:
+            yield queue.get(timeout=1)
+        except queue_module.Empty:
+            return
+
+
+def _worker_main(worker_id: int, db_path: str, run_id: str, queue, stop_event, base_url: str) -> None:
+    """ワーカープロセス: キューから銘柄を取り出し、専用ブラウザで収集・即時保存"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker{worker_id} - %(levelname)s - %(message)s'
+    )
+    
+    # 各ワーカーは別プロセスなので --single-process は使わない
+    scraper = OptimizedStockScraper(db_path, single_process=False, base_url=base_url)
+    try:
+        scraper.scrape_with_single_browser(_iter_queue(queue, stop_event), run_id)
+    except BrowserCrashed as e:
+        # 処理中だった銘柄をキューに戻して終了し、残りは新しいブラウザのワーカーに任せる
+        # （このまま続けると残りの銘柄をすべて即失敗にしてキューを空にしてしまう）
+        queue.put(e.ticker)
+        scraper.metrics.export(textfile=False)
+        sys.exit(BROWSER_CRASH_EXITCODE)
+    # textfile は親プロセスが書くので、ワーカーはDBにだけ記録する
+    scraper.metrics.export(textfile=False)
+
+
+class ShardedScraper:
+    """複数プロセスでの並列収集"""
+    
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        max_workers: Optional[int] = None,
+        base_url: str = YAHOO_BASE_URL
+    ):
+        """
+        初期化
+        
+        Args:
+            db_path: 共有ストア（SQLite）のパス
+            max_workers: ワーカー数の上限
+            base_url: 株価履歴の取得元（ワーカーに引き渡す）
+        """
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.journal = CollectionJournal(self.db_path)
+        self.metrics = PipelineMetrics('collect', self.db_path)
+        
+        # 複数ワーカーからの書き込み中も読み込みをブロックしないようWALにする
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.close()
+    
+    def run(self, tickers: List[str], resume: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        並列収集を実行
+        
+        Args:
+            tickers: 収集対象の銘柄リスト
+            resume: Trueなら直近の未完了実行の残りだけ収集
+        
+        Returns:
+            {ticker: DataFrame} の辞書（共有ストアから読み戻した結果）
+        """
+        run_id = None
+        if resume:
+            run_id = self.journal.latest_incomplete_run()
+            if run_id:
+                tickers = self.journal.pending_tickers(run_id)
+                logger.info(f"🔁 実行 {run_id} を再開: 残り{len(tickers)}銘柄")
+            else:
+                logger.info("✅ 再開対象の未完了実行なし")
+                return {}
+        
+        if len(tickers) == 0:
+            return {}
+        
+        if run_id is None:
+            run_id = self.journal.start_run(tickers)
+        
+        workers = choose_worker_count(len(tickers), self.max_workers)
+        
+        started = time.monotonic()
+        with self.metrics.stage('collect'):
+            self._run_workers(run_id, tickers, workers)
+        elapsed = time.monotonic() - started
+        
+        self._fail_orphaned(run_id)
+        
+        summary = self.journal.summary(run_id)
+        self.metrics.set('workers', workers)
+        for status, count in summary.items():
+            self.metrics.set('tickers', count, status=status)
+        logger.info(
+            f"📒 実行 {run_id} ({elapsed:.1f}秒): "
+            + ', '.join(f"{k}={v}" for k, v in sorted(summary.items()))
+        )
+        
+        return self.load_results(run_id)
+    
+    def _run_workers(self, run_id: str, tickers: List[str], workers: int) -> None:
+        """
+        ワーカーを起動し、全銘柄の処理が終わるまで監視
+        
+        ワーカー数は実行中のリソース計測に応じて増減させる
+        （減らす場合は処理中の銘柄を終えたワーカーから停止）
+        """
+        ctx = mp.get_context('spawn')
+        queue = ctx.Queue()
+        for ticker in tickers:
+            queue.put(ticker)
+        
+        controller = AdaptiveController(
+            'collect',
+            initial=workers,
+            max_limit=min(self.max_workers or os.cpu_count() or 1, len(tickers)),
+            memory_ceiling_percent=MEMORY_CEILING_PERCENT
+        )
+        
+        processes = {}
+        next_id = 0
+        crashes = 0
+        
+        while True:
+            # 終了したワーカーを回収
+            for worker_id, (process, _) in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[worker_id]
+                if process.exitcode != 0:
+                    # 処理中だった銘柄以外はキューに残っているので、他のワーカーが引き継ぐ
+                    crashes += 1
+                    logger.error(f"❌ worker{worker_id} 異常終了 (exitcode={process.exitcode})")
+            
+            limit = controller.update()
+            has_work = not queue.empty()
+            
+            # 並列数の上限に合わせてワーカーを起動 / 停止
+            while has_work and len(processes) < limit and crashes <= MAX_RESTARTS:
+                stop_event = ctx.Event()
+                process = ctx.Process(
+                    target=_worker_main,
+                    args=(next_id, self.db_path, run_id, queue, stop_event, self.base_url),
+                    daemon=False
+                )
+                process.start()
+                processes[next_id] = (process, stop_event)
+                next_id += 1
+            
+            running = [wid for wid, (_, event) in processes.items() if not event.is_set()]
+            for worker_id in sorted(running, reverse=True)[:max(0, len(running) - limit)]:
+                logger.info(f"⏸️  worker{worker_id} 停止指示（並列数 {limit} に縮小）")
+                processes[worker_id][1].set()
+            
+            if not processes:
+                if has_work:
+                    logger.error(f"❌ ワーカー異常終了が上限（{MAX_RESTARTS}回）を超えたため中断")
+                break
+            
+            for process, _ in processes.values():
+                process.join(timeout=1 / len(processes))
+        
+        if controller.adjustments:
+            logger.info(f"🎛️  並列数の調整回数: {len(controller.adjustments)}")
+    
+    def _fail_orphaned(self, run_id: str) -> None:
+        """全ワーカー終了後も running のままの銘柄（クラッシュ時に処理中だった銘柄）を失敗扱いにする"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        orphaned = [
+            row[0] for row in conn.execute(
+                "SELECT ticker FROM _collection_runs WHERE run_id = ? AND status = ?",
+                (run_id, RUNNING)
+            )
+        ]
+        conn.close()
+        
+        for ticker in orphaned:
+            self.journal.mark_failed(run_id, ticker, 'ワーカー異常終了', 0.0)
+        if orphaned:
+            logger.warning(f"⚠️  処理中にワーカーが落ちた銘柄: {', '.join(orphaned)}（--resume で再取得）")
+    
+    def load_results(self, run_id: str) -> Dict[str, pd.DataFrame]:
+        """
+        実行で完了した銘柄のデータを共有ストアから読み込み
+        
+        Args:
+            run_id: 実行ID
+        
+        Returns:
+            {ticker: DataFrame} の辞書
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        done = [
+            row[0] for row in conn.execute(
+                "SELECT ticker FROM _collection_runs WHERE run_id = ? AND status = 'done'",
+                (run_id,)
+            )
+        ]
+        
+        results = {}
+        for ticker in done:
+            table_name = ticker.replace('.', '_').replace('-', '_')
+            df = pd.read_sql(f"SELECT * FROM '{table_name}' ORDER BY Date", conn, parse_dates=['Date'])
+            results[ticker] = df.set_index('Date')
+        conn.close()
+        
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from config.stock_config import TIME_BUDGET_MINUTES
+    from market_scheduler import resolve_tickers
+    from resource_sampler import ResourceSampler
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    parser = argparse.ArgumentParser(description='並列シャード収集')
+    parser.add_argument('--tickers', nargs='*', help='対象銘柄（省略時は全銘柄）')
+    parser.add_argument('--scheduled', action='store_true',
+                        help='大引け後の未処理セッションがある銘柄だけ処理')
+    parser.add_argument('--time-budget', type=float, default=TIME_BUDGET_MINUTES,
+                        help='1回の実行の時間枠（分、--scheduled のときだけ）。超える分は優先度の低い銘柄から次回以降に回す')
+    parser.add_argument('--workers', type=int, help='ワーカー数の上限')
+    parser.add_argument('--resume', action='store_true',
+                        help='直近の未完了実行のうち、完了していない銘柄だけ再取得')
+    args = parser.parse_args()
+    
+    tickers = resolve_tickers(args.scheduled, args.tickers, args.time_budget)
+    
+    logger.info(f"🚀 並列収集開始: {len(tickers)}銘柄")
+    scraper = ShardedScraper(max_workers=args.workers)
+    # 配下のワーカープロセスとそのChromiumもまとめて計測される
+    with ResourceSampler(scraper.metrics):
+        results = scraper.run(tickers, resume=args.resume)
+    scraper.metrics.export()
+    logger.info(f"✅ 完了: {len(results)}銘柄")
@@ -0,0 +1,351 @@
+"""
+分析用スナップショットのエクスポート
+予測の実行ごとに株価・特徴量・予測を Arrow IPC（またはParquet）のファイルとして書き出し、
+バージョンごとのディレクトリ（書き出し後は変更しない）とマニフェストを作って latest.json を差し替える。
+他チームの分析は株価DBではなくこのファイルを読むので、パイプラインとDBのロックを取り合わない。
+Arrow IPC は無圧縮で書くので、読み手はメモリマップでコピーなしに読み込める
+
+    data/exports/
+    ├── latest.json                      # 最新バージョンのマニフェスト（置き換えで更新）
+    └── 20261019T071502Z-3f2a9c1e/
+        ├── manifest.json
+        ├── prices.arrow
+        ├── features.arrow
+        └── predictions.arrow
+
+使い方:
+    python3 snapshot_export.py                    # 直近の予測と株価からエクスポート
+    python3 snapshot_export.py --format parquet --days 730
+    python3 snapshot_export.py --show prices      # 最新バージョンを読み込んで表示
+
+    # 読み手側
+    from snapshot_export import load_latest
+    prices = load_latest('prices')               # pyarrow.Table（.to_pandas() でDataFrame）
+
+pyarrow が必要（未インストールならエクスポートをスキップする）
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from config.stock_config import DB_PATH
+from price_store import table_name_for
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = './data/exports'
+LATEST_FILENAME = 'latest.json'
+MANIFEST_FILENAME = 'manifest.json'
+
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+# 書き出す株価の期間（日）
+DEFAULT_DAYS = 400
+# 残すバージョン数（latest.json が指すバージョンは常に残す）
+KEEP_VERSIONS = 14
+
+
+def _read_prices(conn: sqlite3.Connection, ticker: str, since: str) -> Optional[pd.DataFrame]:
+    table_name = table_name_for(ticker)
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).fetchone()
+    if not exists:
+        return None
+
+    df = pd.read_sql(
+        f"SELECT * FROM '{table_name}' WHERE Date >= ? ORDER BY Date", conn, params=(since,), parse_dates=['Date']
+    )
+    if len(df) == 0:
+        return None
+    # 保存元によって Adj Close の有無が違う（ない場合は Close と同じとみなす）
+    df = df.set_index('Date').reindex(columns=PRICE_COLUMNS)
+    df['Adj Close'] = df['Adj Close'].fillna(df['Close'])
+    return df
+
+
+def _long_frame(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """銘柄ごとのDataFrameを ticker, Date 列付きの1つの表にする"""
+    if not frames:
+        return pd.DataFrame({'ticker': pd.Categorical([]), 'Date': pd.to_datetime([])})
+    df = pd.concat(frames, names=['ticker', 'Date']).reset_index()
+    df['ticker'] = df['ticker'].astype('category')
+    return df
+
+
+def _write_table(df: pd.DataFrame, path: str, fmt: str) -> Dict[str, Any]:
+    """1つの表を書き出し、マニフェスト用の情報を返す"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == 'arrow':
+        # メモリマップで読めるよう無圧縮のIPCファイルにする
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, path, compression='zstd')
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return {
+        'path': os.path.basename(path),
+        'rows': table.num_rows,
+        'bytes': os.path.getsize(path),
+        'sha256': digest.hexdigest(),
+        'columns': {field.name: str(field.type) for field in table.schema},
+    }
+
+
+def _write_json(data: Dict[str, Any], path: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def export_snapshot(
+    predictions: List[Dict[str, Any]],
+    tickers: List[str],
+    db_path: str = DB_PATH,
+    export_dir: str = EXPORT_DIR,
+    fmt: str = 'arrow',
+    days: int = DEFAULT_DAYS,
+    create_features: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    model_version: Optional[str] = None,
+    keep: int = KEEP_VERSIONS
+) -> Optional[Dict[str, Any]]:
+    """
+    株価・特徴量・予測をバージョン付きのスナップショットとして書き出す
+
+    一時ディレクトリに書いてから名前を変えてバージョンを公開し、最後に latest.json を置き換える。
+    読み手は latest.json のマニフェストからファイルを開くので、書き出し途中のファイルを見ることはない
+
+    Args:
+        predictions: 予測結果のリスト（前回分とマージ済みのもの）
+        tickers: 株価・特徴量を書き出す銘柄
+        db_path: 株価DBのパス（読み取り専用で開く）
+        export_dir: 書き出し先
+        fmt: 'arrow'（Arrow IPC）または 'parquet'
+        days: 書き出す株価の期間（日）
+        create_features: 株価から特徴量を作る関数（省略時は特徴量を書き出さない）
+        model_version: マニフェストに記録するモデルバージョン
+        keep: 残すバージョン数
+
+    Returns:
+        マニフェスト、pyarrow がなければNone
+    """
+    if pa is None:
+        logger.warning("⚠️ pyarrow が未インストールのためスナップショットのエクスポートをスキップ（pip install pyarrow）")
+        return None
+    if fmt not in FORMATS:
+        raise ValueError(f"未対応の形式です: {fmt}（{', '.join(FORMATS)}）")
+
+    started = time.perf_counter()
+    since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    # 書き出しの間だけ読み取り専用で開く
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True, timeout=30)
+    try:
+        prices = {}
+        for ticker in tickers:
+            df = _read_prices(conn, ticker, since)
+            if df is not None:
+                prices[ticker] = df
+    finally:
+        conn.close()
+
+    features = {}
+    if create_features is not None:
+        for ticker, df in prices.items():
+            try:
+                features[ticker] = create_features(df.copy())
+            except Exception as e:
+                logger.warning(f"⚠️ {ticker}: 特徴量を作れませんでした: {e}")
+
+    predictions_df = pd.DataFrame(predictions)
+    if 'date' in predictions_df:
+        predictions_df['date'] = pd.to_datetime(predictions_df['date'])
+
+    tables = {
+        'prices': _long_frame(prices),
+        'features': _long_frame(features) if create_features is not None else None,
+        'predictions': predictions_df,
+    }
+
+    generated_at = datetime.now(timezone.utc)
+    content = json.dumps(sorted(predictions, key=lambda p: p['ticker']), ensure_ascii=False, sort_keys=True)
+    content_hash = hashlib.sha1(
+        (content + ''.join(f"{t}:{len(df)}:{df.index[-1]}" for t, df in sorted(prices.items()))).encode('utf-8')
+    ).hexdigest()[:8]
+    version = f"{generated_at.strftime('%Y%m%dT%H%M%SZ')}-{content_hash}"
+
+    os.makedirs(export_dir, exist_ok=True)
+    version_dir = os.path.join(export_dir, version)
+    tmp_dir = os.path.join(export_dir, f'.tmp-{version}-{os.getpid()}')
+    os.makedirs(tmp_dir)
+
+    try:
+        files = {}
+        for name, df in tables.items():
+            if df is not None:
+                files[name] = _write_table(df, os.path.join(tmp_dir, name + FORMATS[fmt]), fmt)
+
+        manifest = {
+            'version': version,
+            'generated_at': generated_at.isoformat(timespec='seconds'),
+            'format': fmt,
+            'model_version': model_version,
+            'price_since': since,
+            'tickers': sorted(prices),
+            'files': files,
+        }
+        _write_json(manifest, os.path.join(tmp_dir, MANIFEST_FILENAME))
+        # 書き終えたディレクトリを名前の変更で公開する
+        os.rename(tmp_dir, version_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_json({**manifest, 'path': version}, os.path.join(export_dir, LATEST_FILENAME))
+    prune_versions(export_dir, keep)
+
+    total_bytes = sum(f['bytes'] for f in files.values())
+    logger.info(
+        f"📦 スナップショット書き出し: {version} ({len(prices)}銘柄, "
+        f"{total_bytes / 1024**2:.1f}MB, {time.perf_counter() - started:.2f}秒)"
+    )
+    return manifest
+
+
+def list_versions(export_dir: str = EXPORT_DIR) -> List[str]:
+    """公開済みのバージョン（古い順）"""
+    if not os.path.isdir(export_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(export_dir)
+        if not name.startswith('.') and os.path.exists(os.path.join(export_dir, name, MANIFEST_FILENAME))
+    )
+
+
+def read_manifest(export_dir: str = EXPORT_DIR, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    マニフェストを読み込む
+
+    Args:
+        export_dir: 書き出し先
+        version: バージョン（省略時は latest.json が指すもの）
+
+    Returns:
+        マニフェスト、なければNone
+    """
+    path = (
+        os.path.join(export_dir, version, MANIFEST_FILENAME) if version
+        else os.path.join(export_dir, LATEST_FILENAME)
+    )
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def prune_versions(export_dir: str = EXPORT_DIR, keep: int = KEEP_VERSIONS) -> int:
+    """
+    古いバージョンを削除（latest.json が指すバージョンは残す）
+
+    Returns:
+        削除したバージョン数
+    """
+    latest = read_manifest(export_dir)
+    versions = list_versions(export_dir)
+    removed = 0
+    for version in versions[:max(0, len(versions) - keep)]:
+        if latest and version == latest['version']:
+            continue
+        shutil.rmtree(os.path.join(export_dir, version), ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def load_latest(table: str, export_dir: str = EXPORT_DIR, version: Optional[str] = None):
+    """
+    スナップショットの表を読み込む（Arrow IPC はメモリマップでコピーなしに読む）
+
+    Args:
+        table: 'prices', 'features', 'predictions'
+        export_dir: 書き出し先
+        version: バージョン（省略時は最新）
+
+    Returns:
+        pyarrow.Table
+    """
+    if pa is None:
+        raise ImportError("スナップショットの読み込みには pyarrow が必要です（pip install pyarrow）")
+
+    manifest = read_manifest(export_dir, version)
+    if manifest is None:
+        raise FileNotFoundError(f"スナップショットがありません: {export_dir}")
+    if table not in manifest['files']:
+        raise KeyError(f"{manifest['version']} に {table} はありません（{', '.join(manifest['files'])}）")
+
+    path = os.path.join(export_dir, manifest['version'], manifest['files'][table]['path'])
+    if manifest['format'] == 'arrow':
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return pq.read_table(path, memory_map=True)
+
+
+if __name__ == "__main__":
+    from config.stock_config import get_all_tickers
+    from prediction_snapshot import read_snapshot
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='分析用スナップショットのエクスポート（Arrow IPC / Parquet）')
+    parser.add_argument('--db', default=DB_PATH, help='株価DBのパス')
+    parser.add_argument('--export-dir', default=EXPORT_DIR, help='書き出し先')
+    parser.add_argument('--format', choices=list(FORMATS), default='arrow', help='ファイル形式')
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help='書き出す株価の期間（日）')
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS, help='残すバージョン数')
+    parser.add_argument('--show', choices=['prices', 'features', 'predictions'],
+                        help='書き出さずに最新バージョンの表を読み込んで表示')
+    args = parser.parse_args()
+
+    if args.show:
+        started = time.perf_counter()
+        table = load_latest(args.show, args.export_dir)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(table.slice(0, 10).to_pandas())
+        print(f"{table.num_rows}行 × {table.num_columns}列（読み込み {elapsed:.1f}ms）")
+    else:
+        from predict_system import StockPredictionSystem
+
+        snapshot = read_snapshot()
+        export_snapshot(
+            snapshot['predictions'] if snapshot else [],
+            get_all_tickers(),
+            args.db,
+            args.export_dir,
+            args.format,
+            args.days,
+            StockPredictionSystem(args.db).create_features,
+            keep=args.keep
+        )
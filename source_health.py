@@ -0,0 +1,196 @@
+"""
+取得元の健全性管理
+銘柄×取得方式（tier）ごとにページ読み込みの所要時間と成否を記録し、
+過去のレイテンシの分位点からタイムアウトを決める。
+失敗が続いている取得元は次の数回の訪問でスキップし、すぐに次の取得方式へ回す（サーキットブレーカー）
+"""
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LATENCY_TABLE = '_source_latency'
+
+# 取得方式
+TIER_PLAYWRIGHT = 'playwright'
+TIER_YFINANCE = 'yfinance'
+
+# タイムアウト算出に使う直近の成功件数と分位点
+HISTORY_SIZE = 50
+TIER_HISTORY_SIZE = 500
+MIN_SAMPLES = 5
+PERCENTILE = 95
+# 分位点に掛ける余裕（p95の3倍まで待つ）
+TIMEOUT_FACTOR = 3.0
+MIN_TIMEOUT_MS = 5000
+
+# 連続失敗がこの回数に達したら、その後の SKIP_VISITS 回の訪問はスキップ
+# （スケジュール実行では各銘柄を取引日ごとに1回訪問するので、時間ではなく訪問回数で数える）
+FAILURE_THRESHOLD = 3
+SKIP_VISITS = 3
+# スキップした訪問の記録（error 列に入れる。成否・レイテンシの集計には含めない）
+SKIPPED = 'circuit_open'
+RETENTION_DAYS = 30
+
+
+class SourceHealth:
+    """レイテンシ履歴にもとづくタイムアウトとサーキットブレーカー（株価DBと同じファイルに保存）"""
+
+    def __init__(
+        self,
+        db_path: str,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        skip_visits: int = SKIP_VISITS
+    ):
+        """
+        初期化（保持期間を過ぎた記録は削除する）
+
+        Args:
+            db_path: SQLiteファイルのパス
+            failure_threshold: ブレーカーを開く連続失敗回数
+            skip_visits: ブレーカーが開いてからスキップする訪問の回数
+        """
+        self.db_path = db_path
+        self.failure_threshold = failure_threshold
+        self.skip_visits = skip_visits
+        self._ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LATENCY_TABLE} (
+                ticker TEXT NOT NULL,
+                tier TEXT NOT NULL,
+                recorded_at TEXT NOT NULL,
+                seconds REAL,
+                ok INTEGER NOT NULL,
+                error TEXT
+            )
+        """)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx{LATENCY_TABLE}_ticker "
+            f"ON {LATENCY_TABLE} (ticker, tier, recorded_at)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx{LATENCY_TABLE}_tier ON {LATENCY_TABLE} (tier, ok, recorded_at)"
+        )
+        cutoff = (datetime.now() - timedelta(days=RETENTION_DAYS)).isoformat(timespec='seconds')
+        conn.execute(f"DELETE FROM {LATENCY_TABLE} WHERE recorded_at < ?", (cutoff,))
+        conn.commit()
+        conn.close()
+
+    def record(
+        self,
+        ticker: str,
+        tier: str,
+        seconds: Optional[float],
+        ok: bool,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        1回の取得結果を記録
+
+        Args:
+            ticker: ティッカーシンボル
+            tier: 取得方式（'playwright', 'yfinance'）
+            seconds: 所要時間（秒）
+            ok: 成功したか
+            error: 失敗理由
+        """
+        conn = self._connect()
+        conn.execute(
+            f"INSERT INTO {LATENCY_TABLE} (ticker, tier, recorded_at, seconds, ok, error) VALUES (?, ?, ?, ?, ?, ?)",
+            (ticker, tier, datetime.now().isoformat(timespec='seconds'), seconds, int(ok), error)
+        )
+        conn.commit()
+        conn.close()
+
+    def _latencies(self, conn: sqlite3.Connection, ticker: str, tier: str) -> List[float]:
+        rows = conn.execute(
+            f"SELECT seconds FROM {LATENCY_TABLE} WHERE ticker = ? AND tier = ? AND ok = 1 "
+            "AND seconds IS NOT NULL ORDER BY recorded_at DESC LIMIT ?",
+            (ticker, tier, HISTORY_SIZE)
+        ).fetchall()
+        if len(rows) >= MIN_SAMPLES:
+            return [r[0] for r in rows]
+
+        # 銘柄の履歴が少なければ同じ取得方式の全銘柄の履歴を使う
+        rows = conn.execute(
+            f"SELECT seconds FROM {LATENCY_TABLE} WHERE tier = ? AND ok = 1 "
+            "AND seconds IS NOT NULL ORDER BY recorded_at DESC LIMIT ?",
+            (tier, TIER_HISTORY_SIZE)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def timeout_ms(self, ticker: str, tier: str, default_ms: int) -> int:
+        """
+        レイテンシ履歴から決めたタイムアウト
+
+        直近の成功のp95 × TIMEOUT_FACTOR を、MIN_TIMEOUT_MS 以上・従来の固定値以下に収める
+
+        Args:
+            ticker: ティッカーシンボル
+            tier: 取得方式
+            default_ms: 履歴が足りない場合の値（従来の固定値、上限も兼ねる）
+
+        Returns:
+            タイムアウト（ミリ秒）
+        """
+        conn = self._connect()
+        latencies = self._latencies(conn, ticker, tier)
+        conn.close()
+
+        if len(latencies) < MIN_SAMPLES:
+            return default_ms
+
+        timeout = np.percentile(latencies, PERCENTILE) * TIMEOUT_FACTOR * 1000
+        return int(min(max(timeout, MIN_TIMEOUT_MS), default_ms))
+
+    def is_open(self, ticker: str, tier: str) -> bool:
+        """
+        サーキットブレーカーが開いているか（Trueならこの取得方式はスキップする）
+
+        直近 failure_threshold 回の取得がすべて失敗で、最後の失敗からのスキップが skip_visits 回未満なら開いている。
+        呼び出しを1回の訪問として数え、スキップする場合はそれを記録する。
+        skip_visits 回スキップした後は1回だけ試し、また失敗すれば再び skip_visits 回スキップする
+
+        Args:
+            ticker: ティッカーシンボル
+            tier: 取得方式
+
+        Returns:
+            スキップすべきならTrue
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT rowid, ok FROM {LATENCY_TABLE} WHERE ticker = ? AND tier = ? AND error IS NOT ? "
+                "ORDER BY recorded_at DESC, rowid DESC LIMIT ?",
+                (ticker, tier, SKIPPED, self.failure_threshold)
+            ).fetchall()
+
+            if len(rows) < self.failure_threshold or any(ok for _, ok in rows):
+                return False
+
+            skipped = conn.execute(
+                f"SELECT COUNT(*) FROM {LATENCY_TABLE} WHERE ticker = ? AND tier = ? AND error = ? AND rowid > ?",
+                (ticker, tier, SKIPPED, rows[0][0])
+            ).fetchone()[0]
+            if skipped >= self.skip_visits:
+                return False
+
+            conn.execute(
+                f"INSERT INTO {LATENCY_TABLE} (ticker, tier, recorded_at, seconds, ok, error) VALUES (?, ?, ?, NULL, 0, ?)",
+                (ticker, tier, datetime.now().isoformat(timespec='seconds'), SKIPPED)
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
@@ -0,0 +1,203 @@
+"""
+ステージ別プロファイラ
+--profile 指定時だけ PipelineMetrics のステージに取り付け、
+ステージごとの cProfile（.prof）・tracemalloc のメモリ確保上位・折り畳みスタック（フレームグラフ用）を出力する
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = './data/profiles'
+# メモリ確保レポートに載せる件数
+TOP_ALLOCATIONS = 25
+# フレームグラフ用のサンプリング間隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+
+def add_profile_arguments(parser) -> None:
+    """
+    argparse に --profile / --flamegraph を追加
+    
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--profile', action='store_true',
+                        help='ステージごとに cProfile・tracemalloc を取り、./data/profiles に出力')
+    parser.add_argument('--flamegraph', action='store_true',
+                        help='--profile と併用: 折り畳みスタック形式のサンプルも出力（flamegraph.pl・speedscope 用）')
+
+
+class _StackSampler:
+    """全スレッドのスタックを一定間隔で記録し、折り畳みスタック形式で集計する"""
+    
+    def __init__(self, profiler: 'StageProfiler', interval: float = SAMPLE_INTERVAL):
+        self.profiler = profiler
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+    
+    def start(self) -> None:
+        self._thread.start()
+    
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stage = self.profiler.current_stage(ident)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                names.append(stage)
+                self.stacks[';'.join(reversed(names))] += 1
+    
+    def write(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class StageProfiler:
+    """ステージ単位のプロファイル収集（PipelineMetrics.profiler に設定して使う）"""
+    
+    def __init__(
+        self,
+        pipeline: str,
+        current_stage: Callable[[int], str],
+        output_dir: str = PROFILE_DIR,
+        flamegraph: bool = False
+    ):
+        """
+        初期化（tracemallocを開始する）
+        
+        Args:
+            pipeline: パイプライン名（出力ディレクトリ名に使う）
+            current_stage: スレッドIDから実行中のステージ名を返す関数（サンプルの分類に使う）
+            output_dir: 出力先の親ディレクトリ
+            flamegraph: Trueならスタックのサンプリングも行う
+        """
+        self.current_stage = current_stage
+        self.output_dir = os.path.join(
+            output_dir, f"{pipeline}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        )
+        self._owner = threading.get_ident()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        # 同じスレッド内の入れ子のステージ（内側のステージの時間は外側に含めない）
+        self._active: List[str] = []
+        self._allocations: Dict[str, Counter] = {}
+        self._peaks: Dict[str, int] = {}
+        
+        tracemalloc.start(10)
+        
+        self._sampler: Optional[_StackSampler] = None
+        if flamegraph:
+            self._sampler = _StackSampler(self)
+            self._sampler.start()
+        
+        logger.info(f"🔬 プロファイル有効: {self.output_dir}")
+    
+    def enter(self, stage: str) -> None:
+        """
+        ステージ開始（PipelineMetrics.stage から呼ばれる）
+        
+        cProfile は作成したスレッドのステージだけを対象にする（並列ワーカー内のステージは
+        フレームグラフのサンプリングでのみ記録される）
+        """
+        if threading.get_ident() != self._owner:
+            return
+        
+        if self._active:
+            outer = self._active[-1]
+            self._profiles[outer].disable()
+            self._collect_allocations(outer)
+        else:
+            tracemalloc.clear_traces()
+        self._active.append(stage)
+        
+        tracemalloc.reset_peak()
+        self._profiles.setdefault(stage, cProfile.Profile()).enable()
+    
+    def exit(self, stage: str) -> None:
+        """ステージ終了（PipelineMetrics.stage から呼ばれる）"""
+        if threading.get_ident() != self._owner or not self._active:
+            return
+        
+        self._profiles[stage].disable()
+        self._active.pop()
+        
+        _, peak = tracemalloc.get_traced_memory()
+        self._peaks[stage] = max(self._peaks.get(stage, 0), peak)
+        
+        self._collect_allocations(stage)
+        
+        if self._active:
+            self._profiles[self._active[-1]].enable()
+    
+    def _collect_allocations(self, stage: str) -> None:
+        """
+        前回の区切り以降に確保されて残っているメモリをステージに加算し、トレースを消す
+        
+        ステージの区切りごとにトレースを消すので、スナップショットにはそのステージの確保分だけが入る
+        （読み込み済みライブラリ全体のスナップショット同士を比較すると1回で数十秒かかる）
+        """
+        allocations = self._allocations.setdefault(stage, Counter())
+        for stat in tracemalloc.take_snapshot().statistics('lineno'):
+            frame = stat.traceback[0]
+            if frame.filename != tracemalloc.__file__:
+                allocations[str(frame)] += stat.size
+        tracemalloc.clear_traces()
+    
+    def close(self) -> Optional[str]:
+        """
+        プロファイルを書き出して tracemalloc を止める
+        
+        Returns:
+            出力ディレクトリ
+        """
+        if self._sampler is not None:
+            self._sampler.stop()
+        for stage in reversed(self._active):
+            self._profiles[stage].disable()
+        self._active = []
+        tracemalloc.stop()
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        
+        for stage, profile in self._profiles.items():
+            profile.dump_stats(os.path.join(self.output_dir, f"{stage}.prof"))
+            
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.sort_stats('cumulative').print_stats(30)
+            with open(os.path.join(self.output_dir, f"{stage}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+        
+        for stage, allocations in self._allocations.items():
+            with open(os.path.join(self.output_dir, f"{stage}.alloc.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"# {stage}: ピーク {self._peaks.get(stage, 0) / 1024**2:.1f}MB\n")
+                for location, size in allocations.most_common(TOP_ALLOCATIONS):
+                    f.write(f"{size / 1024:10.1f} KiB  {location}\n")
+        
+        if self._sampler is not None:
+            self._sampler.write(os.path.join(self.output_dir, 'flamegraph.collapsed'))
+        
+        logger.info(f"🔬 プロファイル出力: {self.output_dir} ({', '.join(sorted(self._profiles))})")
+        return self.output_dir
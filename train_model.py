@@ -14,16 +14,34 @@ import joblib
 import logging
 from typing import Optional
 
+from change_detector import is_internal_table
+from config.stock_config import DB_PATH
+from pipeline_metrics import PipelineMetrics
+from resource_sampler import ResourceSampler
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class StockPredictor:
     """株価予測モデル訓練クラス"""
     
-    def __init__(self):
-        """初期化"""
-        self.db_path = './data/stock_data.db'
-        self.model_path = './models/stock_model.pkl'
+    def __init__(
+        self,
+        db_path: str = DB_PATH,
+        model_path: str = './models/stock_model.pkl',
+        metrics: Optional[PipelineMetrics] = None
+    ):
+        """
+        初期化
+        
+        Args:
+            db_path: 株価DBのパス
+            model_path: モデルの保存先
+            metrics: 計測の記録先（省略時は新規作成）
+        """
+        self.db_path = db_path
+        self.model_path = model_path
+        self.metrics = metrics or PipelineMetrics('train', self.db_path)
     
     def create_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -68,17 +86,22 @@ class StockPredictor:
         
         for table in tables:
             table_name = table[0]
+            if is_internal_table(table_name):
+                continue
             try:
-                df = pd.read_sql(
-                    f"SELECT * FROM '{table_name}'",
-                    conn,
-                    parse_dates=['Date']
-                )
+                with self.metrics.stage('load'):
+                    df = pd.read_sql(
+                        f"SELECT * FROM '{table_name}' ORDER BY Date",
+                        conn,
+                        parse_dates=['Date']
+                    )
                 df = df.set_index('Date')
-                df = self.create_features(df)
+                with self.metrics.stage('features'):
+                    df = self.create_features(df)
                 
                 if len(df) > 0:
                     all_data.append(df)
+                    self.metrics.inc('rows_loaded', len(df))
                     logger.info(f"✅ {table_name}: {len(df)}件")
             except Exception as e:
                 logger.error(f"❌ {table_name}: {e}")
@@ -141,7 +164,8 @@ class StockPredictor:
             verbosity=0
         )
         
-        model.fit(X_train, y_train)
+        with self.metrics.stage('train'):
+            model.fit(X_train, y_train)
         
         train_score = model.score(X_train, y_train)
         test_score = model.score(X_test, y_test)
@@ -149,12 +173,14 @@ class StockPredictor:
         logger.info(f"\n📈 モデル評価")
         logger.info(f"  訓練スコア (R²): {train_score:.4f}")
         logger.info(f"  テストスコア (R²): {test_score:.4f}")
+        self.metrics.set('test_r2', test_score)
         
         y_pred = model.predict(X_test)
         mae = np.mean(np.abs(y_test - y_pred))
         logger.info(f"  平均誤差 (MAE): ${mae:.2f}")
         
-        joblib.dump(model, self.model_path)
+        with self.metrics.stage('save'):
+            joblib.dump(model, self.model_path)
         logger.info(f"\n💾 モデル保存完了: {self.model_path}")
         
         logger.info("\n" + "=" * 60)
@@ -164,8 +190,20 @@ class StockPredictor:
         return model
 
 if __name__ == "__main__":
+    import argparse
+    from stage_profiler import add_profile_arguments
+    
+    parser = argparse.ArgumentParser(description='モデル訓練')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    
     predictor = StockPredictor()
-    model = predictor.train()
+    if args.profile:
+        predictor.metrics.enable_profiling(args.flamegraph)
+    
+    with ResourceSampler(predictor.metrics):
+        model = predictor.train()
+    predictor.metrics.export()
     
     if model is None:
         logger.error("❌ モデル訓練失敗")
@@ -0,0 +1,208 @@
+"""
+ユニバース（監視対象銘柄）の管理
+指数構成銘柄のリスト（TOPIX Core30、S&P 500 など）をローカルのCSVから config/universe.csv に取り込み、
+時間枠ごとの処理計画を確認する。構成銘柄のファイルは各指数の公表資料から用意する
+
+使い方:
+    python3 universe.py list
+    python3 universe.py import sp500.csv --exchange NYSE --priority 3
+    python3 universe.py import topix_core30.csv --exchange JPX --priority 2
+    python3 universe.py plan --time-budget 30
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import csv
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional
+
+from config.stock_config import (
+    CURRENCIES, DEFAULT_PRIORITY, SECONDS_PER_TICKER, UNIVERSE_PATH, load_universe
+)
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['ticker', 'name', 'exchange', 'currency', 'priority']
+
+# 構成銘柄ファイルの列名の候補（小文字で比較）
+TICKER_COLUMNS = ['ticker', 'symbol', 'code', 'コード', '銘柄コード']
+NAME_COLUMNS = ['name', 'security', 'company', '銘柄名', '会社名']
+
+# 取引所ごとのYahooのティッカー接尾辞
+SUFFIXES: Dict[str, str] = {
+    'JPX': '.T',
+}
+
+
+def _find_column(header: List[str], candidates: List[str]) -> Optional[str]:
+    lowered = {h.strip().lower(): h for h in header}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def normalize_ticker(raw: str, exchange: str) -> str:
+    """
+    構成銘柄ファイルの表記をYahooのティッカーにする
+
+    JPXの4桁コード（'7203'、'7203.0'）は '7203.T'、米国株のクラス株（'BRK.B'）は 'BRK-B'
+    """
+    ticker = raw.strip().upper()
+    suffix = SUFFIXES.get(exchange, '')
+
+    if exchange == 'JPX':
+        ticker = re.sub(r'\.0$', '', ticker)
+        if suffix and not ticker.endswith(suffix):
+            ticker += suffix
+    elif '.' in ticker and not suffix:
+        ticker = ticker.replace('.', '-')
+    return ticker
+
+
+def load_index_file(
+    path: str,
+    exchange: str,
+    currency: Optional[str] = None,
+    priority: int = DEFAULT_PRIORITY
+) -> Dict[str, Dict]:
+    """
+    指数構成銘柄のCSVを読み込む
+
+    ティッカー列（ticker / symbol / code / コード）は必須、銘柄名の列（name / security / 銘柄名 など）は任意
+
+    Args:
+        path: 構成銘柄のCSV
+        exchange: 上場取引所（config.stock_config.EXCHANGES のキー）
+        currency: 通貨（省略時は取引所の既定）
+        priority: 取り込む銘柄の優先度
+
+    Returns:
+        {ticker: {'name', 'exchange', 'currency', 'priority'}}
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        ticker_column = _find_column(reader.fieldnames or [], TICKER_COLUMNS)
+        if ticker_column is None:
+            raise ValueError(f"ティッカー列が見つかりません: {path} ({reader.fieldnames})")
+        name_column = _find_column(reader.fieldnames or [], NAME_COLUMNS)
+
+        entries: Dict[str, Dict] = {}
+        for row in reader:
+            raw = (row.get(ticker_column) or '').strip()
+            if not raw:
+                continue
+            ticker = normalize_ticker(raw, exchange)
+            name = (row.get(name_column) or '').strip() if name_column else ''
+            entries[ticker] = {
+                'name': name or ticker,
+                'exchange': exchange,
+                'currency': currency or CURRENCIES.get(exchange),
+                'priority': priority,
+            }
+    return entries
+
+
+def write_universe(stocks: Dict[str, Dict], path: str = UNIVERSE_PATH) -> None:
+    """ユニバースのCSVを書き出す（一時ファイルに書いてから置き換えるので、読み込み中のプロセスに半端なファイルは見えない）"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.universe_', suffix='.csv', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for ticker, info in stocks.items():
+                writer.writerow({'ticker': ticker, **{k: info.get(k) for k in FIELDS[1:]}})
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def merge_into_universe(entries: Dict[str, Dict], path: str = UNIVERSE_PATH, overwrite: bool = False) -> Dict[str, int]:
+    """
+    銘柄をユニバースに追加
+
+    Args:
+        entries: load_index_file の戻り値
+        path: ユニバースのCSV
+        overwrite: Trueなら登録済みの銘柄も名前・優先度などを上書きする（既定は追加のみ）
+
+    Returns:
+        {'added', 'updated', 'total'}
+    """
+    stocks = load_universe(path)
+    added = updated = 0
+    for ticker, info in entries.items():
+        if ticker not in stocks:
+            added += 1
+        elif overwrite:
+            updated += 1
+        else:
+            continue
+        stocks[ticker] = info
+
+    write_universe(stocks, path)
+    return {'added': added, 'updated': updated, 'total': len(stocks)}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='ユニバース（監視対象銘柄）の管理')
+    parser.add_argument('--universe', default=UNIVERSE_PATH, help='ユニバースのCSV')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='登録銘柄を表示')
+    list_parser.add_argument('--max-priority', type=int, help='この優先度以内の銘柄だけ')
+
+    import_parser = subparsers.add_parser('import', help='指数構成銘柄のCSVを取り込む')
+    import_parser.add_argument('path', help='構成銘柄のCSV（ticker/symbol/code 列と任意の name 列）')
+    import_parser.add_argument('--exchange', required=True, help='上場取引所（JPX, NYSE, NASDAQ）')
+    import_parser.add_argument('--currency', help='通貨（省略時は取引所の既定）')
+    import_parser.add_argument('--priority', type=int, default=DEFAULT_PRIORITY, help='優先度（1が最優先）')
+    import_parser.add_argument('--overwrite', action='store_true', help='登録済みの銘柄も上書き')
+
+    plan_parser = subparsers.add_parser('plan', help='時間枠ごとの処理計画を表示')
+    plan_parser.add_argument('--time-budget', type=float, required=True, help='1回の実行の時間枠（分）')
+    plan_parser.add_argument('--seconds-per-ticker', type=float, default=SECONDS_PER_TICKER,
+                             help='1銘柄あたりの見積もり秒数')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        stocks = load_universe(args.universe)
+        for ticker, info in stocks.items():
+            if args.max_priority is None or info['priority'] <= args.max_priority:
+                print(f"{ticker:10s} {info['exchange'] or '-':7s} {info['currency'] or '-':4s} "
+                      f"{info['priority']:>3d}  {info['name']}")
+        print(f"合計 {len(stocks)}銘柄")
+
+    elif args.command == 'import':
+        entries = load_index_file(args.path, args.exchange, args.currency, args.priority)
+        result = merge_into_universe(entries, args.universe, args.overwrite)
+        logger.info(
+            f"✅ 取り込み完了: 追加 {result['added']} / 更新 {result['updated']} / 合計 {result['total']}銘柄"
+        )
+
+    elif args.command == 'plan':
+        from market_scheduler import time_boxed_shards
+
+        stocks = load_universe(args.universe)
+        if args.universe != UNIVERSE_PATH:
+            # time_boxed_shards が参照する優先度を指定ファイルのものにする
+            from config import stock_config
+            stock_config.STOCKS.clear()
+            stock_config.STOCKS.update(stocks)
+
+        by_exchange: Dict[str, List[str]] = {}
+        for ticker, info in stocks.items():
+            by_exchange.setdefault(info['exchange'] or '-', []).append(ticker)
+
+        for exchange, tickers in by_exchange.items():
+            shards = time_boxed_shards(tickers, args.time_budget, args.seconds_per_ticker)
+            print(f"{exchange}: {len(tickers)}銘柄 → {len(shards)}回（1回 {len(shards[0])}銘柄、"
+                  f"大引け後に {args.time_budget:g}分間隔のcronを{len(shards)}回以上）")
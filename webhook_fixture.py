@@ -0,0 +1,166 @@
+"""
+通知先のフィクスチャサーバー
+Slack Incoming Webhook・ChatWork API・汎用Webhookの代わりに通知を受け取るローカルHTTPサーバー。
+受け取った通知を記録し、指定した遅延・エラー率で応答する（通知の再送・ダイジェストの確認用）
+
+使い方:
+    python3 webhook_fixture.py --port 8766 --latency-ms 2000 --error-rate 0.3
+    STOCK_PROPHET_SLACK_WEBHOOK=http://127.0.0.1:8766/slack python3 notifier.py send "テスト"
+    STOCK_PROPHET_CHATWORK_API_URL=http://127.0.0.1:8766/v2 STOCK_PROPHET_CHATWORK_TOKEN=x \\
+        STOCK_PROPHET_CHATWORK_ROOM=1 python3 notifier.py send "テスト"
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookFixtureServer:
+    """バックグラウンドスレッドで動く通知の受け口"""
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        """
+        初期化
+
+        Args:
+            port: 待ち受けポート（0なら空きポート）
+            latency_ms: 応答までの遅延（ミリ秒）
+            error_rate: エラーを返す割合（0〜1、500と429が半々）
+            seed: エラーの乱数シード
+        """
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+        # 正常に受け付けた通知（{'path', 'headers', 'body', 'time'}）
+        self.received: List[Dict[str, Any]] = []
+        self.stats: Dict[str, int] = {'requests': 0, 'errors': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'WebhookFixtureServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """サーバーを起動"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='webhook-fixture', daemon=True)
+        self._thread.start()
+        logger.info(f"🧪 通知フィクスチャサーバー起動: {self.url}")
+
+    def stop(self) -> None:
+        """サーバーを停止"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _decide(self) -> Optional[int]:
+        """エラーにする場合はステータスコード"""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return self._random.choice([500, 429])
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length).decode('utf-8')
+
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+
+                status = server._decide()
+                if status:
+                    self._send(status, b'{"error": "fixture"}')
+                    return
+
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    body = json.loads(raw or 'null')
+                else:
+                    body = {k: v[0] for k, v in parse_qs(raw).items()}
+
+                with server._lock:
+                    server.received.append({
+                        'path': self.path,
+                        'headers': {k: v for k, v in self.headers.items() if k.lower().startswith('x-')},
+                        'body': body,
+                        'time': time.time(),
+                    })
+
+                if '/rooms/' in self.path:
+                    # ChatWork API と同じ応答
+                    self._send(200, json.dumps({'message_id': str(len(server.received))}).encode('utf-8'))
+                else:
+                    # Slack Incoming Webhook と同じ応答
+                    self._send(200, b'ok', 'text/plain')
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # リクエストごとのアクセスログは出さない
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='通知先（Slack・ChatWork・Webhook）のフィクスチャサーバー')
+    parser.add_argument('--port', type=int, default=8766, help='待ち受けポート')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='応答遅延（ミリ秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='エラー応答の割合（0〜1）')
+    args = parser.parse_args()
+
+    server = WebhookFixtureServer(args.port, args.latency_ms, args.error_rate)
+    server.start()
+    shown = 0
+    try:
+        while True:
+            time.sleep(1)
+            with server._lock:
+                new = server.received[shown:]
+            for item in new:
+                body = item['body']
+                text = (body.get('text') or body.get('body')) if isinstance(body, dict) else body
+                logger.info(f"📨 {item['path']}\n{text}")
+            shown += len(new)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,510 @@
+"""
+共有ワークキュー
+複数ノードのワーカーが銘柄単位のジョブをリース付きで取り出して処理する。
+ワーカーは処理中にリースを延長（ハートビート）し、落ちたワーカーのジョブはリース期限切れで他のワーカーに回る。
+失敗したジョブは間隔を空けて再試行し、上限回数に達したらデッドレターにする
+
+キューの実装は WorkQueue を継承して register_backend で登録する（既定は SQLite のローカル実装）。
+ワーカーの取得結果はジョブの結果としてキューに書き戻し、コーディネーターが `ingest` で株価DBにマージする
+
+使い方:
+    python3 work_queue.py enqueue --scheduled
+    python3 queue_worker.py --queue sqlite:///home/stock_prophet/data/queue.db   # 同じホストで複数起動できる
+    python3 work_queue.py stats
+    python3 work_queue.py ingest
+"""
+import sys
+sys.path.append('.')
+
+import argparse
+import io
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from config.stock_config import DB_PATH, WORK_QUEUE_URL
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TABLE = '_work_queue'
+
+# ジョブの状態
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+# リースの長さ（秒）。ワーカーはこの1/3ごとに延長する
+LEASE_SECONDS = 120.0
+# デッドレターにするまでの試行回数
+MAX_ATTEMPTS = 3
+# 再試行までの待ち時間（秒）。試行ごとに2倍にする
+RETRY_BACKOFF = 30.0
+
+
+class WorkQueue(ABC):
+    """
+    ワークキューの共通インターフェース
+
+    ジョブは {'job_id', 'ticker', 'attempts', 'token'} の辞書。
+    token はリースごとに変わり、リースを失ったワーカーからの延長・完了報告は無視される。
+    実装はすべてのメソッドを定義する（足りなければインスタンス化の時点で TypeError）
+    """
+
+    @abstractmethod
+    def enqueue(self, tickers: List[str]) -> int:
+        """銘柄をジョブとして登録（未完了のジョブがある銘柄は登録しない）。登録件数を返す"""
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """処理可能なジョブを1件リースする（なければNone）"""
+
+    @abstractmethod
+    def heartbeat(self, job: Dict[str, Any]) -> bool:
+        """リースを延長する。リースを失っていればFalse"""
+
+    @abstractmethod
+    def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> bool:
+        """ジョブを完了にして結果を書き戻す。リースを失っていればFalse"""
+
+    @abstractmethod
+    def fail(self, job: Dict[str, Any], error: str) -> str:
+        """ジョブの失敗を記録する。再試行なら PENDING、上限到達なら DEAD を返す"""
+
+    @abstractmethod
+    def release(self, job: Dict[str, Any]) -> bool:
+        """試行回数に数えずにリースを手放し、すぐに再取得できるようにする。リースを失っていればFalse"""
+
+    @abstractmethod
+    def results(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """取り込み前の完了ジョブの結果（{'job_id', 'ticker', 'result'}）"""
+
+    @abstractmethod
+    def mark_ingested(self, job_ids: List[int]) -> None:
+        """結果を取り込んだジョブを記録する"""
+
+    @abstractmethod
+    def requeue_dead(self) -> int:
+        """デッドレターのジョブを試行回数を戻して再登録する。件数を返す"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """状態ごとのジョブ数"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    SQLiteファイルによるワークキュー（同じホスト内の複数ワーカー・テスト用のローカル実装）
+
+    WALとファイルロックはNFSなどのネットワークファイルシステムでは正しく動かず、
+    リースの二重取得やファイル破損が起きるため、ファイルはローカルディスクに置くこと。
+    複数ノードで共有する場合はブローカーの実装を register_backend で登録して使う
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        name: str = 'collect',
+        lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+        retry_backoff: float = RETRY_BACKOFF
+    ):
+        """
+        初期化
+
+        Args:
+            db_path: SQLiteファイルのパス
+            name: キュー名（同じファイルに複数のキューを置ける）
+            lease_seconds: リースの長さ（秒）
+            max_attempts: デッドレターにするまでの試行回数
+            retry_backoff: 1回目の再試行までの待ち時間（秒）
+        """
+        self.db_path = db_path
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._ensure_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 複数ワーカーからの同時書き込みに備えてロック待ちを長めにとる
+        # isolation_level=None にして、リースの取得は BEGIN IMMEDIATE で明示的に書き込みロックを取る
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _ensure_table(self) -> None:
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_token TEXT,
+                lease_expires REAL,
+                result TEXT,
+                ingested INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                enqueued_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # 未完了のジョブは銘柄ごとに1件だけ
+        conn.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx{QUEUE_TABLE}_active ON {QUEUE_TABLE} (queue, ticker) "
+            f"WHERE status IN ('{PENDING}', '{LEASED}')"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx{QUEUE_TABLE}_status ON {QUEUE_TABLE} (queue, status, available_at)"
+        )
+        conn.close()
+
+    def enqueue(self, tickers: List[str]) -> int:
+        now = time.time()
+        conn = self._connect()
+        try:
+            before = conn.total_changes
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {QUEUE_TABLE} "
+                "(queue, ticker, status, available_at, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.name, ticker, PENDING, now, now, now) for ticker in tickers]
+            )
+            conn.execute('COMMIT')
+            added = conn.total_changes - before
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"📥 キュー {self.name}: {added}件登録（{len(tickers) - added}件は未完了のジョブあり）")
+        return added
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> None:
+        """リース期限が切れたジョブ（ワーカーが落ちた・止まった）を再試行か、上限到達ならデッドレターにする"""
+        expired = conn.execute(
+            f"SELECT job_id, ticker, attempts, lease_owner FROM {QUEUE_TABLE} "
+            "WHERE queue = ? AND status = ? AND lease_expires < ?",
+            (self.name, LEASED, now)
+        ).fetchall()
+
+        for job_id, ticker, attempts, owner in expired:
+            status = DEAD if attempts >= self.max_attempts else PENDING
+            conn.execute(
+                f"UPDATE {QUEUE_TABLE} SET status = ?, available_at = ?, lease_owner = NULL, "
+                "lease_token = NULL, lease_expires = NULL, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, now, f'リース期限切れ（{owner}）', now, job_id)
+            )
+            logger.warning(
+                f"⌛ {ticker}: {owner} のリース期限切れ → "
+                + ('デッドレター' if status == DEAD else '再試行')
+            )
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._expire_leases(conn, now)
+
+            row = conn.execute(
+                f"SELECT job_id, ticker, attempts FROM {QUEUE_TABLE} "
+                "WHERE queue = ? AND status = ? AND available_at <= ? ORDER BY available_at, job_id LIMIT 1",
+                (self.name, PENDING, now)
+            ).fetchone()
+
+            job = None
+            if row:
+                job = {'job_id': row[0], 'ticker': row[1], 'attempts': row[2] + 1, 'token': uuid.uuid4().hex}
+                conn.execute(
+                    f"UPDATE {QUEUE_TABLE} SET status = ?, attempts = ?, lease_owner = ?, lease_token = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE job_id = ?",
+                    (LEASED, job['attempts'], worker_id, job['token'], now + self.lease_seconds, now, job['job_id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        return job
+
+    def _update_leased(self, job: Dict[str, Any], assignments: str, params: tuple) -> bool:
+        """リースを持っている場合だけ更新する"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f"UPDATE {QUEUE_TABLE} SET {assignments}, updated_at = ? "
+                "WHERE job_id = ? AND status = ? AND lease_token = ?",
+                params + (time.time(), job['job_id'], LEASED, job['token'])
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def heartbeat(self, job: Dict[str, Any]) -> bool:
+        return self._update_leased(job, 'lease_expires = ?', (time.time() + self.lease_seconds,))
+
+    def complete(self, job: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> bool:
+        ok = self._update_leased(
+            job,
+            'status = ?, result = ?, error = NULL, lease_token = NULL, lease_expires = NULL',
+            (DONE, json.dumps(result, ensure_ascii=False) if result is not None else None)
+        )
+        if not ok:
+            logger.warning(f"⚠️ {job['ticker']}: リースを失っていたため完了報告を破棄")
+        return ok
+
+    def fail(self, job: Dict[str, Any], error: str) -> str:
+        if job['attempts'] >= self.max_attempts:
+            status, available_at = DEAD, time.time()
+        else:
+            status = PENDING
+            available_at = time.time() + self.retry_backoff * 2 ** (job['attempts'] - 1)
+
+        ok = self._update_leased(
+            job,
+            'status = ?, available_at = ?, error = ?, lease_owner = NULL, lease_token = NULL, lease_expires = NULL',
+            (status, available_at, error)
+        )
+        if not ok:
+            # 期限切れで既に他のワーカーへ回っている
+            return LEASED
+        if status == DEAD:
+            logger.error(f"💀 {job['ticker']}: {job['attempts']}回失敗したためデッドレター ({error})")
+        return status
+
+    def release(self, job: Dict[str, Any]) -> bool:
+        return self._update_leased(
+            job,
+            'status = ?, attempts = ?, available_at = ?, lease_owner = NULL, lease_token = NULL, lease_expires = NULL',
+            (PENDING, job['attempts'] - 1, time.time())
+        )
+
+    def results(self, limit: int = 100) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT job_id, ticker, result FROM {QUEUE_TABLE} "
+            "WHERE queue = ? AND status = ? AND ingested = 0 ORDER BY job_id LIMIT ?",
+            (self.name, DONE, limit)
+        ).fetchall()
+        conn.close()
+        return [
+            {'job_id': job_id, 'ticker': ticker, 'result': json.loads(result) if result else None}
+            for job_id, ticker, result in rows
+        ]
+
+    def mark_ingested(self, job_ids: List[int]) -> None:
+        conn = self._connect()
+        conn.executemany(
+            f"UPDATE {QUEUE_TABLE} SET ingested = 1, result = NULL, updated_at = ? WHERE job_id = ?",
+            [(time.time(), job_id) for job_id in job_ids]
+        )
+        conn.close()
+
+    def requeue_dead(self) -> int:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # 銘柄ごとに最新のデッドレターだけを戻す（未完了のジョブが既にある銘柄は一意制約に当たるので除く）
+            cursor = conn.execute(
+                f"UPDATE {QUEUE_TABLE} SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+                f"WHERE job_id IN (SELECT MAX(job_id) FROM {QUEUE_TABLE} WHERE queue = ? AND status = ? GROUP BY ticker) "
+                f"AND ticker NOT IN (SELECT ticker FROM {QUEUE_TABLE} WHERE queue = ? AND status IN (?, ?))",
+                (PENDING, now, now, self.name, DEAD, self.name, PENDING, LEASED)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT status, COUNT(*) FROM {QUEUE_TABLE} WHERE queue = ? GROUP BY status", (self.name,)
+        ).fetchall()
+        conn.close()
+        return dict(rows)
+
+
+class LeaseKeeper:
+    """
+    処理中のジョブのリースを別スレッドで延長する
+
+    with LeaseKeeper(queue, job) as keeper:
+        ...
+        if keeper.lost: （期限切れで他のワーカーに回った）
+    """
+
+    def __init__(self, queue: WorkQueue, job: Dict[str, Any], interval: Optional[float] = None):
+        self.queue = queue
+        self.job = job
+        self.interval = interval or getattr(queue, 'lease_seconds', LEASE_SECONDS) / 3
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job):
+                    self.lost = True
+                    logger.warning(f"⚠️ {self.job['ticker']}: リースを失いました")
+                    return
+            except Exception as e:
+                # 一時的なロック競合などは次の延長で回復する
+                logger.warning(f"⚠️ {self.job['ticker']}: リース延長に失敗: {e}")
+
+    def __enter__(self) -> 'LeaseKeeper':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def result_from_frame(df: pd.DataFrame) -> Dict[str, Any]:
+    """取得した株価をキューに書き戻せる形（JSON）にする"""
+    return {'rows': len(df), 'prices': df.reset_index().to_json(orient='split', date_format='iso')}
+
+
+def frame_from_result(result: Optional[Dict[str, Any]]) -> Optional[pd.DataFrame]:
+    """result_from_frame の逆変換（Date をインデックスに戻す）"""
+    if not result or not result.get('prices'):
+        return None
+    df = pd.read_json(io.StringIO(result['prices']), orient='split', dtype=False, convert_dates=['Date'])
+    return df.set_index('Date')
+
+
+# キューURLのスキーム → 実装（ネットワーク越しのブローカーはここに登録する）
+BACKENDS: Dict[str, Callable[..., WorkQueue]] = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+
+def register_backend(scheme: str, factory: Callable[..., WorkQueue]) -> None:
+    """
+    キューの実装を登録
+
+    Args:
+        scheme: URLのスキーム（'redis' など）
+        factory: URLのスキーム以降（'//host:6379/0' など）とキーワード引数を受け取って WorkQueue を返す関数
+    """
+    BACKENDS[scheme] = factory
+
+
+def open_queue(url: Optional[str] = None, **kwargs) -> WorkQueue:
+    """
+    URLからキューを開く
+
+    'sqlite:///path/to/queue.db' またはファイルパスならSQLite、それ以外は登録済みの実装
+
+    Args:
+        url: キューのURL（省略時は STOCK_PROPHET_QUEUE_URL、未設定なら株価DBと同じファイル）
+        **kwargs: 実装に渡す引数（name, lease_seconds など）
+
+    Returns:
+        WorkQueue
+    """
+    url = url or WORK_QUEUE_URL or DB_PATH
+    scheme, sep, rest = url.partition(':')
+    if not sep or len(scheme) == 1:
+        # スキームなし（Windowsのドライブ文字も含む）はSQLiteのファイルパス
+        return SQLiteWorkQueue(url, **kwargs)
+    if scheme not in BACKENDS:
+        raise ValueError(f"未登録のキュー実装です: {scheme}（登録済み: {', '.join(BACKENDS)}）")
+    if scheme == 'sqlite':
+        return SQLiteWorkQueue(rest[2:] if rest.startswith('//') else rest, **kwargs)
+    return BACKENDS[scheme](rest, **kwargs)
+
+
+def ingest_results(queue: WorkQueue, db_path: str = DB_PATH, batch: int = 100) -> int:
+    """
+    完了ジョブの取得結果を株価DBにマージする（コーディネーター側）
+
+    マージは冪等なので、取り込み記録の前に落ちても次回もう一度取り込めばよい
+
+    Args:
+        queue: ワークキュー
+        db_path: 株価DBのパス
+        batch: 1回に読み込む件数
+
+    Returns:
+        取り込んだ銘柄数
+    """
+    from price_store import merge_prices, table_name_for
+
+    ingested = 0
+    while True:
+        jobs = queue.results(batch)
+        if not jobs:
+            break
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            for job in jobs:
+                df = frame_from_result(job['result'])
+                if df is not None:
+                    merge_prices(conn, table_name_for(job['ticker']), df, commit=False)
+            conn.commit()
+        finally:
+            conn.close()
+
+        queue.mark_ingested([job['job_id'] for job in jobs])
+        ingested += len(jobs)
+
+    if ingested:
+        logger.info(f"💾 {ingested}銘柄の取得結果を株価DBにマージ")
+    return ingested
+
+
+if __name__ == "__main__":
+    from config.stock_config import TIME_BUDGET_MINUTES
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='共有ワークキュー（複数ノードでの収集）')
+    parser.add_argument('--queue', help='キューのURL（省略時は STOCK_PROPHET_QUEUE_URL か株価DB）')
+    parser.add_argument('--db', default=DB_PATH, help='株価DBのパス（ingest の書き込み先）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='銘柄をジョブとして登録')
+    enqueue_parser.add_argument('--tickers', nargs='*', help='対象銘柄（省略時は全銘柄）')
+    enqueue_parser.add_argument('--scheduled', action='store_true',
+                                help='大引け後の未処理セッションがある銘柄だけ登録')
+    enqueue_parser.add_argument('--time-budget', type=float, default=TIME_BUDGET_MINUTES,
+                                help='1回の実行の時間枠（分、--scheduled のときだけ）。超える分は優先度の低い銘柄から次回以降に回す')
+    subparsers.add_parser('stats', help='状態ごとのジョブ数を表示')
+    subparsers.add_parser('ingest', help='完了ジョブの取得結果を株価DBにマージ')
+    subparsers.add_parser('requeue-dead', help='デッドレターのジョブを再登録')
+    args = parser.parse_args()
+
+    queue = open_queue(args.queue)
+
+    if args.command == 'enqueue':
+        from market_scheduler import resolve_tickers
+        queue.enqueue(resolve_tickers(args.scheduled, args.tickers, args.time_budget))
+    elif args.command == 'stats':
+        stats = queue.stats()
+        print(', '.join(f"{status}={stats.get(status, 0)}" for status in (PENDING, LEASED, DONE, DEAD)))
+    elif args.command == 'ingest':
+        ingest_results(queue, args.db)
+    elif args.command == 'requeue-dead':
+        logger.info(f"🔁 デッドレターから{queue.requeue_dead()}件を再登録")